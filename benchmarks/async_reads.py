@@ -0,0 +1,117 @@
+"""Замер чтения каталога под ASGI: синхронный ModelViewSet против асинхронных view.
+
+    python -m benchmarks.async_reads --requests 5000 --concurrency 1000
+
+Запросы подаются прямо в ASGI-приложение Django (без сети) с заданным
+числом одновременных соединений. Кэш каталога отключается, чтобы мерить
+работу с базой. --db-latency-ms добавляет задержку к каждому SQL-запросу,
+как у базы на другом сервере (у SQLite в памяти ее нет). Выводит запросы
+в секунду и задержки.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from benchmarks.utils import percentile, setup, test_database
+
+
+async def call(application, path, query_string):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': query_string.encode(),
+        'headers': [(b'host', b'testserver')],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]['status']
+
+
+async def load(application, path, query_string, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            status = await call(application, path, query_string)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests_per_second': round(requests / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'statuses': statuses,
+    }
+
+
+def add_latency(latency):
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(latency)  # Как ожидание сети: GIL отпускается
+        return execute(sql, params, many, context)
+
+    def on_connection_created(connection, **kwargs):
+        if delay not in connection.execute_wrappers:
+            connection.execute_wrappers.append(delay)
+
+    connection_created.connect(on_connection_created, weak=False)
+
+
+def run(requests, concurrency, products):
+    from django.core.asgi import get_asgi_application
+    from products.models import Product
+
+    Product.objects.bulk_create(Product(name=f'товар {i}', price=100 + i) for i in range(products))
+    first_id = Product.objects.order_by('id').values_list('id', flat=True).first()
+    application = get_asgi_application()
+    variants = {
+        'list': ('/api/v1/products/', '/api/v1/async/products/', 'price__gte=100&ordering=-price'),
+        'retrieve': (f'/api/v1/products/{first_id}/', f'/api/v1/async/products/{first_id}/', ''),
+    }
+    results = {}
+    for name, (sync_path, async_path, query_string) in variants.items():
+        for mode, path in (('sync', sync_path), ('async', async_path)):
+            results[f'{name}_{mode}'] = asyncio.run(load(application, path, query_string, requests, concurrency))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000, help='Сколько запросов подать')
+    parser.add_argument('--concurrency', type=int, default=1000, help='Одновременных запросов')
+    parser.add_argument('--products', type=int, default=20, help='Сколько товаров создать')
+    parser.add_argument('--db-latency-ms', type=float, default=0, help='Задержка на SQL-запрос')
+    args = parser.parse_args()
+    os.environ['API_CACHE_TIMEOUT'] = '0'  # До загрузки настроек
+    setup()
+    with test_database():
+        if args.db_latency_ms:
+            add_latency(args.db_latency_ms / 1000)
+        print(json.dumps(run(args.requests, args.concurrency, args.products), indent=2))
+
+
+if __name__ == '__main__':
+    main()
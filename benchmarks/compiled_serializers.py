@@ -0,0 +1,94 @@
+"""Замер сериализации списков: сериализаторы DRF против CompiledSerializer.
+
+    python -m benchmarks.compiled_serializers --rows 5000
+
+Для товаров, отзывов, подборок и заказов сериализуется queryset вьюсета
+целиком (чтение из базы входит в замер) обоими способами, результаты
+сверяются. Выводит строк в секунду и ускорение.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.utils import setup, test_database
+
+
+def seed(rows):
+    from django.contrib.auth.models import User
+    from orders.models import Order, OrderPositions
+    from products.models import Product, ProductCollection, ProductReview
+
+    users = [User.objects.create_user(f'user_{i}', first_name='Имя', last_name='Фамилия') for i in range(10)]
+    Product.objects.bulk_create(
+        Product(name=f'товар {i}', description='описание товара', price=100 + i % 900, supplier_sku=f'SKU-{i}')
+        for i in range(rows)
+    )
+    products = list(Product.objects.order_by('id'))
+    ProductReview.objects.bulk_create(
+        ProductReview(user=users[i % len(users)], product=product, text='отзыв', rating=1 + i % 5)
+        for i, product in enumerate(products)
+    )
+    ProductCollection.objects.bulk_create(ProductCollection(name=f'подборка {i}') for i in range(rows // 10))
+    through = ProductCollection.products.through
+    through.objects.bulk_create(
+        through(productcollection_id=collection_id, product_id=products[(i * 10 + j) % rows].id)
+        for i, collection_id in enumerate(ProductCollection.objects.values_list('id', flat=True))
+        for j in range(10)
+    )
+    Order.objects.bulk_create(Order(user=users[i % len(users)], total_amount=1000) for i in range(rows))
+    OrderPositions.objects.bulk_create(
+        OrderPositions(order_id=order_id, product=product, quantity=1 + j, price=product.price)
+        for i, order_id in enumerate(Order.objects.values_list('id', flat=True))
+        for j in range(3)
+        for product in [products[(i + j) % rows]]
+    )
+
+
+def measure(serialize, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = serialize()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return data, round(rows / best, 1)
+
+
+def run(rows, repeat):
+    from online_shop.compiled import get_compiled_serializer
+    from orders.views import OrdersViewSet
+    from products.views import ProductsViewSet, ProductReviewsViewSet, ProductCollectionViewSet
+    from rest_framework.renderers import JSONRenderer
+
+    seed(rows)
+    results = {}
+    for name, viewset in (('products', ProductsViewSet), ('product_reviews', ProductReviewsViewSet),
+                          ('product_collections', ProductCollectionViewSet), ('orders', OrdersViewSet)):
+        queryset = viewset.queryset.order_by('id')
+        count = queryset.count()
+        compiled = get_compiled_serializer(viewset.serializer_class)
+        drf_data, drf_rate = measure(lambda: viewset.serializer_class(queryset.all(), many=True).data, count, repeat)
+        compiled_data, compiled_rate = measure(lambda: compiled.serialize(compiled.prepare(queryset)), count, repeat)
+        renderer = JSONRenderer()
+        results[name] = {
+            'rows': count,
+            'drf_rows_per_second': drf_rate,
+            'compiled_rows_per_second': compiled_rate,
+            'speedup': round(compiled_rate / drf_rate, 2),
+            'same_json': renderer.render(drf_data) == renderer.render(compiled_data),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='Сколько товаров, отзывов и заказов создать')
+    parser.add_argument('--repeat', type=int, default=3, help='Повторов, берется лучший')
+    args = parser.parse_args()
+    setup()
+    with test_database():
+        print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
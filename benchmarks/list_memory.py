@@ -0,0 +1,70 @@
+"""Замер пиковой памяти при выдаче списка заказов целиком и потоком.
+
+    python -m benchmarks.list_memory --orders 20000
+
+Выводит пик памяти по tracemalloc и время ответа для обычного списка
+и для ?stream=1.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.utils import setup, test_database
+
+
+def measure(client, url, params):
+    tracemalloc.start()
+    start = time.perf_counter()
+    resp = client.get(url, params)
+    size = 0
+    if resp.streaming:
+        for part in resp.streaming_content:
+            size += len(part)
+    else:
+        size = len(resp.content)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'peak_mb': round(peak / 2 ** 20, 2), 'seconds': round(elapsed, 3), 'response_mb': round(size / 2 ** 20, 2)}
+
+
+def run(orders, positions):
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from orders.models import Order, OrderPositions
+    from products.models import Product
+    from rest_framework.test import APIClient
+
+    admin = User.objects.create_user('benchmark_admin', is_staff=True)
+    Product.objects.bulk_create(Product(name=f'product_{i}', price=100) for i in range(positions))
+    products = list(Product.objects.order_by('id'))
+    Order.objects.bulk_create(Order(user=admin, total_amount=100 * positions) for _ in range(orders))
+    OrderPositions.objects.bulk_create(
+        OrderPositions(order_id=order_id, product=product, quantity=1, price=product.price)
+        for order_id in Order.objects.values_list('id', flat=True)
+        for product in products
+    )
+
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    url = reverse('orders-list')
+    return {
+        'list': measure(client, url, {}),
+        'stream': measure(client, url, {'stream': 1}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=5000, help='Сколько заказов создать')
+    parser.add_argument('--positions', type=int, default=3, help='Позиций в заказе')
+    args = parser.parse_args()
+    setup()
+    with test_database():
+        results = run(args.orders, args.positions)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
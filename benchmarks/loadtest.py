@@ -0,0 +1,449 @@
+"""Нагрузочный прогон API по запросам из requests.http.
+
+    python -m benchmarks.loadtest --scale 200 --requests 3000
+    python -m benchmarks.loadtest --compare benchmarks/results/loadtest-<commit>.json
+
+База заполняется данными из fixtures.json, размноженными в --scale раз
+(товары, отзывы, подборки, заказы с позициями; пользователи и токены
+остаются из фикстуры). Запросы из requests.http подаются в случайном
+порядке с весами: по умолчанию GET весит 10, остальные методы 1, вес
+отдельного запроса задается --weight "<название>=<вес>" (название — комментарий
+над запросом в requests.http, вес 0 исключает запрос). Переменные
+{{admin_token}} и {{user_token}} заменяются токенами пользователей фикстуры.
+
+Прогон идет в двух режимах, каждый на своей свежей базе: wsgi — вызов
+WSGI-приложения в процессе, server — HTTP через локальный сервер (как
+runserver). По каждому запросу выводятся задержки p50/p95/p99, SQL-запросы
+на запрос и пик выделенной памяти (отдельным проходом под tracemalloc, чтобы
+трассировка не искажала задержки). Результат сохраняется в JSON вместе с
+коммитом, --compare сравнивает его с результатом другого коммита.
+"""
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.utils import setup, summarize, test_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_MODELS = (
+    'auth.user', 'authtoken.token', 'products.product', 'products.productreview', 'products.productcollection',
+    'orders.order', 'orders.orderpositions',
+)
+DEFAULT_WEIGHTS = {'GET': 10}
+MODES = ('wsgi', 'server')
+HOST = 'testserver'  # Разрешен в ALLOWED_HOSTS тестового окружения
+
+
+def parse_requests(path, variables):
+    """Запросы файла .http: название, метод, путь, строка запроса, заголовки и тело"""
+    with open(path, encoding='utf-8') as f:
+        blocks = re.split(r'^###.*$', f.read(), flags=re.M)
+    file_variables, requests, names = {}, [], Counter()
+    for block in blocks:
+        name, request_line, headers, body = None, None, [], []
+        for line in block.strip().splitlines():
+            if request_line is None:
+                if line.startswith('@'):
+                    key, _, value = line[1:].partition('=')
+                    file_variables[key.strip()] = value.strip()
+                elif line.startswith(('#', '//')):
+                    name = name or line.lstrip('#/').strip()
+                elif line.strip():
+                    request_line = line.split()
+            elif body or not line.strip():
+                body.append(line)
+            else:
+                key, _, value = line.partition(':')
+                headers.append((key.strip(), value.strip()))
+        if request_line is None:
+            continue
+        values = dict(file_variables, **variables)
+
+        def substitute(text):
+            return re.sub(r'{{\s*(\w+)\s*}}', lambda m: str(values.get(m.group(1), m.group(0))), text)
+
+        method, url = request_line[0].upper(), urlsplit(substitute(request_line[1]))
+        name = name or f'{method} {url.path}'
+        names[name] += 1
+        if names[name] > 1:
+            name = f'{name} ({names[name]})'
+        requests.append({
+            'name': name,
+            'method': method,
+            'path': url.path,
+            'query': url.query,
+            'headers': [(key, substitute(value)) for key, value in headers],
+            'body': substitute('\n'.join(body).strip()).encode(),
+        })
+    return requests
+
+
+def load_fixture(path):
+    """Сохраняет объекты фикстуры (кроме служебных таблиц) и возвращает их по моделям"""
+    from django.core import serializers
+    from django.db import transaction
+
+    with open(path, encoding='cp1251') as f:
+        objects = [
+            obj for obj in serializers.deserialize('json', f.read())
+            if obj.object._meta.label_lower in SEED_MODELS
+        ]
+    with transaction.atomic():
+        for obj in objects:
+            obj.save()
+    by_model = defaultdict(list)
+    for obj in objects:
+        by_model[obj.object._meta.label_lower].append(obj)
+    return by_model
+
+
+def copy_rows(model, rows):
+    """Вставляет строки и возвращает их с id в порядке вставки (bulk_create на SQLite id не проставляет)"""
+    from django.db.models import Max
+
+    last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    model.objects.bulk_create(rows, batch_size=1000)
+    return list(model.objects.filter(id__gt=last_id).order_by('id'))
+
+
+def seed(fixture, scale):
+    """База из фикстуры, размноженной в scale раз, и переменные для requests.http"""
+    from django.db import transaction
+    from orders import sales, summary
+    from orders.models import Order, OrderPositions
+    from products import cache
+    from products.models import Product, ProductCollection, ProductReview
+    from rest_framework.authtoken.models import Token
+
+    fixture = load_fixture(fixture)
+    products = [obj.object for obj in fixture['products.product']]
+    collections = {obj.object: list(obj.object.products.values_list('id', flat=True))
+                   for obj in fixture['products.productcollection']}
+    orders = [obj.object for obj in fixture['orders.order']]
+    copies = range(1, scale)
+    with transaction.atomic():
+        created = iter(copy_rows(Product, [
+            Product(name=f'{p.name} {copy}', description=p.description, price=p.price)
+            for copy in copies for p in products
+        ]))
+        product_ids = {copy: {p.id: next(created).id for p in products} for copy in copies}
+        ProductReview.objects.bulk_create([
+            ProductReview(user_id=r.user_id, product_id=product_ids[copy][r.product_id], text=r.text, rating=r.rating)
+            for copy in copies for r in (obj.object for obj in fixture['products.productreview'])
+        ], batch_size=1000)
+        created = iter(copy_rows(ProductCollection, [
+            ProductCollection(name=c.name, text=c.text) for copy in copies for c in collections
+        ]))
+        ProductCollection.products.through.objects.bulk_create([
+            ProductCollection.products.through(productcollection_id=collection.id, product_id=product_ids[copy][pk])
+            for copy in copies for product_pks in collections.values() for collection in [next(created)]
+            for pk in product_pks
+        ], batch_size=1000)
+        created = iter(copy_rows(Order, [
+            Order(user_id=o.user_id, status=o.status, total_amount=o.total_amount) for copy in copies for o in orders
+        ]))
+        order_ids = {copy: {o.id: next(created).id for o in orders} for copy in copies}
+        OrderPositions.objects.bulk_create([
+            OrderPositions(order_id=order_ids[copy][p.order_id], product_id=product_ids[copy][p.product_id],
+                           quantity=p.quantity, price=p.price)
+            for copy in copies for p in (obj.object for obj in fixture['orders.orderpositions'])
+        ], batch_size=1000)
+        Product.objects.rebuild_rating()
+        Product.objects.update_search_vector()
+        sales.rebuild()
+        for user_id, _, _ in summary.find_drift():
+            summary.fix(user_id)
+    cache.invalidate()
+    tokens = Token.objects.select_related('user').order_by('user_id')
+    return {
+        'admin_token': next((t.key for t in tokens if t.user.is_superuser), ''),
+        'user_token': next((t.key for t in tokens if not t.user.is_staff), ''),
+    }
+
+
+class QueryCounter:
+    """Считает SQL-запросы всех соединений процесса, включая потоки локального сервера"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.count += 1
+                self.seconds += time.perf_counter() - start
+
+    def on_connection_created(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        connection_created.connect(self.on_connection_created, weak=False)
+        for connection in connections.all():
+            if connection.connection is not None:
+                self.on_connection_created(connection)
+        return self
+
+    def __exit__(self, *exc_info):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        connection_created.disconnect(self.on_connection_created)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+def wsgi_environ(request):
+    environ = {
+        'REQUEST_METHOD': request['method'],
+        'PATH_INFO': request['path'],
+        'QUERY_STRING': request['query'],
+        'CONTENT_LENGTH': str(len(request['body'])),
+        'HTTP_HOST': HOST,
+        'SERVER_NAME': HOST,
+        'wsgi.input': io.BytesIO(request['body']),
+    }
+    for name, value in request['headers']:
+        key = name.upper().replace('-', '_')
+        environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+    setup_testing_defaults(environ)
+    return environ
+
+
+class InProcessTransport:
+    """Вызов WSGI-приложения без сети, ответ читается целиком"""
+
+    def __init__(self):
+        from django.core.wsgi import get_wsgi_application
+
+        self.application = get_wsgi_application()
+
+    def send(self, request):
+        statuses = []
+        result = self.application(wsgi_environ(request), lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in result:
+                pass
+        finally:
+            result.close()  # Сигнал request_finished, как у настоящего сервера
+        return int(statuses[0].split()[0])
+
+    def close(self):
+        pass
+
+
+class ServerTransport:
+    """HTTP через локальный многопоточный сервер в этом же процессе"""
+
+    def __init__(self):
+        from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+        from django.core.wsgi import get_wsgi_application
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+        self.server.set_app(get_wsgi_application())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def send(self, request):
+        connection = http.client.HTTPConnection(*self.server.server_address[:2])
+        url = request['path'] + (f'?{request["query"]}' if request['query'] else '')
+        headers = dict(request['headers'], Host=HOST, Connection='close')
+        try:
+            connection.request(request['method'], url, body=request['body'], headers=headers)
+            response = connection.getresponse()
+            response.read()
+            return response.status
+        finally:
+            connection.close()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def replay(transport, schedule, counter, trace_memory=False):
+    """Замеры по каждому запросу расписания, сгруппированные по названию"""
+    samples = defaultdict(lambda: defaultdict(list))
+    for request in schedule:
+        sample = samples[request['name']]
+        count, seconds = counter.count, counter.seconds
+        if trace_memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        status = transport.send(request)
+        sample['timings'].append(time.perf_counter() - start)
+        sample['statuses'].append(status)
+        sample['queries'].append(counter.count - count)
+        sample['query_seconds'].append(counter.seconds - seconds)
+        if trace_memory:
+            sample['alloc_peak'].append(tracemalloc.get_traced_memory()[1] - before)
+    return samples
+
+
+def run_mode(transport_class, requests, weights, total, warmup, allocation_samples, seed_value):
+    requests = [request for request in requests if weights[request['name']] > 0]
+    schedule = random.Random(seed_value).choices(requests, [weights[r['name']] for r in requests], k=total)
+    transport = transport_class()
+    try:
+        with QueryCounter() as counter:
+            replay(transport, [request for request in requests for _ in range(warmup)], counter)
+            samples = replay(transport, schedule, counter)
+            tracemalloc.start()
+            try:
+                allocations = replay(
+                    transport, [request for request in requests for _ in range(allocation_samples)], counter, True
+                )
+            finally:
+                tracemalloc.stop()
+    finally:
+        transport.close()
+
+    endpoints = {}
+    for request in requests:
+        sample = samples.get(request['name'])
+        if not sample:
+            continue
+        peaks = allocations[request['name']]['alloc_peak']
+        endpoints[request['name']] = dict(
+            summarize(sample['timings']),
+            method=request['method'],
+            path=request['path'] + (f'?{request["query"]}' if request['query'] else ''),
+            weight=weights[request['name']],
+            statuses=dict(Counter(str(status) for status in sample['statuses'])),
+            queries_per_request=round(statistics.mean(sample['queries']), 2),
+            query_ms_per_request=round(statistics.mean(sample['query_seconds']) * 1000, 3),
+            alloc_peak_kb=round(statistics.median(peaks) / 1024, 1) if peaks else None,
+            alloc_peak_kb_max=round(max(peaks) / 1024, 1) if peaks else None,
+        )
+    timings = [timing for sample in samples.values() for timing in sample['timings']]
+    queries = [query for sample in samples.values() for query in sample['queries']]
+    return {
+        'total': dict(summarize(timings), queries_per_request=round(statistics.mean(queries), 2)),
+        'endpoints': endpoints,
+    }
+
+
+def git_revision():
+    """Текущий коммит, с пометкой -dirty при незакоммиченных изменениях"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        changes = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, capture_output=True, text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if changes else '')
+
+
+def run(modes, scale, total, weights, warmup, allocation_samples, seed_value, requests_file, fixture):
+    import django
+    from django.db import connection
+
+    results = {
+        'commit': git_revision(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'django': django.get_version(),
+        'scale': scale,
+        'requests': total,
+        'seed': seed_value,
+        'modes': {},
+    }
+    transports = {'wsgi': InProcessTransport, 'server': ServerTransport}
+    for mode in modes:
+        with test_database():  # Запросы на запись меняют данные, каждый режим начинает с одинаковой базы
+            results['database'] = connection.vendor
+            requests = parse_requests(requests_file, seed(fixture, scale))
+            request_weights = {
+                r['name']: weights.get(r['name'], DEFAULT_WEIGHTS.get(r['method'], 1)) for r in requests
+            }
+            results['modes'][mode] = run_mode(
+                transports[mode], requests, request_weights, total, warmup, allocation_samples, seed_value
+            )
+    return results
+
+
+def compare(old, new):
+    """Значения метрик двух прогонов рядом: [было, стало]"""
+    metrics = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'alloc_peak_kb')
+    result = {'commits': [old['commit'], new['commit']]}
+    for mode, data in new['modes'].items():
+        old_endpoints = old['modes'].get(mode, {}).get('endpoints', {})
+        result[mode] = {
+            name: {metric: [old_endpoints[name].get(metric), endpoint.get(metric)] for metric in metrics}
+            for name, endpoint in data['endpoints'].items() if name in old_endpoints
+        }
+    return result
+
+
+def parse_weight(value):
+    name, _, weight = value.rpartition('=')
+    if not name:
+        raise argparse.ArgumentTypeError('Ожидается "<название>=<вес>"')
+    return name, float(weight)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=100, help='Во сколько раз размножить фикстуру')
+    parser.add_argument('--requests', type=int, default=2000, help='Сколько запросов подать в каждом режиме')
+    parser.add_argument('--weight', type=parse_weight, action='append', default=[], help='Вес запроса')
+    parser.add_argument('--mode', choices=MODES, action='append', help='Режим (по умолчанию оба)')
+    parser.add_argument('--warmup', type=int, default=3, help='Незамеряемых повторов каждого запроса')
+    parser.add_argument('--allocation-samples', type=int, default=20, help='Повторов под tracemalloc')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно порядка запросов')
+    parser.add_argument('--requests-file', default=os.path.join(ROOT, 'requests.http'))
+    parser.add_argument('--fixture', default=os.path.join(ROOT, 'fixtures.json'))
+    parser.add_argument('--no-cache', action='store_true', help='Отключить кэш ответов каталога')
+    parser.add_argument('--output', help='Куда сохранить JSON (по умолчанию benchmarks/results/)')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+    if args.no_cache:
+        os.environ['API_CACHE_TIMEOUT'] = '0'  # До загрузки настроек
+    setup()
+    results = run(
+        args.mode or MODES, args.scale, args.requests, dict(args.weight), args.warmup, args.allocation_samples,
+        args.seed, args.requests_file, args.fixture
+    )
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'loadtest-{results["commit"][:12]}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(json.dumps(compare(json.load(f), results), ensure_ascii=False, indent=2))
+    else:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f'Сохранено в {output}')
+
+
+if __name__ == '__main__':
+    main()
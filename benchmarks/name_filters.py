@@ -0,0 +1,87 @@
+"""Задержка фильтров name__icontains и name__iexact до и после индексов.
+
+    python -m benchmarks.name_filters --rows 1000000 --repeat 20
+
+Только для PostgreSQL: таблица товаров заполняется через generate_series,
+фильтры замеряются без индексов по UPPER(name::text), затем с ними.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.utils import setup, summarize, test_database, timer
+
+INDEXES = {
+    'products_product_name_upper_trgm_idx':
+        'CREATE INDEX products_product_name_upper_trgm_idx '
+        'ON products_product USING gin (UPPER(name::text) gin_trgm_ops)',
+    'products_product_name_upper_idx':
+        'CREATE INDEX products_product_name_upper_idx ON products_product (UPPER(name::text))',
+}
+
+FILTERS = {
+    'name__icontains': {'name__icontains': 'уб 4242'},
+    'name__iexact': {'name__iexact': 'ТОВАР 424242 дуб'},
+}
+
+
+def seed(cursor, rows):
+    cursor.execute(
+        """
+        INSERT INTO products_product
+            (name, description, price, review_count, rating_sum, rating_avg, created_at, updated_at)
+        SELECT
+            'Товар ' || i || ' ' || (ARRAY['дуб', 'сосна', 'бук', 'ясень'])[1 + i %% 4],
+            '', (i %% 100000) + 0.99, 0, 0, 0, now(), now()
+        FROM generate_series(1, %s) AS i
+        """,
+        [rows]
+    )
+    cursor.execute('ANALYZE products_product')
+
+
+def measure(repeat):
+    from products.filters import ProductFilter
+    from products.models import Product
+
+    results = {}
+    for label, params in FILTERS.items():
+        timings = []
+        for _ in range(repeat):
+            with timer(timings):
+                found = len(ProductFilter(params, queryset=Product.objects.all()).qs)
+        results[label] = dict(summarize(timings), rows_found=found)
+    return results
+
+
+def run(rows, repeat):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        seed(cursor, rows)
+        for name in INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        before = measure(repeat)
+        for sql in INDEXES.values():
+            cursor.execute(sql)
+        cursor.execute('ANALYZE products_product')
+        after = measure(repeat)
+    return {'rows': rows, 'before': before, 'after': after}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000, help='Сколько товаров создать')
+    parser.add_argument('--repeat', type=int, default=20, help='Сколько раз выполнить каждый фильтр')
+    args = parser.parse_args()
+    setup()
+    from django.db import connection
+
+    if connection.vendor != 'postgresql':
+        sys.exit('Замер имеет смысл только на PostgreSQL')
+    with test_database():
+        print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Замер скорости выгрузки заказов: JSON-список против export в NDJSON и CSV.
+
+    python -m benchmarks.order_export --orders 20000
+
+Выводит время ответа и число заказов в секунду для каждого варианта.
+"""
+import argparse
+import json
+import time
+
+from benchmarks.utils import setup, test_database
+
+
+def read(resp):
+    if resp.streaming:
+        return sum(len(part) for part in resp.streaming_content)
+    return len(resp.content)
+
+
+def run(orders, positions):
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from orders.models import Order, OrderPositions
+    from products.models import Product
+    from rest_framework.test import APIClient
+
+    admin = User.objects.create_user('benchmark_admin', is_staff=True)
+    Product.objects.bulk_create(Product(name=f'product_{i}', price=100) for i in range(positions))
+    products = list(Product.objects.order_by('id'))
+    Order.objects.bulk_create(Order(user=admin, total_amount=100 * positions) for _ in range(orders))
+    OrderPositions.objects.bulk_create(
+        OrderPositions(order_id=order_id, product=product, quantity=1, price=product.price)
+        for order_id in Order.objects.values_list('id', flat=True)
+        for product in products
+    )
+
+    client = APIClient()
+    client.force_authenticate(user=admin)
+    variants = {
+        'list': (reverse('orders-list'), {}, {}),
+        'ndjson': (reverse('orders-export'), {}, {}),
+        'csv': (reverse('orders-export'), {'export_format': 'csv'}, {}),
+        'csv_gzip': (reverse('orders-export'), {'export_format': 'csv'}, {'HTTP_ACCEPT_ENCODING': 'gzip'}),
+    }
+    results = {}
+    for name, (url, params, headers) in variants.items():
+        start = time.perf_counter()
+        size = read(client.get(url, params, **headers))
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            'seconds': round(elapsed, 3),
+            'orders_per_second': round(orders / elapsed, 1),
+            'response_mb': round(size / 2 ** 20, 2),
+        }
+    for name in variants:
+        results[name]['speedup'] = round(results['list']['seconds'] / results[name]['seconds'], 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--orders', type=int, default=20000, help='Сколько заказов создать')
+    parser.add_argument('--positions', type=int, default=3, help='Позиций в заказе')
+    args = parser.parse_args()
+    setup()
+    with test_database():
+        print(json.dumps(run(args.orders, args.positions), indent=2))
+
+
+if __name__ == '__main__':
+    main()
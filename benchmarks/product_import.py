@@ -0,0 +1,58 @@
+"""Замер импорта товаров из файла поставщика против создания по одному через API.
+
+    python -m benchmarks.product_import --rows 50000
+
+Импортирует файл дважды (создание, затем обновление тех же артикулов) и
+для сравнения создает часть строк запросами POST /api/v1/products/.
+"""
+import argparse
+import io
+import json
+import time
+
+from benchmarks.utils import setup, test_database
+
+
+def make_csv(rows, price):
+    lines = ['supplier_sku,name,description,price']
+    lines.extend(f'SKU-{i},товар {i},описание товара {i},{price}' for i in range(rows))
+    return io.StringIO('\n'.join(lines) + '\n')
+
+
+def run(rows, api_rows):
+    from django.contrib.auth.models import User
+    from django.urls import reverse
+    from products.importer import import_products
+    from rest_framework.test import APIClient
+
+    results = {
+        'import_create': import_products(make_csv(rows, '10.00'), 'csv').as_dict(),
+        'import_update': import_products(make_csv(rows, '12.50'), 'csv').as_dict(),
+    }
+    for result in results.values():
+        result.pop('errors')
+
+    client = APIClient()
+    client.force_authenticate(user=User.objects.create_user('benchmark_admin', is_staff=True))
+    url = reverse('products-list')
+    start = time.perf_counter()
+    for i in range(api_rows):
+        client.post(url, {'supplier_sku': f'API-{i}', 'name': f'товар {i}', 'price': '10.00'}, format='json')
+    elapsed = time.perf_counter() - start
+    results['api_create'] = {'rows': api_rows, 'seconds': round(elapsed, 3),
+                             'rows_per_second': round(api_rows / elapsed, 1)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000, help='Строк в файле')
+    parser.add_argument('--api-rows', type=int, default=1000, help='Сколько товаров создать через API')
+    args = parser.parse_args()
+    setup()
+    with test_database():
+        print(json.dumps(run(args.rows, args.api_rows), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Сравнение полнотекстового поиска товаров с фильтрами icontains.
+
+    python -m benchmarks.product_search --rows 100000 --repeat 20
+
+На PostgreSQL search использует GIN-индекс по search_vector, icontains
+читает всю таблицу. На SQLite search работает через FallbackIndex.
+"""
+import argparse
+import json
+import random
+
+from benchmarks.utils import setup, summarize, test_database, timer
+
+WORDS = (
+    'стол', 'стул', 'шкаф', 'диван', 'кровать', 'полка', 'кухонный', 'обеденный', 'детский',
+    'офисный', 'дубовый', 'белый', 'черный', 'table', 'chair', 'wooden', 'modern', 'classic',
+)
+
+
+def seed(rows, batch_size=5000):
+    from products.models import Product
+
+    rnd = random.Random(0)
+    for start in range(0, rows, batch_size):
+        Product.objects.bulk_create(
+            Product(
+                name=' '.join(rnd.sample(WORDS, 3)),
+                description=' '.join(rnd.choices(WORDS, k=12)),
+                price=rnd.randint(1, 100000),
+            )
+            for _ in range(start, min(rows, start + batch_size))
+        )
+    Product.objects.update_search_vector()
+
+
+def run(rows, repeat):
+    from products.filters import ProductFilter
+    from products.models import Product
+
+    seed(rows)
+    queries = {
+        'search': {'search': 'кухонный стол'},
+        'name__icontains': {'name__icontains': 'кухонный стол'},
+        'description__icontains': {'description__icontains': 'кухонный'},
+    }
+    results = {}
+    for label, params in queries.items():
+        timings = []
+        for _ in range(repeat):
+            with timer(timings):
+                found = len(ProductFilter(params, queryset=Product.objects.all()).qs)
+        results[label] = dict(summarize(timings), rows_found=found)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Сколько товаров создать')
+    parser.add_argument('--repeat', type=int, default=20, help='Сколько раз выполнить каждый запрос')
+    args = parser.parse_args()
+    setup()
+    with test_database():
+        print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Замер скорости создания и изменения отзывов через API.
+
+    python -m benchmarks.review_writes --reviews 2000
+
+Выводит число операций в секунду и среднее число SQL-запросов на операцию.
+"""
+import argparse
+import json
+
+from benchmarks.utils import setup, summarize, test_database, timer
+
+
+def run(reviews):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from products.models import Product
+    from rest_framework.test import APIClient
+
+    Product.objects.bulk_create(Product(name=f'product_{i}', price=100) for i in range(reviews))
+    products = list(Product.objects.order_by('id'))
+    user = User.objects.create_user('benchmark_user')
+    client = APIClient()
+    client.force_authenticate(user=user)
+    url = reverse('product-reviews-list')
+
+    results = {}
+    create_timings, review_ids = [], []
+    with CaptureQueriesContext(connection) as queries:
+        for product in products:
+            with timer(create_timings):
+                resp = client.post(url, {'product_id': product.id, 'rating': 4}, format='json')
+            review_ids.append(resp.data['id'])
+    results['create'] = dict(summarize(create_timings), queries_per_op=len(queries) / reviews)
+
+    update_timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for review_id, product in zip(review_ids, products):
+            with timer(update_timings):
+                client.put(
+                    reverse('product-reviews-detail', args=(review_id,)),
+                    {'product_id': product.id, 'rating': 5},
+                    format='json'
+                )
+    results['update'] = dict(summarize(update_timings), queries_per_op=len(queries) / reviews)
+
+    duplicate_timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for product in products:
+            with timer(duplicate_timings):
+                client.post(url, {'product_id': product.id, 'rating': 4}, format='json')
+    results['duplicate'] = dict(summarize(duplicate_timings), queries_per_op=len(queries) / reviews)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reviews', type=int, default=1000, help='Сколько отзывов создать')
+    args = parser.parse_args()
+    setup()
+    with test_database():
+        print(json.dumps(run(args.reviews), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Общие функции для замеров производительности.
+
+Замеры запускаются как модули из корня проекта, например
+``python -m benchmarks.review_writes``, и работают на временной тестовой
+базе, которую создают и удаляют сами, как это делает pytest-django.
+"""
+import logging
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'online_shop.settings')
+    django.setup()
+    logging.getLogger('django.request').setLevel(logging.ERROR)  # Ответы 4xx в замерах ожидаемы
+    logging.getLogger('online_shop.timing').setLevel(logging.WARNING)  # Строка лога на каждый запрос
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """Временная тестовая база на время замера"""
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+        teardown_test_environment
+
+    setup_test_environment()
+    old_config = setup_databases(verbosity=verbosity, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def percentile(values, percent):
+    """Процентиль по отсортированному списку без интерполяции"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(timings):
+    """Сводка по списку длительностей в секундах, результат в миллисекундах"""
+    total = sum(timings)
+    return {
+        'count': len(timings),
+        'total_s': round(total, 4),
+        'per_second': round(len(timings) / total, 1) if total else 0.0,
+        'mean_ms': round(statistics.mean(timings) * 1000, 3) if timings else 0.0,
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+    }
+
+
+@contextmanager
+def timer(timings):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append(time.perf_counter() - start)
@@ -0,0 +1,157 @@
+"""Быстрая сериализация списков для чтения.
+
+CompiledSerializer один раз разбирает поля DRF-сериализатора и дальше
+строит ответ прямо из строк values(): без объектов моделей и без обхода
+полей DRF на каждый объект. Простые поля (строки, целые, bool, id связей)
+копируются как есть, остальные переводятся to_representation того же
+поля DRF, поэтому JSON совпадает с ответом обычного сериализатора.
+Вложенный сериализатор связи ForeignKey читается тем же запросом через
+join, вложенный список (many=True) — одним запросом на страницу.
+
+Сериализатор с полями, которые так не читаются (SerializerMethodField,
+source='*', свойства модели), не компилируется, и вьюсет работает как раньше.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F
+from online_shop import timing
+from rest_framework import serializers
+from rest_framework.response import Response
+
+PARENT_KEY = '_compiled_parent'
+COPIED_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+MANY = object()  # Место вложенного списка в ответе, заполняется в serialize()
+
+
+class NotCompilable(Exception):
+    pass
+
+
+class CompiledSerializer:
+
+    def __init__(self, serializer, model, prefix=''):
+        self.model = model
+        self.prefix = prefix
+        self.entries = []  # (имя, ключ строки, преобразование, вложенный CompiledSerializer или MANY)
+        self.many = []  # (имя, CompiledSerializer, имя связи в модели вложенного списка)
+        self.lookups = []
+        for field in serializer._readable_fields:
+            self.add_field(field)
+        if self.many:
+            self.lookups.append(prefix + model._meta.pk.attname)
+
+    def get_model_field(self, field):
+        if field.source == '*' or len(field.source_attrs) != 1 \
+                or isinstance(field, serializers.SerializerMethodField):
+            raise NotCompilable(f'{field.field_name}: unsupported source')
+        source = field.source_attrs[0]
+        try:
+            return self.model._meta.get_field(source)
+        except FieldDoesNotExist:  # source может быть attname, например product_id
+            for model_field in self.model._meta.concrete_fields:
+                if model_field.attname == source:
+                    return model_field
+        raise NotCompilable(f'{field.field_name}: not a model field')
+
+    def add_field(self, field):
+        model_field = self.get_model_field(field)
+        key = self.prefix + model_field.name
+        if isinstance(field, serializers.ListSerializer):
+            if not isinstance(field.child, serializers.Serializer) or not model_field.is_relation:
+                raise NotCompilable(f'{field.field_name}: unsupported list')
+            child = CompiledSerializer(field.child, model_field.related_model)
+            if child.many:
+                raise NotCompilable(f'{field.field_name}: nested lists are read only at the top level')
+            related_name = model_field.field.name if model_field.auto_created else model_field.related_query_name()
+            self.many.append((field.field_name, child, related_name))
+            self.entries.append((field.field_name, None, None, MANY))
+        elif isinstance(field, serializers.Serializer):
+            if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+                raise NotCompilable(f'{field.field_name}: unsupported nested serializer')
+            nested = CompiledSerializer(field, model_field.related_model, key + '__')
+            if nested.many:
+                raise NotCompilable(f'{field.field_name}: nested lists are read only at the top level')
+            null_key = key + '__pk' if model_field.null else None  # Пустая связь отдается как null
+            self.entries.append((field.field_name, null_key, None, nested))
+            self.lookups += nested.lookups + ([null_key] if null_key else [])
+        elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+                raise NotCompilable(f'{field.field_name}: unsupported related field')
+            self.add_value(field.field_name, self.prefix + model_field.attname, None)
+        elif model_field.is_relation or not model_field.concrete:
+            raise NotCompilable(f'{field.field_name}: unsupported related field')
+        else:
+            self.add_value(field.field_name, key, None if type(field) in COPIED_FIELDS else field.to_representation)
+
+    def add_value(self, name, key, convert):
+        self.entries.append((name, key, convert, None))
+        self.lookups.append(key)
+
+    def to_representation(self, row):
+        data = {}
+        for name, key, convert, nested in self.entries:
+            if nested is None:
+                value = row[key]
+                data[name] = value if convert is None or value is None else convert(value)
+            elif nested is MANY:
+                data[name] = []
+            else:
+                data[name] = None if key is not None and row[key] is None else nested.to_representation(row)
+        return data
+
+    def prepare(self, queryset, extra_lookups=()):
+        """queryset строк values() со всеми полями ответа и extra_lookups (например, полями пагинации)"""
+        lookups = list(dict.fromkeys(self.lookups + list(extra_lookups)))
+        return queryset.select_related(None).prefetch_related(None).values(*lookups)
+
+    def serialize(self, rows):
+        rows = list(rows)
+        data = [self.to_representation(row) for row in rows]
+        if self.many and rows:
+            pk_key = self.prefix + self.model._meta.pk.attname
+            ids = [row[pk_key] for row in rows]
+            for name, child, related_name in self.many:
+                children = defaultdict(list)
+                for row in child.load_children(related_name, ids):
+                    children[row[PARENT_KEY]].append(child.to_representation(row))
+                for item, pk in zip(data, ids):
+                    item[name] = children.get(pk, [])
+        return data
+
+    def load_children(self, related_name, ids):
+        """Строки вложенного списка для объектов ids в порядке id, как в Prefetch вьюсетов"""
+        return self.model._default_manager.filter(**{f'{related_name}__in': ids}).values(
+            *self.lookups, **{PARENT_KEY: F(related_name)}
+        ).order_by('pk')
+
+
+_compiled = {}
+
+
+def get_compiled_serializer(serializer_class):
+    """CompiledSerializer для класса сериализатора или None, если он не компилируется"""
+    if serializer_class not in _compiled:
+        try:
+            _compiled[serializer_class] = CompiledSerializer(serializer_class(), serializer_class.Meta.model)
+        except (NotCompilable, AttributeError):
+            _compiled[serializer_class] = None
+    return _compiled[serializer_class]
+
+
+class CompiledReadMixin:
+    """list через CompiledSerializer с теми же фильтрами, пагинацией и форматом ответа"""
+
+    def list(self, request, *args, **kwargs):
+        compiled = get_compiled_serializer(self.get_serializer_class())
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        get_lookups = getattr(self.paginator, 'get_position_lookups', None)  # Позиция курсора берется из строки
+        queryset = compiled.prepare(queryset, get_lookups(queryset) if get_lookups else ())
+        page = self.paginate_queryset(queryset)
+        with timing.phase('serialize'):
+            data = compiled.serialize(queryset if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
@@ -0,0 +1,164 @@
+"""Условные запросы HTTP по полям updated_at.
+
+ConditionalMixin отдает ETag и Last-Modified в ответах list и retrieve и
+отвечает 304 на If-None-Match / If-Modified-Since, не сериализуя данные.
+Для списка значения берутся одним запросом MAX(updated_at), COUNT(*) по
+отфильтрованному queryset: изменение строки меняет MAX, удаление — COUNT.
+Запрос агрегирует всю отфильтрованную выборку, а не только страницу
+пагинации, поэтому на больших выборках без фильтров он стоит полного
+прохода по таблице на каждый запрос страницы. Для объекта — из уже
+загруженного объекта. If-Match / If-Unmodified-Since в PUT проверяются под
+блокировкой строки, при несовпадении ответ 412.
+
+Поля conditional_fields вьюсета могут включать поля связанных моделей
+(например, product__updated_at), если они выводятся вложенными
+сериализаторами. Для таких связей в ETag списка входят еще число связанных
+строк и сумма их id: удаление связанного объекта, не последнего по
+updated_at, не меняет MAX.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Manager, Max, Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.response import Response
+
+PRECONDITION_HEADERS = ('HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+def make_etag(*parts):
+    return '"{}"'.format(hashlib.md5(':'.join(map(str, parts)).encode('utf-8')).hexdigest())
+
+
+def get_field_values(instance, path):
+    """Значения поля по пути через связи объекта, для связей many — по всем объектам (из prefetch, если он есть)"""
+    values = [instance]
+    for name in path.split('__'):
+        next_values = []
+        for value in values:
+            value = getattr(value, name, None)
+            if isinstance(value, Manager):
+                next_values.extend(value.all())
+            elif value is not None:
+                next_values.append(value)
+        values = next_values
+    return values
+
+
+def make_validators(etag, last_modified):
+    """(ETag, Last-Modified в секундах): точность заголовка — секунда"""
+    return etag, int(last_modified.timestamp()) if last_modified is not None else None
+
+
+def get_validators(response):
+    """Валидаторы из заголовков ответа, например, чтобы сохранить их в кэше вместе с данными"""
+    if not response.has_header('ETag'):
+        return None
+    return response['ETag'], parse_http_date_safe(response.get('Last-Modified', ''))
+
+
+def conditional_response(request, validators):
+    """Ответ 304 или 412 по заголовкам запроса или None, если запрос нужно выполнить"""
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_headers(response, validators)
+    return response
+
+
+def set_headers(response, validators):
+    if validators is None:
+        return response
+    etag, last_modified = validators
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class ConditionalMixin:
+    """ETag и Last-Modified для list и retrieve, If-Match для update"""
+    conditional_fields = ('updated_at', )
+
+    def get_list_validators(self, queryset):
+        """(ETag, Last-Modified) списка одним агрегатом по отфильтрованному queryset, None — без условных запросов"""
+        relations = sorted({field.rsplit('__', 1)[0] for field in self.conditional_fields if '__' in field})
+        digest = {}
+        for i, relation in enumerate(relations):  # Удаление связанного объекта может не менять MAX
+            digest[f'count_{i}'] = Count(relation)
+            digest[f'sum_{i}'] = Sum(f'{relation}__pk')
+        values = queryset.order_by().aggregate(
+            count=Count('pk', distinct=bool(relations)),  # Связи many размножают строки
+            **digest,
+            **{f'max_{i}': Max(field) for i, field in enumerate(self.conditional_fields)}
+        )
+        last_modified = max(
+            (values[f'max_{i}'] for i in range(len(self.conditional_fields)) if values[f'max_{i}'] is not None),
+            default=None
+        )
+        etag = make_etag(
+            self.basename, self.request.accepted_renderer.format, self.request.get_full_path(), self.request.user.pk,
+            values['count'], *(values[key] for key in sorted(digest)), last_modified and last_modified.isoformat()
+        )
+        return make_validators(etag, last_modified)
+
+    def get_object_validators(self, instance):
+        """(ETag, Last-Modified) объекта по его полям conditional_fields"""
+        values = [value for field in self.conditional_fields for value in get_field_values(instance, field)]
+        last_modified = max(values, default=None)
+        etag = make_etag(
+            self.basename, self.request.accepted_renderer.format, instance.pk, *(value.isoformat() for value in values)
+        )
+        return make_validators(etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        validators = self.get_list_validators(self.filter_queryset(self.get_queryset()))
+        response = conditional_response(request, validators)
+        if response is not None:
+            return response
+        return set_headers(super().list(request, *args, **kwargs), validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        validators = self.get_object_validators(instance)
+        response = conditional_response(request, validators)
+        if response is not None:
+            return response
+        return set_headers(Response(self.get_serializer(instance).data), validators)
+
+    def has_preconditions(self):
+        return any(header in self.request.META for header in PRECONDITION_HEADERS)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['update', 'partial_update'] and self.has_preconditions():
+            queryset = queryset.select_for_update(of=('self', ))  # Проверка и запись под одной блокировкой
+        return queryset
+
+    def get_object(self):
+        if getattr(self, 'checked_instance', None) is not None:  # Уже прочитан под блокировкой в update
+            return self.checked_instance
+        return super().get_object()
+
+    def update(self, request, *args, **kwargs):
+        if not self.has_preconditions():
+            return self.updated_response(request, *args, **kwargs)
+        with transaction.atomic():
+            self.checked_instance = self.get_object()
+            response = conditional_response(request, self.get_object_validators(self.checked_instance))
+            if response is not None:
+                return response
+            return self.updated_response(request, *args, **kwargs)
+
+    def updated_response(self, request, *args, **kwargs):
+        """Ответ update с ETag измененного объекта для следующего If-Match. Сериализаторы, которые
+        меняют поля conditional_fields UPDATE в базе, перечитывают их сами (см. ProductReviewSerializer)"""
+        response = super().update(request, *args, **kwargs)
+        return set_headers(response, self.get_object_validators(self.updated_instance))
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.updated_instance = serializer.instance
@@ -0,0 +1,89 @@
+"""PostgreSQL с пулом соединений на процесс воркера.
+
+Настройки пула задаются ключом POOL в описании базы в DATABASES:
+MAX_SIZE (0 отключает пул), TIMEOUT, MAX_LIFETIME, HEALTH_CHECK_INTERVAL.
+Django по-прежнему «открывает» и «закрывает» соединение на каждый запрос
+(CONN_MAX_AGE = 0), но физически соединение берется из пула и возвращается
+в него, поэтому подключение к серверу происходит только при росте пула.
+"""
+import psycopg2.extras
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from online_shop.db import pool
+from psycopg2 import extensions
+
+Database = base.Database
+
+
+def connect(conn_params):
+    connection = Database.connect(**conn_params)
+    psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)  # Как в Django
+    return connection
+
+
+def check_connection(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+def reset_connection(connection):
+    """Откатывает незавершенную транзакцию; сломанное соединение в пул не возвращается"""
+    if connection.closed:
+        return False
+    status = connection.info.transaction_status
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные соединения пула держат тестовую базу открытой и мешают ее удалить
+        pool.close_pools(lambda key: key[1] == test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        options = self.settings_dict.get('POOL') or {}
+        if not options.get('MAX_SIZE') or self.alias == NO_DB_ALIAS:  # Служебные соединения без пула
+            return None
+        key = (self.alias, self.settings_dict['NAME'], self.settings_dict['HOST'], self.settings_dict['PORT'])
+        return pool.get_pool(key, lambda: pool.ConnectionPool(
+            connect=lambda: connect(conn_params),
+            max_size=options['MAX_SIZE'],
+            timeout=options.get('TIMEOUT', 10),
+            max_lifetime=options.get('MAX_LIFETIME', 1800),
+            health_check_interval=options.get('HEALTH_CHECK_INTERVAL', 30),
+            check=check_connection,
+            reset=reset_connection,
+        ))
+
+    def get_new_connection(self, conn_params):
+        connection_pool = self.get_pool(conn_params)
+        if connection_pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            connection = connection_pool.acquire()
+        except pool.PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e  # Django превратит в django.db.OperationalError
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        connection_pool = self.get_pool(self.get_connection_params())
+        if connection_pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            connection_pool.release(self.connection)
@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+class PostgresRunSQL(migrations.RunSQL):
+    """RunSQL, который выполняется только на PostgreSQL.
+
+    Нужен для индексов и расширений, которых нет в других базах:
+    на SQLite в тестах операция пропускается, а схема моделей остается общей.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,196 @@
+"""Пул соединений с базой на процесс воркера.
+
+Пул не зависит от драйвера: соединения создаются функцией connect, перед
+выдачей давно не использованные соединения проверяются функцией check, а при
+возврате приводятся в исходное состояние функцией reset. Пул потокобезопасен,
+поэтому одинаково работает и под WSGI (потоки воркера), и под ASGI (потоки
+sync_to_async).
+"""
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, max_size=10, timeout=10.0, max_lifetime=1800.0, health_check_interval=30.0,
+                 check=None, reset=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self.check = check
+        self.reset = reset
+        self._condition = threading.Condition()
+        self._idle = deque()  # (соединение, время создания, время возврата)
+        self._in_use = {}  # id(соединения) -> время создания
+        self._size = 0
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'health_check_failures': 0,
+        }
+
+    def acquire(self):
+        """Свободное соединение из пула, новое, если пул не заполнен, иначе ждет до timeout секунд"""
+        started = time.monotonic()
+        waited = False
+        while True:
+            with self._condition:
+                entry = self._take_idle()
+                if entry is None and self._size < self.max_size:
+                    self._size += 1  # Место занимается до подключения, чтобы не превысить max_size
+                    break
+                if entry is None:
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No free database connection in {self.timeout} s (pool size {self.max_size})'
+                        )
+                    if not waited:
+                        waited = True
+                        self.stats['waits'] += 1
+                    self._condition.wait(remaining)
+                    continue
+            connection, created_at, released_at = entry
+            if self._is_alive(connection, released_at):
+                return self._check_out(connection, created_at, started, waited)
+            self._discard(connection)
+
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.stats['created'] += 1
+        return self._check_out(connection, time.monotonic(), started, waited)
+
+    def release(self, connection):
+        """Возвращает соединение в пул или закрывает его, если оно устарело или сломано"""
+        with self._condition:
+            created_at = self._in_use.pop(id(connection), None)
+        if created_at is None:  # Соединение не из этого пула
+            connection.close()
+            return
+        usable = time.monotonic() - created_at < self.max_lifetime
+        if usable and self.reset is not None:
+            try:
+                usable = self.reset(connection)
+            except Exception:
+                usable = False
+        if not usable:
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, created_at, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """Закрывает свободные соединения, выданные закроются при возврате"""
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+            self.max_lifetime = 0
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def get_stats(self):
+        with self._condition:
+            return dict(
+                self.stats,
+                wait_seconds=round(self.stats['wait_seconds'], 6),
+                size=self._size,
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                max_size=self.max_size,
+            )
+
+    def _take_idle(self):
+        """Последнее возвращенное свободное соединение, устаревшие по пути закрываются"""
+        now = time.monotonic()
+        while self._idle:
+            entry = self._idle.pop()
+            if now - entry[1] < self.max_lifetime:
+                return entry
+            self._size -= 1
+            self.stats['discarded'] += 1
+            self._close_quietly(entry[0])
+        return None
+
+    def _is_alive(self, connection, released_at):
+        if self.check is None or time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            alive = self.check(connection)
+        except Exception:
+            alive = False
+        if not alive:
+            with self._condition:
+                self.stats['health_check_failures'] += 1
+        return alive
+
+    def _check_out(self, connection, created_at, started, waited):
+        with self._condition:
+            self._in_use[id(connection)] = created_at
+            self.stats['checkouts'] += 1
+            if waited:
+                self.stats['wait_seconds'] += time.monotonic() - started
+        return connection
+
+    def _discard(self, connection):
+        with self._condition:
+            self._size -= 1
+            self.stats['discarded'] += 1
+            self._condition.notify()
+        self._close_quietly(connection)
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """Пул по ключу в текущем процессе; после fork у дочернего процесса свои пулы"""
+    key = (os.getpid(), ) + tuple(key)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = factory()
+    return pool
+
+
+def close_pools(match=lambda key: True):
+    for key, pool in list(_pools.items()):
+        if key[0] == os.getpid() and match(key[1:]):
+            pool.close()
+            _pools.pop(key, None)
+
+
+def get_stats():
+    """Статистика пулов текущего процесса"""
+    return {
+        ':'.join(str(part) for part in key[1:]): pool.get_stats()
+        for key, pool in list(_pools.items()) if key[0] == os.getpid()
+    }
@@ -0,0 +1,75 @@
+"""Маршрутизация запросов к базе между основной базой и репликами.
+
+Чтения внутри безопасных HTTP-запросов (GET, HEAD, OPTIONS) уходят на
+случайную исправную реплику из settings.DATABASE_REPLICAS, все остальное
+идет в основную базу. Режим задается на время запроса middleware
+(ReplicaRoutingMiddleware) через contextvar, поэтому код вне HTTP-запросов
+(команды, миграции, тесты) по-прежнему работает только с основной базой.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+_health = {}  # alias -> (исправна ли реплика, время проверки)
+
+
+@contextmanager
+def use_replicas(enabled=True):
+    """Разрешает чтение с реплик внутри блока"""
+    token = _read_from_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def stick_to_primary():
+    """После записи остаток запроса читает из основной базы"""
+    _read_from_replica.set(False)
+
+
+def is_healthy(alias, force=False):
+    """Проверяет реплику запросом не чаще раза в REPLICA_HEALTH_CHECK_INTERVAL секунд"""
+    healthy, checked_at = _health.get(alias, (None, None))
+    if not force and healthy is not None and time.monotonic() - checked_at < settings.REPLICA_HEALTH_CHECK_INTERVAL:
+        return healthy
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+        healthy = True
+    except DatabaseError:
+        connections[alias].close()
+        healthy = False
+    _health[alias] = (healthy, time.monotonic())
+    return healthy
+
+
+def get_read_alias():
+    """Реплика для чтения или основная база, если реплики не используются или все неисправны"""
+    if not _read_from_replica.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS  # Внутри транзакции читаем то же, что пишем
+    replicas = [alias for alias in settings.DATABASE_REPLICAS if is_healthy(alias)]
+    if not replicas:
+        return DEFAULT_DB_ALIAS
+    return random.choice(replicas)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return get_read_alias()
+
+    def db_for_write(self, model, **hints):
+        stick_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # Реплики содержат те же данные, что и основная база
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS  # Реплики получают схему репликацией
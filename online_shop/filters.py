@@ -0,0 +1,70 @@
+from datetime import datetime, time, timedelta
+
+from django.db import models
+from django.utils import timezone
+from django_filters import rest_framework as filters
+from django_filters.constants import EMPTY_VALUES
+
+
+class DateRangeFilter(filters.DateFilter):
+    """Фильтр по дате для DateTimeField в виде диапазона.
+
+    created_at__date=D превращается в created_at >= начало дня D и
+    created_at < начало следующего дня в текущем часовом поясе. В отличие от
+    приведения колонки к дате условие использует индекс по created_at.
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        day_start = timezone.make_aware(datetime.combine(value, time.min))
+        next_day_start = timezone.make_aware(datetime.combine(value + timedelta(days=1), time.min))
+        if self.lookup_expr == 'gte':
+            lookups = {f'{self.field_name}__gte': day_start}
+        elif self.lookup_expr == 'lte':
+            lookups = {f'{self.field_name}__lt': next_day_start}
+        else:
+            lookups = {f'{self.field_name}__gte': day_start, f'{self.field_name}__lt': next_day_start}
+        if self.distinct:
+            qs = qs.distinct()
+        return self.get_method(qs)(**lookups)
+
+
+class ChoiceIExactFilter(filters.CharFilter):
+    """iexact по полю с choices: значение приводится к варианту из choices
+    и сравнивается точно, без UPPER() над колонкой, поэтому работает индекс"""
+
+    def __init__(self, *args, choices=(), **kwargs):
+        self.choice_values = {str(value).upper(): value for value, label in choices}
+        kwargs['lookup_expr'] = 'exact'
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        value = self.choice_values.get(value.upper())
+        if value is None:
+            return qs.none()
+        return super().filter(qs, value)
+
+
+class IndexedFilterSet(filters.FilterSet):
+    """FilterSet, который строит фильтры __date и iexact по choices так,
+    чтобы условия в SQL могли использовать индексы"""
+
+    @classmethod
+    def filter_for_field(cls, field, field_name, lookup_expr='exact'):
+        lookups = lookup_expr.split('__')
+        if isinstance(field, models.DateTimeField) and lookups[0] == 'date':
+            return DateRangeFilter(
+                field_name=field_name,
+                lookup_expr=lookups[1] if len(lookups) > 1 else 'exact',
+                label=f'{field.verbose_name} ({lookup_expr})'
+            )
+        if field.choices and lookup_expr == 'iexact':
+            return ChoiceIExactFilter(
+                field_name=field_name,
+                choices=field.choices,
+                label=f'{field.verbose_name} ({lookup_expr})'
+            )
+        return super().filter_for_field(field, field_name, lookup_expr)
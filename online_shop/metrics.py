@@ -0,0 +1,353 @@
+"""Метрики сервиса в текстовом формате Prometheus (эндпоинт /metrics).
+
+Значения хранятся в памяти процесса. Если задан METRICS_MULTIPROC_DIR,
+каждый процесс (воркер gunicorn) пишет свои значения через mmap в файлы
+<dir>/counter_<pid>.db и <dir>/gauge_<pid>.db, а /metrics суммирует файлы
+всех процессов: счетчики и гистограммы не сбрасываются при перезапуске
+воркера, значения gauge берутся только у живых процессов. Каталог очищают
+перед запуском сервера.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+
+class LocalValues:
+    """Значения в памяти процесса"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, key, amount):
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, key, value):
+        with self.lock:
+            self.values[key] = value
+
+    def items(self):
+        with self.lock:
+            return list(self.values.items())
+
+
+class MmapValues:
+    """Значения процесса в файле: 8 байт занятого размера, затем записи
+    <длина ключа, 4 байта><ключ с выравниванием до 8 байт><значение, double>.
+    Размер обновляется после записи, поэтому читатель не видит недописанных записей."""
+    initial_size = 1 << 16
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(self.initial_size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = struct.unpack_from('Q', self.map, 0)[0] or 8
+        self.positions = {key: position for key, _, position in self.entries(self.map)}
+
+    @staticmethod
+    def entries(data):
+        used = struct.unpack_from('Q', data, 0)[0]
+        position = 8
+        while position < used:
+            length = struct.unpack_from('I', data, position)[0]
+            key = bytes(data[position + 4:position + 4 + length]).decode()
+            position += 4 + length + (-(4 + length) % 8)
+            yield key, struct.unpack_from('d', data, position)[0], position
+            position += 8
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        return [(key, value) for key, value, _ in cls.entries(data)] if len(data) >= 8 else []
+
+    def _position(self, key):
+        position = self.positions.get(key)
+        if position is not None:
+            return position
+        encoded = key.encode()
+        position = self.used + 4 + len(encoded) + (-(4 + len(encoded)) % 8)
+        if position + 8 > len(self.map):
+            size = len(self.map)
+            while size < position + 8:
+                size *= 2
+            self.map.close()
+            self.file.truncate(size)
+            self.map = mmap.mmap(self.file.fileno(), size)
+        struct.pack_into(f'I{len(encoded)}s', self.map, self.used, len(encoded), encoded)
+        struct.pack_into('d', self.map, position, 0.0)
+        self.used = position + 8
+        struct.pack_into('Q', self.map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def inc(self, key, amount):
+        with self.lock:
+            position = self._position(key)
+            struct.pack_into('d', self.map, position, struct.unpack_from('d', self.map, position)[0] + amount)
+
+    def set(self, key, value):
+        with self.lock:
+            struct.pack_into('d', self.map, self._position(key), value)
+
+    def items(self):
+        with self.lock:
+            return [(key, value) for key, value, _ in self.entries(self.map)]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_values(kind):
+    """Хранилище значений вида counter или gauge текущего процесса"""
+    directory = settings.METRICS_MULTIPROC_DIR
+    key = (os.getpid(), directory, kind)  # После fork у процесса свой файл
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                if directory:
+                    store = MmapValues(os.path.join(directory, f'{kind}_{os.getpid()}.db'))
+                else:
+                    store = LocalValues()
+                _stores[key] = store
+    return store
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_values(kind):
+    """Значения всех процессов: сумма по файлам каталога или значения текущего процесса"""
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return dict(get_values(kind).items())
+    totals = defaultdict(float)
+    for name in os.listdir(directory):
+        prefix, _, pid = name[:-len('.db')].partition('_')
+        if prefix != kind or not name.endswith('.db') or not pid.isdigit():
+            continue
+        if kind == 'gauge' and not is_alive(int(pid)):
+            continue
+        for key, value in MmapValues.read(os.path.join(directory, name)):
+            totals[key] += value
+    return totals
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')) for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+class Metric:
+    kind = 'counter'
+    type = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._keys = {}
+        registry.metrics.append(self)
+
+    def key(self, suffix, labels, extra=()):
+        """Ключ значения: имя метрики, суффикс и метки в JSON, строится один раз на набор меток"""
+        values = tuple(str(labels[name]) for name in self.labelnames) + extra
+        key = self._keys.get((suffix, values))
+        if key is None:
+            names = self.labelnames + (('le', ) if extra else ())
+            key = self._keys[(suffix, values)] = json.dumps([self.name, suffix, list(zip(names, values))])
+        return key
+
+    def samples(self, values):
+        """(имя, метки, значение) для экспозиции; values — значения всех метрик своего вида по всем процессам"""
+        return [
+            (self.name + suffix, labels, value) for (suffix, labels), value in sorted(values.get(self.name, {}).items())
+        ]
+
+
+class Counter(Metric):
+
+    def inc(self, amount=1, **labels):
+        get_values(self.kind).inc(self.key('_total', labels), amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        get_values(self.kind).set(self.key('', labels), value)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=()):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf, )
+
+    def observe(self, value, **labels):
+        values = get_values(self.kind)
+        le = self.buckets[bisect_left(self.buckets, value)]
+        values.inc(self.key('_bucket', labels, (format_value(le), )), 1)  # Хранится без накопления
+        values.inc(self.key('_count', labels), 1)
+        values.inc(self.key('_sum', labels), value)
+
+    def samples(self, values):
+        series = defaultdict(dict)
+        for (suffix, labels), value in values.get(self.name, {}).items():
+            if suffix == '_bucket':
+                *labels, (_, le) = labels
+                series[tuple(labels)][le] = value
+            else:
+                series[tuple(labels)][suffix] = value
+        samples = []
+        for labels, data in sorted(series.items()):
+            cumulative = 0.0
+            for bucket in self.buckets:
+                le = format_value(bucket)
+                cumulative += data.get(le, 0.0)
+                samples.append((f'{self.name}_bucket', labels + (('le', le), ), cumulative))
+            samples.append((f'{self.name}_count', labels, data.get('_count', 0.0)))
+            samples.append((f'{self.name}_sum', labels, data.get('_sum', 0.0)))
+        return samples
+
+
+class Ratio(Metric):
+    """Доля значения метки среди всех значений счетчика, считается при экспозиции"""
+    type = 'gauge'
+
+    def __init__(self, registry, name, documentation, counter, label, value):
+        super().__init__(registry, name, documentation)
+        self.counter = counter
+        self.label = label
+        self.value = value
+
+    def samples(self, values):
+        counts = defaultdict(float)
+        for (_, labels), count in values.get(self.counter.name, {}).items():
+            counts[dict(labels)[self.label] == self.value] += count
+        total = counts[True] + counts[False]
+        return [(self.name, (), counts[True] / total if total else 0.0)]
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # Функции, обновляющие gauge перед экспозицией
+
+    def counter(self, name, documentation, labelnames=()):
+        return Counter(self, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return Gauge(self, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=()):
+        return Histogram(self, name, documentation, labelnames, buckets)
+
+    def ratio(self, name, documentation, counter, label, value):
+        return Ratio(self, name, documentation, counter, label, value)
+
+    def collect(self):
+        """(метрика, [(имя, метки, значение), ...]) по всем процессам"""
+        for collector in self.collectors:
+            collector()
+        values = {kind: defaultdict(dict) for kind in ('counter', 'gauge')}
+        for kind, by_metric in values.items():
+            for key, value in read_values(kind).items():
+                name, suffix, labels = json.loads(key)
+                by_metric[name][(suffix, tuple(map(tuple, labels)))] = value
+        return [(metric, metric.samples(values[metric.kind])) for metric in self.metrics]
+
+    def get_sample_value(self, name, **labels):
+        for _, samples in self.collect():
+            for sample_name, sample_labels, value in samples:
+                if sample_name == name and dict(sample_labels) == labels:
+                    return value
+        return None
+
+    def exposition(self):
+        lines = []
+        for metric, samples in self.collect():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(f'{name}{format_labels(labels)} {format_value(value)}' for name, labels, value in samples)
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    'http_requests', 'HTTP requests by router basename and action', ('basename', 'action', 'method', 'status')
+)
+http_request_duration = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ('basename', 'action'),
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+http_request_db_queries = registry.histogram(
+    'http_request_db_queries', 'SQL queries per sampled HTTP request', ('basename', 'action'),
+    (1, 2, 3, 5, 10, 20, 50, 100),
+)
+catalog_cache_requests = registry.counter(
+    'catalog_cache_requests', 'Catalog response cache lookups', ('result', )
+)
+catalog_cache_hit_ratio = registry.ratio(
+    'catalog_cache_hit_ratio', 'Catalog response cache hit ratio', catalog_cache_requests, 'result', 'hit'
+)
+orders_created = registry.counter('orders_created', 'Created orders')
+db_pool = {
+    stat: registry.gauge(f'db_pool_{stat}', f'Connection pool {stat.replace("_", " ")} (sum over workers)', ['pool'])
+    for stat in ('size', 'idle', 'in_use', 'max_size', 'checkouts', 'waits', 'wait_seconds', 'timeouts', 'created',
+                 'discarded', 'health_check_failures')
+}
+
+_pool_refreshed = 0.0
+
+
+def refresh_pool_gauges(min_interval=0.0):
+    """Записывает статистику пулов соединений процесса не чаще раза в min_interval секунд"""
+    from online_shop.db import pool
+
+    global _pool_refreshed
+    now = time.monotonic()
+    if now - _pool_refreshed < min_interval:
+        return
+    _pool_refreshed = now
+    for key, stats in pool.get_stats().items():
+        for stat, gauge in db_pool.items():
+            gauge.set(stats[stat], pool=key)
+
+
+registry.collectors.append(refresh_pool_gauges)
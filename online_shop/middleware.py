@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError
+from online_shop import metrics, timing
+from online_shop.db import routers
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+logger = logging.getLogger('online_shop.timing')
+
+
+class MetricsMiddleware:
+    """Считает запросы и их длительность по basename роутера и действию viewset,
+    а для замеренных RequestTimingMiddleware запросов — число SQL-запросов"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def get_labels(request):
+        """basename и действие для viewset, имя URL для остальных view"""
+        resolver_match = request.resolver_match
+        if resolver_match is None:
+            return {'basename': '', 'action': ''}
+        view = resolver_match.func
+        if hasattr(view, 'actions'):  # ViewSet: действие по HTTP-методу, как в ViewSetMixin.as_view
+            action = view.actions.get(request.method.lower(), '')
+            return {'basename': view.initkwargs.get('basename', ''), 'action': action}
+        return {'basename': resolver_match.url_name or '', 'action': ''}
+
+    def observe(self, request, response, seconds):
+        labels = self.get_labels(request)
+        metrics.http_requests.inc(method=request.method, status=response.status_code, **labels)
+        metrics.http_request_duration.observe(seconds, **labels)
+        request_timing = getattr(request, 'timing', None)
+        if request_timing is not None:
+            metrics.http_request_db_queries.observe(request_timing.queries, **labels)
+        if settings.METRICS_MULTIPROC_DIR:  # Статистику пула других воркеров /metrics читает из их файлов
+            metrics.refresh_pool_gauges(min_interval=1)
+
+
+class RequestTimingMiddleware:
+    """Замеряет запрос: число и время SQL-запросов, повторяющиеся запросы,
+    сериализацию и рендеринг. Результат отдается заголовком Server-Timing,
+    пишется строкой JSON в лог online_shop.timing и доступен как request.timing.
+
+    Замеряется доля запросов REQUEST_TIMING_SAMPLE_RATE. Стоит в MIDDLEWARE
+    сразу после MetricsMiddleware, которая читает готовый request.timing,
+    и перед остальными, чтобы total включал все остальные middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        timing.install_all()
+        request.timing = timing.RequestTiming()
+        with timing.activate(request.timing):
+            response = self.get_response(request)
+        return self.finish_response(request, response)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        request.timing = timing.RequestTiming()
+        with timing.activate(request.timing):  # Потоки sync_to_async видят тот же замер
+            response = await self.get_response(request)
+        return self.finish_response(request, response)
+
+    @staticmethod
+    def sampled():
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        return rate >= 1 or random.random() < rate
+
+    def process_template_response(self, request, response):
+        request_timing = getattr(request, 'timing', None)
+        if request_timing is not None:  # Рендеринг идет сразу после этого вызова
+            started = time.perf_counter()
+            response.add_post_render_callback(
+                lambda response: request_timing.add_phase('render', time.perf_counter() - started)
+            )
+        return response
+
+    def finish_response(self, request, response):
+        request_timing = request.timing
+        request_timing.finish()  # У потокового ответа сюда попадает только время до начала потока
+        response['Server-Timing'] = request_timing.server_timing()
+        if logger.isEnabledFor(logging.INFO):
+            resolver_match = request.resolver_match
+            logger.info(json.dumps(dict(
+                method=request.method,
+                path=request.path,
+                view=resolver_match.view_name if resolver_match else None,
+                status=response.status_code,
+                **request_timing.as_dict(),
+            ), ensure_ascii=False))
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтения безопасных запросов на реплики.
+
+    После запроса с записью клиент получает cookie на REPLICA_PIN_SECONDS
+    секунд, и пока она есть, его чтения идут в основную базу: пользователь
+    сразу видит свои изменения, даже если реплика отстает.
+    """
+    pin_cookie_name = 'db_primary'
+    sync_capable = True
+    async_capable = True  # Не переводит асинхронные view в синхронный режим под ASGI
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # Как в django.utils.deprecation.MiddlewareMixin
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        read_from_replica = self.read_from_replica(request)
+        with routers.use_replicas(read_from_replica):
+            response = self.get_response(request)
+        return self.finish_response(request, response, read_from_replica)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        read_from_replica = self.read_from_replica(request)
+        with routers.use_replicas(read_from_replica):  # contextvar переходит в потоки sync_to_async
+            response = await self.get_response(request)
+        return self.finish_response(request, response, read_from_replica)
+
+    def read_from_replica(self, request):
+        return request.method in SAFE_METHODS and self.pin_cookie_name not in request.COOKIES
+
+    def finish_response(self, request, response, read_from_replica):
+        if response.streaming and read_from_replica:  # Потоковый ответ читает из базы уже после view
+            response.streaming_content = self.stream_from_replicas(response.streaming_content)
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                self.pin_cookie_name, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    @staticmethod
+    def stream_from_replicas(content):
+        with routers.use_replicas():
+            yield from content
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, OperationalError) and settings.DATABASE_REPLICAS:
+            for alias in settings.DATABASE_REPLICAS:  # Следующие запросы обойдут упавшую реплику
+                routers.is_healthy(alias, force=True)
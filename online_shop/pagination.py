@@ -0,0 +1,182 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import datetime
+from urllib import parse
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedAtCursorPagination(BasePagination):
+    """Keyset-пагинация по (created_at, id) или по порядку, заданному фильтром.
+
+    Включается только если в запросе передан cursor или page_size, иначе
+    список отдается целиком, как раньше. Курсор хранит позицию последней
+    (или первой) записи страницы, поэтому следующая страница выбирается
+    условием по индексу без OFFSET и не сдвигается при параллельных вставках.
+
+    Если queryset уже упорядочен (например, ?ordering=-price), курсор строится
+    по этим полям с id в конце для однозначности. Порядок по выражениям
+    (ранг поиска, продажи с NULL) курсором не пагинируется, ответ 400.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 500
+    ordering = ('created_at', 'id')
+    invalid_cursor_message = 'Invalid cursor'
+    unsupported_ordering_message = 'Cursor pagination is not supported for this ordering or search'
+    optional = True  # False: первая страница отдается и без cursor и page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.optional and self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+
+        ordering = self.get_ordering(queryset)
+        if ordering is None:
+            raise ValidationError(self.unsupported_ordering_message)
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.cursor_ordering = ordering
+        self.fields = [queryset.model._meta.get_field(field.lstrip('-')) for field in ordering]
+        self.cursor = self.decode_cursor(request, ordering)
+
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor
+            queryset = queryset.filter(self.get_keyset_filter(ordering, position, reverse))
+
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+
+        first_position = self.get_position(self.page[0]) if self.page else position
+        last_position = self.get_position(self.page[-1]) if self.page else position
+        if reverse:
+            self.next_position = last_position
+            self.previous_position = first_position if has_more else None
+        else:
+            self.next_position = last_position if has_more else None
+            self.previous_position = first_position if position is not None else None
+        return self.page
+
+    def get_ordering(self, queryset):
+        """Поля курсора: порядок queryset с id в конце или (created_at, id), если порядка нет.
+        None — порядок задан не полями модели или по полю с NULL"""
+        if not queryset.query.order_by:
+            return self.ordering
+        pk_name = queryset.model._meta.pk.name
+        ordering = []
+        for field in queryset.query.order_by:
+            if not isinstance(field, str):
+                return None
+            name = field.lstrip('-')
+            if name in ('pk', pk_name):  # Поля после первичного ключа на порядок не влияют
+                return tuple(ordering + [field[:-len(name)] + pk_name])
+            try:
+                model_field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:  # Аннотация, например ранг поиска
+                return None
+            if not model_field.concrete or model_field.is_relation or model_field.null:
+                return None
+            ordering.append(field)
+        return tuple(ordering + [pk_name])
+
+    def get_position_lookups(self, queryset):
+        """Поля позиции курсора для строк values() (CompiledReadMixin)"""
+        return [field.lstrip('-') for field in self.get_ordering(queryset) or ()]
+
+    def get_keyset_filter(self, ordering, position, reverse):
+        """Условие "строго после (до) позиции". Первое поле ограничивается диапазоном,
+        чтобы план запроса начинался с поиска по индексу, а не с OR"""
+        field, value = ordering[0], position[0]
+        name = field.lstrip('-')
+        descending = field.startswith('-') != reverse
+        if len(ordering) == 1:
+            return Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+        after = self.get_keyset_filter(ordering[1:], position[1:], reverse)
+        return Q(**{f'{name}__{"lte" if descending else "gte"}': value}) & ~(Q(**{name: value}) & ~after)
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_position(self, item):
+        if isinstance(item, dict):  # Строка values() из CompiledReadMixin
+            return tuple(item[field.name] for field in self.fields)
+        return tuple(getattr(item, field.attname) for field in self.fields)
+
+    def decode_cursor(self, request, ordering):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            values = tokens['v']
+            if tokens['o'][0] != ','.join(ordering) or len(values) != len(self.fields):  # Курсор другого порядка
+                raise ValueError
+            position = tuple(field.to_python(value) for field, value in zip(self.fields, values))
+        except (TypeError, ValueError, KeyError, UnicodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, position, reverse):
+        values = [value.isoformat() if isinstance(value, datetime) else str(value) for value in position]
+        tokens = OrderedDict([('o', ','.join(self.cursor_ordering)), ('v', values)])
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens, doseq=True).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'previous': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+
+class RequiredCursorPagination(CreatedAtCursorPagination):
+    """Пагинация по (created_at, id) для списков, которые целиком не отдаются"""
+    optional = False
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,12 +44,14 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'django_filters',
 
-    'products',
+    'products.apps.ProductsConfig',
     'orders',
     'users',
 ]
 
 MIDDLEWARE = [
+    'online_shop.middleware.MetricsMiddleware',
+    'online_shop.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +59,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'online_shop.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'online_shop.urls'
@@ -78,7 +83,9 @@ TEMPLATES = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'online_shop.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 50,
 }
 
 WSGI_APPLICATION = 'online_shop.wsgi.application'
@@ -87,15 +94,99 @@ WSGI_APPLICATION = 'online_shop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Пул соединений на процесс воркера (online_shop/db/backends/postgresql):
+# DATABASE_POOL_MAX_SIZE=0 отключает пул, тогда соединения держатся
+# по DATABASE_CONN_MAX_AGE. С пулом CONN_MAX_AGE оставляют 0: соединение
+# возвращается в пул в конце каждого запроса.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'online_shop',
-        'HOST': '127.0.0.1',
-        'PORT': '5432',
+        'ENGINE': 'online_shop.db.backends.postgresql',
+        'NAME': os.environ.get('DATABASE_NAME', 'online_shop'),
+        'USER': os.environ.get('DATABASE_USER', ''),
+        'PASSWORD': os.environ.get('DATABASE_PASSWORD', ''),
+        'HOST': os.environ.get('DATABASE_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('DATABASE_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 0)),
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DATABASE_POOL_MAX_SIZE', 10)),
+            'TIMEOUT': float(os.environ.get('DATABASE_POOL_TIMEOUT', 10)),
+            'MAX_LIFETIME': float(os.environ.get('DATABASE_POOL_MAX_LIFETIME', 1800)),
+            'HEALTH_CHECK_INTERVAL': float(os.environ.get('DATABASE_POOL_HEALTH_CHECK_INTERVAL', 30)),
+        },
     }
 }
 
+# Реплики для чтения: DATABASE_REPLICA_HOSTS=10.0.0.2,10.0.0.3 добавляет алиасы
+# replica_1, replica_2 с теми же настройками, что и default, кроме HOST.
+# В тестах реплики указывают на тестовую базу default (TEST MIRROR).
+
+for number, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{number}'] = dict(DATABASES['default'], HOST=host.strip(), TEST={'MIRROR': 'default'})
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['online_shop.db.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи клиент читает из основной базы
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Как часто перепроверять доступность реплики, секунд
+REPLICA_HEALTH_CHECK_INTERVAL = int(os.environ.get('REPLICA_HEALTH_CHECK_INTERVAL', 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Кэш ответов каталога для анонимных пользователей (products/cache.py).
+# По умолчанию файловый: он общий для всех воркеров gunicorn на сервере, и сброс
+# кэша после изменения каталога виден каждому из них. Для нескольких серверов нужен
+# общий кэш, например API_CACHE_BACKEND=django.core.cache.backends.memcached.MemcachedCache.
+# Каталог в памяти: API_CACHE_LOCATION=/dev/shm/online_shop_api
+
+API_CACHE_ALIAS = 'api'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    API_CACHE_ALIAS: {
+        'BACKEND': os.environ.get('API_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('API_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'online_shop_api')),
+        'TIMEOUT': int(os.environ.get('API_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('API_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+
+# Замеры запросов (online_shop/timing.py): доля замеряемых запросов,
+# результат в заголовке Server-Timing и в логе online_shop.timing
+
+REQUEST_TIMING_SAMPLE_RATE = float(os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'online_shop.timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('REQUEST_TIMING_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+
+# Метрики для Prometheus (online_shop/metrics.py, эндпоинт /metrics).
+# Под gunicorn с несколькими воркерами задают общий каталог, очищаемый
+# перед запуском: значения всех воркеров суммируются.
+
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
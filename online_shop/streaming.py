@@ -0,0 +1,54 @@
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+
+def iter_chunks(queryset, chunk_size):
+    """Объекты queryset пачками по chunk_size.
+
+    Строки читаются через iterator(), то есть курсором на стороне сервера
+    на PostgreSQL, а prefetch_related, который iterator() игнорирует,
+    выполняется отдельно для каждой пачки.
+    """
+    lookups = queryset._prefetch_related_lookups
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield chunk
+
+
+class StreamingListMixin:
+    """Потоковая выдача списка по параметру ?stream=1.
+
+    Список сериализуется и отдается пачками через StreamingHttpResponse,
+    поэтому память процесса не растет с числом строк. Пагинация в этом
+    режиме не применяется.
+    """
+    stream_query_param = 'stream'
+    stream_chunk_size = 1000
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get(self.stream_query_param) not in ('1', 'true'):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return StreamingHttpResponse(self.stream_json(queryset), content_type='application/json')
+
+    def stream_json(self, queryset):
+        encoder = encoders.JSONEncoder(
+            ensure_ascii=not api_settings.UNICODE_JSON,
+            separators=(',', ':') if api_settings.COMPACT_JSON else (', ', ': '),
+        )
+        separator = ''
+        yield '['
+        for chunk in iter_chunks(queryset, self.stream_chunk_size):
+            for item in self.get_serializer(chunk, many=True).data:
+                yield separator + encoder.encode(item)
+                separator = ','
+        yield ']'
@@ -0,0 +1,142 @@
+"""Замеры HTTP-запроса: SQL-запросы, время в базе, сериализация и рендеринг.
+
+Замер включается на время запроса RequestTimingMiddleware (для доли
+запросов REQUEST_TIMING_SAMPLE_RATE) через contextvar, поэтому в него
+попадают и запросы к базе из потоков sync_to_async. Обертка SQL-запросов
+ставится на каждое соединение один раз и без активного замера только
+вызывает запрос, так что замеры можно держать включенными в продакшене.
+"""
+import re
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_current = ContextVar('request_timing', default=None)
+
+_literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_in_lists = re.compile(r'\bIN \((?:[^()]*)\)', re.I)
+
+
+def fingerprint(sql):
+    """SQL без значений: запросы, отличающиеся только параметрами, совпадают"""
+    return _in_lists.sub('IN (...)', _literals.sub('?', sql))
+
+
+class RequestTiming:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()  # SQL -> сколько раз выполнен
+        self.phases = defaultdict(float)  # serialize, render -> секунды без времени в базе
+        self.phase = None
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.statements[sql] += 1
+
+    def add_phase(self, name, seconds):
+        self.phases[name] += seconds
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self.started
+
+    def duplicates(self):
+        """Отпечатки запросов, выполненных больше одного раза (признак N+1), от частых к редким"""
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            fingerprints[fingerprint(sql)] += count
+        return [(sql, count) for sql, count in fingerprints.most_common() if count > 1]
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_seconds * 1000, 3),
+            'db_queries': self.queries,
+            'db_ms': round(self.db_seconds * 1000, 3),
+            'db_duplicates': [{'sql': sql[:500], 'count': count} for sql, count in self.duplicates()],
+            'serialize_ms': round(self.phases['serialize'] * 1000, 3),
+            'render_ms': round(self.phases['render'] * 1000, 3),
+        }
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing"""
+        duplicates = sum(count for _, count in self.duplicates())
+        return ', '.join((
+            f'total;dur={self.total_seconds * 1000:.3f}',
+            f'db;dur={self.db_seconds * 1000:.3f};desc="{self.queries} queries, {duplicates} duplicated"',
+            f'serialize;dur={self.phases["serialize"] * 1000:.3f}',
+            f'render;dur={self.phases["render"] * 1000:.3f}',
+        ))
+
+
+def current():
+    """Замер текущего запроса или None, если запрос не попал в выборку"""
+    return _current.get()
+
+
+@contextmanager
+def activate(timing):
+    token = _current.set(timing)
+    try:
+        yield timing
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """Время блока без времени SQL-запросов внутри него; вложенные фазы не считаются"""
+    timing = _current.get()
+    if timing is None or timing.phase is not None:
+        yield
+        return
+    timing.phase = name
+    started, db_seconds = time.perf_counter(), timing.db_seconds
+    try:
+        yield
+    finally:
+        timing.phase = None
+        timing.add_phase(name, time.perf_counter() - started - (timing.db_seconds - db_seconds))
+
+
+def record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(sql, time.perf_counter() - started)
+
+
+def install(connection, **kwargs):
+    """Ставит обертку record_query на соединение, если ее еще нет"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_all():
+    """Обертка на соединения текущего потока, созданные до подключения сигнала"""
+    for connection in connections.all():
+        install(connection)
+
+
+connection_created.connect(install)
+
+
+class TimedSerializerMixin:
+    """Время to_representation сериализатора попадает в фазу serialize замера"""
+
+    def to_representation(self, instance):
+        if _current.get() is None:
+            return super().to_representation(instance)
+        with phase('serialize'):
+            return super().to_representation(instance)
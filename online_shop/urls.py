@@ -15,7 +15,9 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from online_shop.views import DatabasePoolStatsView, metrics_view
 from orders.views import OrdersViewSet
+from products import async_views
 from products.views import ProductsViewSet, ProductReviewsViewSet, ProductCollectionViewSet
 from rest_framework.routers import DefaultRouter
 
@@ -27,5 +29,19 @@ router.register('product-collections', ProductCollectionViewSet, basename='produ
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/v1/async/products/', async_views.products.list_view(), name='async-products-list'),
+    path('api/v1/async/products/<str:pk>/', async_views.products.detail_view(), name='async-products-detail'),
+    path(
+        'api/v1/async/product-collections/',
+        async_views.product_collections.list_view(),
+        name='async-product-collections-list'
+    ),
+    path(
+        'api/v1/async/product-collections/<str:pk>/',
+        async_views.product_collections.detail_view(),
+        name='async-product-collections-detail'
+    ),
+    path('api/v1/db-pool/', DatabasePoolStatsView.as_view(), name='db-pool'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/v1/', include(router.urls))
 ]
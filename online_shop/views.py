@@ -0,0 +1,19 @@
+from django.http import HttpResponse
+from online_shop import metrics
+from online_shop.db import pool
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from users.views import IsAdmin
+
+
+class DatabasePoolStatsView(APIView):
+    """Статистика пулов соединений процесса, который обработал запрос"""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(pool.get_stats())
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus, без аутентификации: доступ ограничивают на уровне сети"""
+    return HttpResponse(metrics.registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
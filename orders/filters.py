@@ -1,8 +1,8 @@
-from django_filters import rest_framework as filters
+from online_shop.filters import IndexedFilterSet
 from orders.models import Order
 
 
-class OrderFilter(filters.FilterSet):
+class OrderFilter(IndexedFilterSet):
 
     class Meta:
         model = Order
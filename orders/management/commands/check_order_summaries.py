@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from orders import summary
+
+
+class Command(BaseCommand):
+    help = 'Сверяет сводки заказов пользователей с заказами и при --fix пересчитывает расходящиеся'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Пересчитать сводки с расхождениями'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько пользователей сверять за раз'
+        )
+
+    def handle(self, *args, **options):
+        drifted = 0
+        for user_id, expected, actual in summary.find_drift(batch_size=options['batch_size']):
+            drifted += 1
+            self.stdout.write(
+                f'user {user_id}: expected {json.dumps(expected, cls=DjangoJSONEncoder)}, '
+                f'actual {json.dumps(actual, cls=DjangoJSONEncoder)}'
+            )
+            if options['fix']:
+                summary.fix(user_id)
+        message = f'Сводок с расхождениями: {drifted}'
+        if options['fix'] and drifted:
+            message += ', исправлены'
+        self.stdout.write(self.style.SUCCESS(message) if not drifted or options['fix'] else self.style.WARNING(message))
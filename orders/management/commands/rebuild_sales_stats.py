@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from orders import sales
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику продаж товаров по всем заказам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк статистики вставлять за раз'
+        )
+
+    def handle(self, *args, **options):
+        created = sales.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Строк статистики по дням: {created}'))
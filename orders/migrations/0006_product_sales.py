@@ -0,0 +1,100 @@
+# Generated by Django 3.1.14 on 2026-10-17 20:24
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
+import django.db.models.deletion
+
+
+def fill_position_prices(apps, schema_editor):
+    OrderPositions = apps.get_model('orders', 'OrderPositions')
+    Product = apps.get_model('products', 'Product')
+    OrderPositions.objects.update(price=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')))
+
+
+def fill_sales(apps, schema_editor):
+    OrderPositions = apps.get_model('orders', 'OrderPositions')
+    ProductSalesDaily = apps.get_model('orders', 'ProductSalesDaily')
+    ProductSales = apps.get_model('orders', 'ProductSales')
+    done = Q(order__status='DONE')
+    ProductSalesDaily.objects.bulk_create([
+        ProductSalesDaily(**row) for row in OrderPositions.objects.values(
+            'product_id', date=TruncDate('order__created_at')
+        ).annotate(
+            ordered_qty=Sum('quantity'),
+            sold_qty=Coalesce(Sum('quantity', filter=done), 0),
+            revenue=Coalesce(Sum(F('quantity') * F('price'), filter=done, output_field=DecimalField()), 0),
+        ).order_by()
+    ], batch_size=1000)
+    ProductSales.objects.bulk_create([
+        ProductSales(**row) for row in ProductSalesDaily.objects.values('product_id').annotate(
+            ordered_qty=Sum('ordered_qty'), sold_qty=Sum('sold_qty'), revenue=Sum('revenue')
+        ).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_supplier_sku'),
+        ('orders', '0005_auto_20261017_2243'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSales',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sales', serialize=False, to='products.product', verbose_name='Товар')),
+                ('ordered_qty', models.IntegerField(default=0, verbose_name='Заказано')),
+                ('sold_qty', models.IntegerField(default=0, verbose_name='Продано')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара',
+                'verbose_name_plural': 'Продажи товаров',
+            },
+        ),
+        migrations.AddField(
+            model_name='orderpositions',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True, verbose_name='Цена на момент заказа'),
+        ),
+        migrations.RunPython(fill_position_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='orderpositions',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=8, verbose_name='Цена на момент заказа'),
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='День')),
+                ('ordered_qty', models.IntegerField(default=0, verbose_name='Заказано')),
+                ('sold_qty', models.IntegerField(default=0, verbose_name='Продано')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'Продажи товара за день',
+                'verbose_name_plural': 'Продажи товаров по дням',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productsales',
+            index=models.Index(fields=['sold_qty'], name='orders_prod_sold_qt_5c6890_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productsales',
+            index=models.Index(fields=['revenue'], name='orders_prod_revenue_97f79f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productsalesdaily',
+            index=models.Index(fields=['date', 'product'], name='orders_prod_date_024481_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productsalesdaily',
+            unique_together={('product', 'date')},
+        ),
+        migrations.RunPython(fill_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.1.14 on 2026-10-17 20:28
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_summaries(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    UserOrderSummary = apps.get_model('orders', 'UserOrderSummary')
+    UserOrderSummary.objects.bulk_create([
+        UserOrderSummary(**row) for row in Order.objects.values('user_id').annotate(
+            order_count=Count('id'),
+            total_spent=Coalesce(Sum('total_amount'), 0),
+            last_order_at=Max('created_at'),
+        ).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0006_product_sales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserOrderSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_summary', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('order_count', models.IntegerField(default=0, verbose_name='Количество заказов')),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Сумма заказов')),
+                ('last_order_at', models.DateTimeField(null=True, verbose_name='Дата последнего заказа')),
+            ],
+            options={
+                'verbose_name': 'Сводка заказов пользователя',
+                'verbose_name_plural': 'Сводки заказов пользователей',
+            },
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
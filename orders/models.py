@@ -1,5 +1,7 @@
 from django.conf import settings
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce, Greatest
 from products.models import Product
 
 
@@ -28,6 +30,11 @@ class OrderPositions(models.Model):
         default=1,
         verbose_name='Количество'
     )
+    price = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        verbose_name='Цена на момент заказа'
+    )
 
     class Meta:
         verbose_name = 'Позиция'
@@ -39,6 +46,7 @@ class Order(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        db_index=False,  # Покрывается индексом (user, created_at)
         verbose_name='Пользователь'
     )
     products = models.ManyToManyField(
@@ -72,3 +80,170 @@ class Order(models.Model):
     class Meta:
         verbose_name = 'Заказ'
         verbose_name_plural = 'Заказы'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['user', 'created_at']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['total_amount']),
+            models.Index(fields=['updated_at']),
+        ]
+
+
+class CounterQuerySet(models.QuerySet):
+
+    def increment(self, rows):
+        """Прибавляет к счетчикам model.counter_fields приращения rows, поля model.latest_fields
+        заменяет большим из значений (None не меняет поле). Строки ищутся по полям model.counter_key:
+        отсутствующие вставляются, существующие меняются одним INSERT ... ON CONFLICT DO UPDATE"""
+        if not rows:
+            return
+        key_fields, counter_fields = self.model.counter_key, self.model.counter_fields
+        latest_fields = getattr(self.model, 'latest_fields', ())
+        connection = connections[self.db]
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            with transaction.atomic(using=self.db):
+                for row in rows:
+                    obj, _ = self.select_for_update().get_or_create(
+                        **{name: row[name] for name in key_fields}, defaults={name: 0 for name in counter_fields}
+                    )
+                    values = {name: F(name) + row[name] for name in counter_fields}
+                    values.update(
+                        (name, Greatest(Coalesce(F(name), Value(row[name])), Value(row[name])))
+                        for name in latest_fields if row[name] is not None
+                    )
+                    self.filter(pk=obj.pk).update(**values)
+            return
+        quote_name = connection.ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+        names = key_fields + counter_fields + latest_fields
+        fields = [self.model._meta.get_field(name) for name in names]
+        columns = {name: quote_name(field.column) for name, field in zip(names, fields)}
+        sql = 'INSERT INTO {} ({}) VALUES {} ON CONFLICT ({}) DO UPDATE SET {}'.format(
+            table,
+            ', '.join(columns[name] for name in names),
+            ', '.join(['({})'.format(', '.join(['%s'] * len(fields)))] * len(rows)),
+            ', '.join(columns[name] for name in key_fields),
+            ', '.join(
+                ['{1} = {0}.{1} + EXCLUDED.{1}'.format(table, columns[name]) for name in counter_fields] + [
+                    '{2} = {1}(COALESCE({0}.{2}, EXCLUDED.{2}), COALESCE(EXCLUDED.{2}, {0}.{2}))'.format(
+                        table, greatest, columns[name]
+                    ) for name in latest_fields
+                ]
+            )
+        )
+        params = [field.get_db_prep_save(row[field.attname], connection) for row in rows for field in fields]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
+class ProductSalesDaily(models.Model):
+    """Продажи товара за день: заказано во всех заказах, продано и выручка в закрытых заказах.
+    День — дата создания заказа. Обновляется orders.sales"""
+    product = models.ForeignKey(
+        Product,
+        related_name='daily_sales',
+        on_delete=models.CASCADE,
+        db_index=False,  # Покрывается уникальным индексом (product, date)
+        verbose_name='Товар'
+    )
+    date = models.DateField(
+        verbose_name='День'
+    )
+    ordered_qty = models.IntegerField(
+        default=0,
+        verbose_name='Заказано'
+    )
+    sold_qty = models.IntegerField(
+        default=0,
+        verbose_name='Продано'
+    )
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Выручка'
+    )
+
+    objects = CounterQuerySet.as_manager()
+    counter_key = ('product_id', 'date')
+    counter_fields = ('ordered_qty', 'sold_qty', 'revenue')
+
+    class Meta:
+        unique_together = ['product', 'date']
+        verbose_name = 'Продажи товара за день'
+        verbose_name_plural = 'Продажи товаров по дням'
+        indexes = [
+            models.Index(fields=['date', 'product']),
+        ]
+
+
+class ProductSales(models.Model):
+    """Продажи товара за все время, сумма ProductSalesDaily по дням"""
+    product = models.OneToOneField(
+        Product,
+        primary_key=True,
+        related_name='sales',
+        on_delete=models.CASCADE,
+        verbose_name='Товар'
+    )
+    ordered_qty = models.IntegerField(
+        default=0,
+        verbose_name='Заказано'
+    )
+    sold_qty = models.IntegerField(
+        default=0,
+        verbose_name='Продано'
+    )
+    revenue = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Выручка'
+    )
+
+    objects = CounterQuerySet.as_manager()
+    counter_key = ('product_id', )
+    counter_fields = ('ordered_qty', 'sold_qty', 'revenue')
+
+    class Meta:
+        verbose_name = 'Продажи товара'
+        verbose_name_plural = 'Продажи товаров'
+        indexes = [
+            models.Index(fields=['sold_qty']),
+            models.Index(fields=['revenue']),
+        ]
+
+
+class UserOrderSummary(models.Model):
+    """Сводка заказов пользователя: число заказов, сумма и дата последнего заказа. Обновляется orders.summary"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        related_name='order_summary',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь'
+    )
+    order_count = models.IntegerField(
+        default=0,
+        verbose_name='Количество заказов'
+    )
+    total_spent = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        verbose_name='Сумма заказов'
+    )
+    last_order_at = models.DateTimeField(
+        null=True,
+        verbose_name='Дата последнего заказа'
+    )
+
+    objects = CounterQuerySet.as_manager()
+    counter_key = ('user_id', )
+    counter_fields = ('order_count', 'total_spent')
+    latest_fields = ('last_order_at', )
+
+    class Meta:
+        verbose_name = 'Сводка заказов пользователя'
+        verbose_name_plural = 'Сводки заказов пользователей'
@@ -0,0 +1,98 @@
+"""Накопительная статистика продаж товаров: ProductSalesDaily по дням и ProductSales за все время.
+
+Заказ добавляет в статистику своего дня (даты создания) заказанное количество
+позиций, а закрытый заказ (DONE) еще и проданное количество и выручку по ценам
+позиций. При создании, изменении и удалении заказа вклад заказа до и после
+изменения вычитается друг из друга и разница прибавляется к таблицам двумя
+запросами. Изменения в обход API (админка, SQL) исправляет полный пересчет:
+manage.py rebuild_sales_stats.
+"""
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from orders.models import OrderPositions, OrderStatusChoices, ProductSales, ProductSalesDaily
+
+STATS_ORDERING = ('sold_qty', 'revenue', 'ordered_qty')
+
+
+def order_sales(order, positions, sign=1, into=None):
+    """Вклад заказа в статистику {(id товара, день): [заказано, продано, выручка]},
+    со знаком sign прибавляется к into"""
+    sales = {} if into is None else into
+    day = timezone.localdate(order.created_at)
+    done = order.status == OrderStatusChoices.DONE
+    for position in positions:
+        counters = sales.setdefault((position.product_id, day), [0, 0, 0])
+        counters[0] += sign * position.quantity
+        if done:
+            counters[1] += sign * position.quantity
+            counters[2] += sign * position.quantity * position.price
+    return sales
+
+
+def apply(sales):
+    """Прибавляет изменения order_sales к таблицам статистики"""
+    daily, totals = [], {}
+    for (product_id, day), counters in sorted(sales.items()):  # Один порядок строк, чтобы не ловить взаимоблокировки
+        if not any(counters):
+            continue
+        ordered_qty, sold_qty, revenue = counters
+        daily.append({'product_id': product_id, 'date': day, 'ordered_qty': ordered_qty, 'sold_qty': sold_qty,
+                      'revenue': revenue})
+        total = totals.setdefault(product_id, {'product_id': product_id, 'ordered_qty': 0, 'sold_qty': 0,
+                                               'revenue': 0})
+        total['ordered_qty'] += ordered_qty
+        total['sold_qty'] += sold_qty
+        total['revenue'] += revenue
+    ProductSalesDaily.objects.increment(daily)
+    ProductSales.objects.increment(list(totals.values()))
+
+
+def _bulk_create(model, rows, batch_size):
+    rows = iter(rows)
+    created = 0
+    while True:
+        batch = [model(**row) for row in islice(rows, batch_size)]
+        if not batch:
+            return created
+        model.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def rebuild(batch_size=1000):
+    """Пересчитывает статистику по всем позициям заказов, возвращает число строк по дням"""
+    done = Q(order__status=OrderStatusChoices.DONE)
+    daily = OrderPositions.objects.values('product_id', date=TruncDate('order__created_at')).annotate(
+        ordered_qty=Sum('quantity'),
+        sold_qty=Coalesce(Sum('quantity', filter=done), 0),
+        revenue=Coalesce(Sum(F('quantity') * F('price'), filter=done, output_field=DecimalField()), 0),
+    ).order_by()
+    totals = ProductSalesDaily.objects.values('product_id').annotate(
+        ordered_qty=Sum('ordered_qty'), sold_qty=Sum('sold_qty'), revenue=Sum('revenue')
+    ).order_by()
+    with transaction.atomic():
+        ProductSalesDaily.objects.all().delete()
+        ProductSales.objects.all().delete()
+        created = _bulk_create(ProductSalesDaily, daily.iterator(), batch_size)
+        _bulk_create(ProductSales, totals.iterator(), batch_size)
+    return created
+
+
+def get_stats(ordering='-sold_qty', date_from=None, date_to=None, limit=20):
+    """Товары с наибольшими (или наименьшими) продажами: за все время из ProductSales,
+    за период дней заказов — суммой строк ProductSalesDaily"""
+    if date_from is None and date_to is None:
+        queryset = ProductSales.objects.values('product_id', 'ordered_qty', 'sold_qty', 'revenue')
+    else:
+        queryset = ProductSalesDaily.objects.all()
+        if date_from is not None:
+            queryset = queryset.filter(date__gte=date_from)
+        if date_to is not None:
+            queryset = queryset.filter(date__lte=date_to)
+        queryset = queryset.values('product_id').annotate(
+            ordered_qty=Sum('ordered_qty'), sold_qty=Sum('sold_qty'), revenue=Sum('revenue')
+        )
+    return queryset.annotate(name=F('product__name')).order_by(ordering, 'product_id')[:limit]
@@ -1,20 +1,74 @@
-from orders.models import Order, OrderPositions
+from django.db import connections, transaction
+from online_shop import metrics
+from online_shop.timing import TimedSerializerMixin
+from orders import sales, summary
+from orders.models import Order, OrderPositions, UserOrderSummary
 from products.models import Product
 from rest_framework import serializers
 from rest_framework.fields import DecimalField
 from users.serializers import UserSerializer
 
 
+def _to_pk(value):
+    """id товара из входных данных или None, если это не число"""
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class PositionProductField(serializers.PrimaryKeyRelatedField):
+    """Товар позиции, берется из товаров, загруженных списком позиций"""
+
+    def to_internal_value(self, data):
+        products = getattr(self.parent.parent, 'products', None)
+        if products is None:
+            return super().to_internal_value(data)
+        pk = _to_pk(data)
+        if pk is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in products:
+            self.fail('does_not_exist', pk_value=data)
+        return products[pk]
+
+
+class OrderPositionsListSerializer(serializers.ListSerializer):
+    """Список позиций заказа, товары всех позиций загружаются одним запросом"""
+
+    def to_internal_value(self, data):
+        self.products = self.context.get('products')  # Товары могут быть уже загружены на весь пакет заказов
+        if self.products is None:
+            self.products = self.load_products([data])
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def load_products(positions_lists):
+        """Загружает одним запросом товары из нескольких списков позиций"""
+        product_ids = set()
+        for positions in positions_lists:
+            if isinstance(positions, list):
+                product_ids.update(
+                    _to_pk(position.get('product_id')) for position in positions if isinstance(position, dict)
+                )
+        product_ids.discard(None)
+        return Product.objects.in_bulk(product_ids)
+
+
 class OrderPositionsSerializer(serializers.Serializer):
 
-    product_id = serializers.PrimaryKeyRelatedField(
+    product_id = PositionProductField(
         queryset=Product.objects.all(),
         required=True,
     )
     quantity = serializers.IntegerField(min_value=1, default=1)
 
+    class Meta:
+        list_serializer_class = OrderPositionsListSerializer
+
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     products = OrderPositionsSerializer(
         many=True,
@@ -32,53 +86,102 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = ('id', 'user', 'products', 'status', 'total_amount', 'created_at', 'updated_at')
 
     def create(self, validated_data):
-
         validated_data['user'] = self.context['request'].user  # Проставляем значения поля user по-умолчанию
-
-        positions_data = validated_data.pop('positions')
-        total_amount = 0  # Считаем и добавляем в validated_data total_amount
-        if positions_data:
-            for position in positions_data:
-                total_amount += position['product_id'].price * position['quantity']
-        validated_data['total_amount'] = total_amount
-
-        order = super().create(validated_data)
-
-        if positions_data:  # Создаем поля в промежуточной таблице
-            to_save = []
-            for position in positions_data:
-                to_save.append(OrderPositions(
-                    product=position['product_id'],
-                    quantity=position['quantity'],
-                    order_id=order.id,
-                ))
-            OrderPositions.objects.bulk_create(to_save)
-
-        return order
+        return self.create_orders([validated_data])[0]
+
+    @staticmethod
+    def get_total_amount(positions_data):
+        """Сумма заказа по ценам товаров позиций"""
+        total_amount = 0
+        for position in positions_data:
+            total_amount += position['product_id'].price * position['quantity']
+        return total_amount
+
+    @classmethod
+    def create_orders(cls, validated_data_list):
+        """Создает заказы вместе с позициями: все заказы и все позиции вставляются двумя bulk_create"""
+        orders, positions = [], []
+        for validated_data in validated_data_list:
+            validated_data = dict(validated_data)
+            positions_data = validated_data.pop('positions')
+            validated_data['total_amount'] = cls.get_total_amount(positions_data)
+            orders.append(Order(**validated_data))
+            positions.append(positions_data)
+
+        with transaction.atomic():
+            if connections[Order.objects.db].features.can_return_rows_from_bulk_insert:
+                Order.objects.bulk_create(orders)
+            else:  # База не возвращает id из bulk_create, вставляем заказы по одному
+                for order in orders:
+                    order.save(force_insert=True)
+            orders_positions = [
+                [
+                    OrderPositions(
+                        product=position['product_id'],
+                        quantity=position['quantity'],
+                        price=position['product_id'].price,
+                        order_id=order.id,
+                    )
+                    for position in positions_data
+                ]
+                for order, positions_data in zip(orders, positions)
+            ]
+            OrderPositions.objects.bulk_create(  # Создаем поля в промежуточной таблице
+                position for order_positions in orders_positions for position in order_positions
+            )
+            orders_sales = {}
+            for order, order_positions in zip(orders, orders_positions):
+                sales.order_sales(order, order_positions, into=orders_sales)
+            sales.apply(orders_sales)
+            summary.add_orders(orders)
+        metrics.orders_created.inc(len(orders))
+        return orders
 
     def update(self, instance, validated_data):
-        validated_data['user'] = instance.user  # Проставляем значения поля user из оригинального заказа
-
-        positions_data = validated_data.pop('positions')
-        total_amount = 0  # Считаем и добавляем в validated_data total_amount
-        if positions_data:
-            for position in positions_data:
-                total_amount += position['product_id'].price * position['quantity']
-        validated_data['total_amount'] = total_amount
-
-        order = super().create(validated_data)
-
-        if positions_data:  # Создаем поля в промежуточной таблице
-            to_save = []
-            for position in positions_data:
-                to_save.append(OrderPositions(
-                    product=position['product_id'],
-                    quantity=position['quantity'],
-                    order_id=order.id,
-                ))
-            OrderPositions.objects.bulk_create(to_save)
-
-        return order
+        """Изменяет заказ на месте: позиции сравниваются с текущими, в базу пишется только разница"""
+        positions_data = validated_data.pop('positions', None)
+        update_fields = ['updated_at']
+        old_total_amount = instance.total_amount
+        with transaction.atomic():
+            positions = list(instance.positions.all())
+            order_sales = sales.order_sales(instance, positions, sign=-1)  # Вклад заказа до изменения
+            if positions_data is not None:
+                positions = self.update_positions(instance, positions_data)
+                instance.total_amount = self.get_total_amount(positions_data)  # Сумма пересчитывается один раз
+                update_fields.append('total_amount')
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+                update_fields.append(attr)
+            instance.save(update_fields=update_fields)
+            sales.apply(sales.order_sales(instance, positions, into=order_sales))
+            summary.change_total(instance, old_total_amount)
+        return instance
+
+    @staticmethod
+    def update_positions(order, positions_data):
+        """Создает, изменяет и удаляет позиции заказа не более чем тремя запросами, возвращает новые позиции.
+        Цены позиций обновляются вместе с суммой заказа"""
+        current = {position.product_id: position for position in order.positions.all()}
+        positions, to_create, to_update = [], [], []
+        for position_data in positions_data:
+            product = position_data['product_id']
+            position = current.pop(product.id, None)
+            if position is None:
+                position = OrderPositions(order=order, product=product, quantity=position_data['quantity'],
+                                          price=product.price)
+                to_create.append(position)
+            elif position.quantity != position_data['quantity'] or position.price != product.price:
+                position.quantity = position_data['quantity']
+                position.price = product.price
+                to_update.append(position)
+            positions.append(position)
+        if current:  # Оставшихся товаров нет в новых позициях
+            OrderPositions.objects.filter(id__in=[position.id for position in current.values()]).delete()
+        if to_update:
+            OrderPositions.objects.bulk_update(to_update, ['quantity', 'price'])
+        if to_create:
+            OrderPositions.objects.bulk_create(to_create)
+        return positions
 
     def validate(self, data):
         """Проверяем, что статус могут менять только админы"""
@@ -91,3 +194,29 @@ class OrderSerializer(serializers.ModelSerializer):
             if len(product_ids) != len(data['positions']):
                 raise serializers.ValidationError('Products should be unique')
         return data
+
+
+class ProductSalesQuerySerializer(serializers.Serializer):
+    """Параметры запроса статистики продаж товаров"""
+    ordering = serializers.ChoiceField(
+        choices=[prefix + field for field in sales.STATS_ORDERING for prefix in ('-', '')],
+        default='-sold_qty',
+    )
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=20)
+
+
+class ProductSalesSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField()
+    name = serializers.CharField()
+    ordered_qty = serializers.IntegerField()
+    sold_qty = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class UserOrderSummarySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = UserOrderSummary
+        fields = ('order_count', 'total_spent', 'last_order_at')
@@ -0,0 +1,93 @@
+"""Сводка заказов пользователя (UserOrderSummary) для страницы аккаунта.
+
+Строка пользователя меняется в той же транзакции, что и его заказы: создание
+прибавляет число и сумму заказов и сдвигает дату последнего заказа, изменение
+суммы заказа прибавляет разницу, удаление вычитает заказ и берет дату
+последнего заказа из оставшихся по индексу (user, created_at). Расхождения
+(например, после изменений в обход API) находит и исправляет
+manage.py check_order_summaries --fix.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from orders.models import Order, UserOrderSummary
+
+SUMMARY_FIELDS = ('order_count', 'total_spent', 'last_order_at')
+
+
+def add_orders(orders):
+    """Учитывает созданные заказы"""
+    rows = {}
+    for order in orders:
+        row = rows.setdefault(order.user_id, {'user_id': order.user_id, 'order_count': 0, 'total_spent': 0,
+                                              'last_order_at': order.created_at})
+        row['order_count'] += 1
+        row['total_spent'] += order.total_amount or 0
+        row['last_order_at'] = max(row['last_order_at'], order.created_at)
+    UserOrderSummary.objects.increment([rows[user_id] for user_id in sorted(rows)])
+
+
+def change_total(order, old_total_amount):
+    """Учитывает изменение суммы заказа"""
+    delta = (order.total_amount or 0) - (old_total_amount or 0)
+    if delta:
+        UserOrderSummary.objects.increment(
+            [{'user_id': order.user_id, 'order_count': 0, 'total_spent': delta, 'last_order_at': None}]
+        )
+
+
+def remove_order(order):
+    """Учитывает удаленный заказ, вызывается после удаления. Сводка без заказов удаляется,
+    как при пересчете: у пользователя без заказов строки сводки нет"""
+    UserOrderSummary.objects.filter(user_id=order.user_id).update(
+        order_count=F('order_count') - 1,
+        total_spent=F('total_spent') - (order.total_amount or 0),
+        last_order_at=Subquery(
+            Order.objects.filter(user_id=OuterRef('user_id')).order_by('-created_at').values('created_at')[:1]
+        ),
+    )
+    UserOrderSummary.objects.filter(user_id=order.user_id, order_count__lte=0).delete()
+
+
+def get_summary(user):
+    """Сводка пользователя одним запросом по первичному ключу, для пользователя без заказов — пустая"""
+    return UserOrderSummary.objects.filter(user_id=user.id).first() or UserOrderSummary(user_id=user.id)
+
+
+def order_totals(orders):
+    return orders.values('user_id').annotate(
+        order_count=Count('id'),
+        total_spent=Coalesce(Sum('total_amount'), 0),
+        last_order_at=Max('created_at'),
+    ).order_by()
+
+
+def find_drift(batch_size=10000):
+    """Пользователи, у которых сводка расходится с заказами: (id пользователя, по заказам, в сводке).
+    Значение None — у пользователя нет заказов или нет строки сводки"""
+    max_id = get_user_model().objects.aggregate(max_id=Max('id'))['max_id'] or 0
+    for start in range(0, max_id + 1, batch_size):  # Диапазонами id, чтобы не читать все заказы сразу
+        user_ids = {'user_id__gte': start, 'user_id__lt': start + batch_size}
+        expected = {row.pop('user_id'): row for row in order_totals(Order.objects.filter(**user_ids))}
+        actual = {
+            row.pop('user_id'): row
+            for row in UserOrderSummary.objects.filter(**user_ids).values('user_id', *SUMMARY_FIELDS)
+        }
+        for user_id in sorted(expected.keys() | actual.keys()):
+            if expected.get(user_id) != actual.get(user_id):
+                yield user_id, expected.get(user_id), actual.get(user_id)
+
+
+def fix(user_id):
+    """Пересчитывает сводку пользователя по заказам. Строка сводки блокируется на время пересчета,
+    поэтому параллельно созданный заказ либо уже учтен в пересчете, либо прибавится после него"""
+    with transaction.atomic():
+        exists = UserOrderSummary.objects.select_for_update().filter(user_id=user_id).exists()
+        expected = next(iter(order_totals(Order.objects.filter(user_id=user_id))), None)
+        if expected is None:
+            UserOrderSummary.objects.filter(user_id=user_id).delete()
+        elif exists:
+            UserOrderSummary.objects.filter(user_id=user_id).update(**expected)
+        else:
+            UserOrderSummary.objects.create(**expected)
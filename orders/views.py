@@ -1,28 +1,118 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django_filters.rest_framework import DjangoFilterBackend
+from online_shop.compiled import CompiledReadMixin
+from online_shop.conditional import ConditionalMixin
+from online_shop.export import ExportMixin
+from online_shop.streaming import StreamingListMixin
+from orders import sales, summary
 from orders.filters import OrderFilter
-from orders.models import Order
-from orders.serializers import OrderSerializer
+from orders.models import Order, OrderPositions
+from orders.serializers import OrderSerializer, OrderPositionsListSerializer, UserOrderSummarySerializer
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
-from users.views import IsAdminOrOwner
+from users.views import IsAdminOrOwner, IsAdmin
 
 
-class OrdersViewSet(ModelViewSet):
+class OrdersViewSet(ExportMixin, ConditionalMixin, StreamingListMixin, CompiledReadMixin, ModelViewSet):
 
-    queryset = Order.objects.all().prefetch_related('products').select_related('user')
+    queryset = Order.objects.all().prefetch_related(
+        Prefetch('positions', queryset=OrderPositions.objects.select_related('product').order_by('id'))
+    ).select_related('user')
     serializer_class = OrderSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = OrderFilter
     http_method_names = ['get', 'post', 'put', 'delete']
+    bulk_max_size = 500
+    export_fields = (  # Строка на каждую позицию заказа
+        ('order_id', 'id'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('status', 'status'),
+        ('total_amount', 'total_amount'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+        ('product_id', 'positions__product_id'),
+        ('product_name', 'positions__product__name'),
+        ('product_price', 'positions__price'),  # Цена на момент заказа
+        ('quantity', 'positions__quantity'),
+    )
 
     def list(self, request, *args, **kwargs):
         if not request.user.is_staff:
             self.queryset = self.queryset.filter(user=request.user)
         return super().list(request, *args, **kwargs)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['update', 'partial_update', 'destroy']:  # Блокируем заказ до конца изменения позиций
+            queryset = queryset.select_for_update(of=('self', ))
+        return queryset
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        positions = list(instance.positions.all())
+        instance.delete()
+        sales.apply(sales.order_sales(instance, positions, sign=-1))
+        summary.remove_order(instance)
+
     def get_permissions(self):
         if self.action in ['retrieve', 'list', 'update', 'partial_update', 'destroy']:
             return [IsAuthenticated(), IsAdminOrOwner()]
-        elif self.action == 'create':
+        elif self.action in ['create', 'bulk_create', 'summary']:
             return [IsAuthenticated()]
+        elif self.action == 'export':
+            return [IsAdmin()]
         return []
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request, *args, **kwargs):
+        """Число заказов, сумма и дата последнего заказа текущего пользователя из сводки, без чтения заказов"""
+        return Response(UserOrderSummarySerializer(summary.get_summary(request.user)).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_create(self, request, *args, **kwargs):
+        """Создание пакета заказов. Заказы с ошибками пропускаются, остальные создаются"""
+        if not isinstance(request.data, list) or not request.data:
+            raise ValidationError('Expected a non-empty list of orders')
+        if len(request.data) > self.bulk_max_size:
+            raise ValidationError(f'Maximum {self.bulk_max_size} orders per request')
+
+        context = self.get_serializer_context()  # Товары всего пакета загружаются одним запросом
+        context['products'] = OrderPositionsListSerializer.load_products(
+            [item.get('products') for item in request.data if isinstance(item, dict)]
+        )
+        serializers = [OrderSerializer(data=item, context=context) for item in request.data]
+        valid_serializers = [serializer for serializer in serializers if serializer.is_valid()]
+
+        orders = OrderSerializer.create_orders(
+            [dict(serializer.validated_data, user=request.user) for serializer in valid_serializers]
+        )
+        prefetch_related_objects(orders, 'positions')
+        for serializer, order in zip(valid_serializers, orders):
+            serializer.instance = order
+
+        results = []
+        for serializer in serializers:
+            if serializer.errors:
+                results.append({'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors})
+            else:
+                results.append({'status': status.HTTP_201_CREATED, 'data': serializer.data})
+        if not orders:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(orders) < len(serializers):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(results, status=response_status)
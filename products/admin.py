@@ -4,10 +4,11 @@ from products.models import Product, ProductReview, ProductCollection
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'price', 'created_at')
+    list_display = ('id', 'name', 'price', 'rating_avg', 'created_at')
     list_display_links = ('id', 'name', 'price', 'created_at')
     list_filter = ('name', )
-    search_fields = ('id', 'name')
+    search_fields = ('id', 'name', 'supplier_sku')
+    readonly_fields = ('review_count', 'rating_sum', 'rating_avg')
 
 
 @admin.register(ProductReview)
@@ -0,0 +1,111 @@
+"""Асинхронные эндпоинты чтения каталога для запуска под ASGI.
+
+Разбор запроса и рендеринг JSON выполняются в цикле событий, а работа
+с базой (аутентификация, фильтры, выборка, сериализация, кэш каталога) —
+одним вызовом sync_to_async на запрос: асинхронного ORM в Django 3.1 нет.
+Вызов идет в пуле потоков, а не в общем потоке синхронных view, и в конце
+возвращает соединение с базой (в пул соединений при CONN_MAX_AGE = 0).
+
+Настройки берутся из соответствующего ModelViewSet, поэтому JSON ответа
+совпадает с ответом синхронного эндпоинта.
+"""
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse
+from django_filters.utils import translate_validation
+from online_shop import timing
+from online_shop.compiled import get_compiled_serializer
+from products import cache
+from products.views import ProductsViewSet, ProductCollectionViewSet
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+
+
+async def run_in_thread(func, *args):
+    """Выполняет синхронную работу с базой в пуле потоков и освобождает соединение"""
+    def call():
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return await sync_to_async(call, thread_sensitive=False)()
+
+
+class AsyncReadEndpoint:
+    """list и retrieve ModelViewSet в виде асинхронных view"""
+
+    def __init__(self, viewset_class):
+        self.viewset_class = viewset_class
+        self.renderer = JSONRenderer()
+
+    def list_view(self):
+        async def view(request):
+            return await self.respond(request, self.load_list)
+        return view
+
+    def detail_view(self):
+        async def view(request, pk):
+            return await self.respond(request, self.load_detail, pk)
+        return view
+
+    async def respond(self, request, load, *args):
+        status_code, data, headers = await run_in_thread(self.load, request, load, *args)
+        with timing.phase('render'):
+            content = self.renderer.render(data)
+        response = HttpResponse(content, status=status_code, content_type='application/json')
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def load(self, request, load, *args):
+        """(статус, данные, заголовки) ответа, как их вернул бы ModelViewSet"""
+        viewset = self.viewset_class
+        drf_request = Request(request, authenticators=[auth() for auth in viewset.authentication_classes])
+        try:
+            if not viewset.is_cacheable(drf_request):  # Те же условия, что у CachedReadMixin
+                return status.HTTP_200_OK, load(drf_request, *args), {}
+            return status.HTTP_200_OK, cache.cached(drf_request, lambda: load(drf_request, *args)), {}
+        except (APIException, Http404) as exc:  # Ответ об ошибке строит обработчик DRF
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)) and drf_request.authenticators:
+                # Как APIView.handle_exception
+                exc.auth_header = drf_request.authenticators[0].authenticate_header(drf_request)
+            response = exception_handler(exc, {'request': drf_request, 'view': None})
+            headers = {name: response[name] for name in ('WWW-Authenticate', 'Retry-After') if name in response}
+            return response.status_code, response.data, headers
+
+    def get_viewset(self, drf_request, action, **kwargs):
+        """Экземпляр вьюсета без обработки запроса: queryset, сериализатор и параметры вывода
+        (например, ?products подборок) выбираются теми же методами, что в синхронном запросе"""
+        return self.viewset_class(request=drf_request, args=(), kwargs=kwargs, format_kwarg=None, action=action)
+
+    def load_list(self, drf_request):
+        viewset = self.get_viewset(drf_request, 'list')
+        queryset = viewset.get_queryset()
+        filterset = viewset.filterset_class(drf_request.query_params, queryset=queryset, request=drf_request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        queryset = filterset.qs
+        paginator = viewset.pagination_class()
+        compiled = get_compiled_serializer(viewset.get_serializer_class())  # Как CompiledReadMixin.list
+        if compiled is not None:
+            queryset = compiled.prepare(queryset, paginator.get_position_lookups(queryset))
+        page = paginator.paginate_queryset(queryset, drf_request)
+        rows = queryset if page is None else page
+        if compiled is not None:
+            data = compiled.serialize(rows)
+        else:
+            data = viewset.get_serializer(rows, many=True).data
+        if page is not None:
+            return paginator.get_paginated_response(data).data
+        return data
+
+    def load_detail(self, drf_request, pk):
+        viewset = self.get_viewset(drf_request, 'retrieve', pk=pk)
+        return viewset.get_serializer(viewset.get_object()).data
+
+
+products = AsyncReadEndpoint(ProductsViewSet)
+product_collections = AsyncReadEndpoint(ProductCollectionViewSet)
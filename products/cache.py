@@ -0,0 +1,132 @@
+"""Кэш ответов каталога для анонимных GET-запросов.
+
+Ключ ответа включает номер поколения каталога. Любое изменение товаров,
+подборок или отзывов увеличивает поколение, после чего старые ключи больше
+не читаются и вытесняются по таймауту. Бэкенд задается алиасом
+settings.API_CACHE_ALIAS в CACHES: locmem в тестах, файловый кэш
+(в том числе в /dev/shm) или любой общий кэш Django на серверах.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from online_shop import metrics
+from online_shop.conditional import conditional_response, get_validators, set_headers
+from rest_framework.response import Response
+
+GENERATION_KEY = 'catalog:generation'
+HITS_KEY = 'catalog:hits'
+MISSES_KEY = 'catalog:misses'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def _incr(cache, key):
+    try:
+        return cache.incr(key)
+    except ValueError:  # Ключа еще нет или он вытеснен
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def _count(cache, hit):
+    _incr(cache, HITS_KEY if hit else MISSES_KEY)
+    metrics.catalog_cache_requests.inc(result='hit' if hit else 'miss')
+
+
+def get_generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Новое поколение начинается с текущего времени, чтобы после вытеснения
+        # счетчика не совпасть с поколением еще живых старых ключей
+        cache.add(GENERATION_KEY, int(time.time() * 1000), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def _bump_generation():
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        get_generation(cache)
+
+
+def invalidate():
+    """Сбрасывает кэш каталога сразу и еще раз после коммита транзакции,
+    чтобы параллельный запрос не закэшировал данные до коммита"""
+    _bump_generation()
+    transaction.on_commit(_bump_generation)
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([HITS_KEY, MISSES_KEY])
+
+
+def get_cache_key(request, cache):
+    """Ключ по пути и отсортированным параметрам запроса"""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.md5(f'{request.path}?{query}'.encode('utf-8')).hexdigest()
+    return f'catalog:{get_generation(cache)}:{digest}'
+
+
+def cached(request, load):
+    """Данные ответа из кэша или от load(); если load() бросает исключение, ничего не кэшируется"""
+    cache = get_cache()
+    key = get_cache_key(request, cache)
+    data = cache.get(key)
+    if data is not None:
+        _count(cache, hit=True)
+        return data
+    _count(cache, hit=False)
+    data = load()
+    cache.set(key, data)
+    return data
+
+
+class CachedReadMixin:
+    """Кэширует данные ответов list и retrieve для анонимных пользователей вместе с ETag и Last-Modified,
+    поэтому условный запрос, попавший в кэш, получает 304 без обращения к базе"""
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(super().retrieve, request, *args, **kwargs)
+
+    @classmethod
+    def is_cacheable(cls, request):
+        return request.user.is_anonymous
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        key = get_cache_key(request, cache)
+        entry = cache.get(key)
+        if entry is not None:
+            _count(cache, hit=True)
+            data, validators = entry
+            return conditional_response(request, validators) or set_headers(Response(data), validators)
+        _count(cache, hit=False)
+        response = handler(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == 200:
+            cache.set(key, (response.data, get_validators(response)))
+        return response
@@ -1,18 +1,56 @@
+from django.db.models import F
 from django_filters import rest_framework as filters
+from online_shop.filters import IndexedFilterSet
 from products.models import Product, ProductReview, ProductCollection
+from products.search import search_products
+
+
+SALES_ORDERING = ('sold_qty', 'revenue')
+
+
+def is_sales_ordering(query_params):
+    """Сортировка по продажам: статистика меняется с заказами, без изменения товаров"""
+    ordering = query_params.get('ordering', '')
+    return any(field.strip().lstrip('-') in SALES_ORDERING for field in ordering.split(','))
+
+
+class ProductOrderingFilter(filters.OrderingFilter):
+    """Товары без продаж (без строки статистики) считаются товарами с нулевыми продажами"""
+
+    def get_ordering_value(self, param):
+        value = super().get_ordering_value(param)
+        field_name = value.lstrip('-')
+        if not field_name.startswith('sales__'):
+            return value
+        if value.startswith('-'):
+            return F(field_name).desc(nulls_last=True)
+        return F(field_name).asc(nulls_first=True)
 
 
 class ProductFilter(filters.FilterSet):
+    ordering = ProductOrderingFilter(
+        fields=('price', 'review_count', 'rating_avg', 'created_at') + tuple(
+            (f'sales__{field}', field) for field in SALES_ORDERING
+        )
+    )
+    search = filters.CharFilter(method='filter_search')
+
     class Meta:
         model = Product
         fields = {
             'price': ['exact', 'lte', 'gte'],
-            'name': ['iexact', 'icontains'],
-            'description': ['icontains']
+            'name': ['iexact', 'icontains'],  # Индексы по UPPER(name::text), миграция 0005
+            'description': ['icontains'],
+            'review_count': ['exact', 'lte', 'gte'],
+            'rating_avg': ['lte', 'gte']
         }
 
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск, без явного ordering результаты сортируются по релевантности"""
+        return search_products(queryset, value, order_by_rank=not self.form.cleaned_data.get('ordering'))
+
 
-class ProductReviewFilter(filters.FilterSet):
+class ProductReviewFilter(IndexedFilterSet):
     class Meta:
         model = ProductReview
         fields = {
@@ -27,5 +65,5 @@ class ProductCollectionFilter(filters.FilterSet):
     class Meta:
         model = ProductCollection
         fields = {
-            'name': ['iexact', 'icontains']
+            'name': ['iexact', 'icontains']  # Индексы по UPPER(name::text), миграция 0005
         }
@@ -0,0 +1,130 @@
+"""Импорт товаров из файлов поставщиков.
+
+Файл читается построчно (CSV с заголовком или NDJSON), строки проверяются
+теми же правилами, что и в ProductSerializer, и пачками записываются в базу
+запросом INSERT ... ON CONFLICT (supplier_sku) DO UPDATE: товары с уже
+известным артикулом поставщика обновляются, остальные создаются. Память не
+растет с размером файла: в ней держится только текущая пачка и ограниченное
+число ошибок.
+"""
+import csv
+import json
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from products import cache
+from products.models import Product
+from products.serializers import ProductSerializer
+from rest_framework import serializers
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+UPDATE_FIELDS = ('name', 'description', 'price')
+
+
+class ProductImportSerializer(ProductSerializer):
+    """Строка файла импорта, правила полей берутся из ProductSerializer"""
+
+    class Meta(ProductSerializer.Meta):
+        fields = ('supplier_sku', ) + UPDATE_FIELDS
+        extra_kwargs = {
+            # Уникальность артикула не проверяется по строке: по нему делается upsert
+            'supplier_sku': {'required': True, 'allow_null': False, 'allow_blank': False, 'validators': []},
+        }
+
+
+class ImportResult:
+
+    def __init__(self, max_errors):
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': errors})
+
+    @property
+    def rows(self):
+        return self.created + self.updated + self.error_count
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+def read_rows(lines, file_format):
+    """Номер строки файла и данные строки (или ошибка разбора) по одной"""
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_num, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_num, serializers.ValidationError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(row, dict):
+                row = serializers.ValidationError('Expected a JSON object')
+            yield line_num, row
+
+
+def import_products(lines, file_format, batch_size=1000, max_errors=1000):
+    """Импортирует товары из итератора строк файла, возвращает ImportResult"""
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f'Unknown import format: {file_format}')
+    result = ImportResult(max_errors)
+    serializer = ProductImportSerializer()  # Поля строятся один раз на весь файл
+    rows = read_rows(lines, file_format)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        valid = {}
+        for line_num, row in batch:
+            try:
+                if isinstance(row, serializers.ValidationError):
+                    raise row
+                data = serializer.run_validation(row)
+            except serializers.ValidationError as e:
+                result.add_error(line_num, e.detail)
+                continue
+            valid[data['supplier_sku']] = data  # При повторе артикула в пачке побеждает последняя строка
+        save_batch(valid, result)
+    cache.invalidate()  # Запись идет мимо моделей, сигналы не вызываются
+    result.finish()
+    return result
+
+
+def save_batch(valid, result):
+    """Записывает пачку одним upsert на каждый набор заполненных полей:
+    поле, которого нет в строке, у существующего товара не меняется"""
+    groups = defaultdict(list)
+    for data in valid.values():
+        groups[tuple(field for field in UPDATE_FIELDS if field in data)].append(Product(**data))
+    with transaction.atomic():
+        existing = Product.objects.filter(supplier_sku__in=list(valid)).count()
+        for update_fields, products in groups.items():
+            Product.objects.upsert(products, update_fields)
+        Product.objects.filter(supplier_sku__in=list(valid)).update_search_vector()
+    result.created += len(valid) - existing
+    result.updated += existing
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from products import cache
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи кэша ответов каталога'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Сбросить счетчики и закэшированные ответы'
+        )
+
+    def handle(self, *args, **options):
+        stats = cache.get_stats()
+        self.stdout.write(
+            f"hits: {stats['hits']}\nmisses: {stats['misses']}\nhit ratio: {stats['hit_ratio']}"
+        )
+        if options['reset']:
+            cache.reset_stats()
+            cache.invalidate()
+            self.stdout.write(self.style.SUCCESS('Счетчики и кэш сброшены'))
@@ -0,0 +1,39 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import IMPORT_FORMATS, import_products
+
+
+class Command(BaseCommand):
+    help = 'Импортирует товары из CSV или NDJSON файла поставщика, обновляя товары с тем же supplier_sku'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument(
+            '--format',
+            dest='file_format',
+            choices=IMPORT_FORMATS,
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк проверять и записывать за раз'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in IMPORT_FORMATS:
+            raise CommandError(f'Cannot detect file format, use --format {"|".join(IMPORT_FORMATS)}')
+        with open(path, encoding='utf-8', newline='') as lines:
+            result = import_products(lines, file_format, batch_size=options['batch_size'])
+        for error in result.errors:
+            self.stderr.write(f'line {error["line"]}: {json.dumps(error["errors"], ensure_ascii=False)}')
+        stats = result.as_dict()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: {stats["created"]}, обновлено: {stats["updated"]}, ошибок: {stats["error_count"]}, '
+            f'{stats["rows_per_second"]} строк/с'
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from products import cache
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает количество отзывов и среднюю оценку товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Сколько товаров пересчитывать в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Product.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):  # Диапазонами id, чтобы не блокировать всю таблицу
+            with transaction.atomic():
+                updated += Product.objects.filter(id__gte=start, id__lt=start + batch_size).rebuild_rating()
+        cache.invalidate()  # UPDATE не вызывает сигналы моделей
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано товаров: {updated}'))
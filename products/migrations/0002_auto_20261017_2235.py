@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['created_at', 'id'], name='products_pr_created_3be21c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productcollection',
+            index=models.Index(fields=['created_at', 'id'], name='products_pr_created_29c700_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productreview',
+            index=models.Index(fields=['created_at', 'id'], name='products_pr_created_20c49f_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_rating(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    for product in Product.objects.annotate(
+        count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+        sum=Coalesce(Subquery(reviews.annotate(sum=Sum('rating')).values('sum')), 0),
+    ).filter(count__gt=0):
+        Product.objects.filter(pk=product.pk).update(
+            review_count=product.count,
+            rating_sum=product.sum,
+            rating_avg=round(product.sum / product.count, 2),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_auto_20261017_2235'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=3, verbose_name='Средняя оценка'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, verbose_name='Сумма оценок'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Количество отзывов'),
+        ),
+        migrations.RunPython(fill_rating, migrations.RunPython.noop),
+    ]
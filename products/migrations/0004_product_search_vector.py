@@ -0,0 +1,29 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:41
+
+import django.contrib.postgres.search
+from django.db import migrations
+from online_shop.db.operations import PostgresRunSQL
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_auto_20261017_2236'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        PostgresRunSQL(
+            sql=[
+                "UPDATE products_product SET search_vector = "
+                "setweight(to_tsvector('russian', COALESCE(name, '')), 'A') || "
+                "setweight(to_tsvector('russian', COALESCE(description, '')), 'B')",
+                'CREATE INDEX products_product_search_vector_idx ON products_product USING gin (search_vector)',
+            ],
+            reverse_sql='DROP INDEX IF EXISTS products_product_search_vector_idx',
+        ),
+    ]
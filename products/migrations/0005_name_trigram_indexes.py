@@ -0,0 +1,41 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:48
+
+from django.db import migrations
+from online_shop.db.operations import PostgresRunSQL
+
+
+class Migration(migrations.Migration):
+    """Индексы под фильтры name__icontains и name__iexact.
+
+    Django на PostgreSQL компилирует эти фильтры в UPPER("name"::text) LIKE UPPER(%s)
+    и UPPER("name"::text) = UPPER(%s), поэтому индексы построены по тому же выражению:
+    GIN с gin_trgm_ops для LIKE '%...%' и обычный btree для равенства.
+    """
+
+    dependencies = [
+        ('products', '0004_product_search_vector'),
+    ]
+
+    operations = [
+        PostgresRunSQL(
+            sql='CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        PostgresRunSQL(
+            sql=[
+                'CREATE INDEX products_product_name_upper_trgm_idx '
+                'ON products_product USING gin (UPPER(name::text) gin_trgm_ops)',
+                'CREATE INDEX products_product_name_upper_idx ON products_product (UPPER(name::text))',
+                'CREATE INDEX products_productcollection_name_upper_trgm_idx '
+                'ON products_productcollection USING gin (UPPER(name::text) gin_trgm_ops)',
+                'CREATE INDEX products_productcollection_name_upper_idx '
+                'ON products_productcollection (UPPER(name::text))',
+            ],
+            reverse_sql=[
+                'DROP INDEX IF EXISTS products_product_name_upper_trgm_idx',
+                'DROP INDEX IF EXISTS products_product_name_upper_idx',
+                'DROP INDEX IF EXISTS products_productcollection_name_upper_trgm_idx',
+                'DROP INDEX IF EXISTS products_productcollection_name_upper_idx',
+            ],
+        ),
+    ]
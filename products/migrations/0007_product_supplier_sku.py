@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-17 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_auto_20261017_2243'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='supplier_sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Артикул поставщика'),
+        ),
+    ]
@@ -1,10 +1,103 @@
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce, Now
+from django.utils import timezone
+from products.search import search_vector
+
+
+def rating_avg_expression(review_count, rating_sum, has_reviews):
+    """Средняя оценка как выражение SQL, 0 если отзывов нет"""
+    return Case(
+        When(has_reviews, then=Cast(rating_sum, FloatField()) / Cast(review_count, FloatField())),
+        default=Value(0),
+        output_field=FloatField()
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+
+    def update_rating(self, count_delta, sum_delta):
+        """Инкрементально меняет агрегаты отзывов одним UPDATE без чтения строк"""
+        review_count = F('review_count') + count_delta
+        rating_sum = F('rating_sum') + sum_delta
+        return self.update(
+            review_count=review_count,
+            rating_sum=rating_sum,
+            rating_avg=rating_avg_expression(review_count, rating_sum, Q(review_count__gt=-count_delta)),
+            updated_at=Now()
+        )
+
+    def rebuild_rating(self):
+        """Пересчитывает агрегаты отзывов по таблице отзывов"""
+        reviews = ProductReview.objects.filter(product=OuterRef('pk')).order_by().values('product')
+        self.update(
+            review_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0),
+            rating_sum=Coalesce(Subquery(reviews.annotate(sum=Sum('rating')).values('sum')), 0)
+        )
+        return self.update(
+            rating_avg=rating_avg_expression(F('review_count'), F('rating_sum'), Q(review_count__gt=0))
+        )
+
+    def update_search_vector(self):
+        """Пересчитывает поисковый вектор, на базах без полнотекстового поиска ничего не делает"""
+        if connections[self.db].vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=search_vector())
+
+    def upsert(self, products, update_fields):
+        """Вставляет товары, а товары с уже существующим supplier_sku обновляет
+        по полям update_fields: INSERT ... ON CONFLICT DO UPDATE пачками"""
+        connection = connections[self.db]
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            for product in products:
+                self.update_or_create(
+                    supplier_sku=product.supplier_sku,
+                    defaults={name: getattr(product, name) for name in update_fields}
+                )
+            return
+        now = timezone.now()
+        fields = [
+            field for field in self.model._meta.concrete_fields
+            if not field.primary_key and field.name != 'search_vector'
+        ]
+        quote_name = connection.ops.quote_name
+        sql_prefix = 'INSERT INTO {} ({}) VALUES '.format(
+            quote_name(self.model._meta.db_table),
+            ', '.join(quote_name(field.column) for field in fields)
+        )
+        sql_suffix = ' ON CONFLICT ({}) DO UPDATE SET {}'.format(
+            quote_name('supplier_sku'),
+            ', '.join(
+                '{0} = EXCLUDED.{0}'.format(quote_name(self.model._meta.get_field(name).column))
+                for name in tuple(update_fields) + ('updated_at', )
+            )
+        )
+        placeholders = '({})'.format(', '.join(['%s'] * len(fields)))
+        batch_size = connection.ops.bulk_batch_size(fields, products)
+        with connection.cursor() as cursor:
+            for start in range(0, len(products), batch_size):
+                batch = products[start:start + batch_size]
+                params = []
+                for product in batch:
+                    product.created_at = product.updated_at = now
+                    params.extend(
+                        field.get_db_prep_save(getattr(product, field.attname), connection) for field in fields
+                    )
+                cursor.execute(sql_prefix + ', '.join([placeholders] * len(batch)) + sql_suffix, params)
 
 
 class Product(models.Model):
     """Модель Товары"""
+    supplier_sku = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name='Артикул поставщика'
+    )
     name = models.CharField(
         max_length=128,
         verbose_name='Название'
@@ -19,6 +112,27 @@ class Product(models.Model):
         decimal_places=2,
         verbose_name='Цена'
     )
+    review_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Количество отзывов'
+    )
+    rating_sum = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Сумма оценок'
+    )
+    rating_avg = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        verbose_name='Средняя оценка'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
     created_at = models.DateTimeField(
         auto_now_add=True,
         verbose_name='Дата создания'
@@ -28,12 +142,17 @@ class Product(models.Model):
         verbose_name='Дата обновления'
     )
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return f'{self.name}'
 
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
 
 
 class ProductReview(models.Model):
@@ -47,6 +166,7 @@ class ProductReview(models.Model):
         Product,
         related_name='reviews',
         on_delete=models.CASCADE,
+        db_index=False,  # Покрывается индексом (product, created_at)
         verbose_name='Товар'
     )
     text = models.TextField(
@@ -73,6 +193,10 @@ class ProductReview(models.Model):
         unique_together = ['user', 'product']
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['product', 'created_at']),
+        ]
 
 
 class ProductCollection(models.Model):
@@ -102,6 +226,39 @@ class ProductCollection(models.Model):
     def __str__(self):
         return f'ID_{self.id} - {self.name}'
 
+    def add_products(self, product_ids):
+        """Добавляет товары в подборку одним bulk INSERT в таблицу связи, уже входящие товары пропускаются.
+        Возвращает число добавленных товаров"""
+        through = ProductCollection.products.through
+        existing = set(
+            through.objects.filter(productcollection_id=self.id, product_id__in=product_ids)
+            .values_list('product_id', flat=True)
+        )
+        added = through.objects.bulk_create([
+            through(productcollection_id=self.id, product_id=product_id)
+            for product_id in product_ids if product_id not in existing
+        ])
+        if added:
+            self.touch()
+        return len(added)
+
+    def remove_products(self, product_ids):
+        """Удаляет товары из подборки одним DELETE по таблице связи. Возвращает число удаленных товаров"""
+        removed, _ = ProductCollection.products.through.objects.filter(
+            productcollection_id=self.id, product_id__in=product_ids
+        ).delete()
+        if removed:
+            self.touch()
+        return removed
+
+    def touch(self):
+        """Обновляет updated_at одним UPDATE, без сохранения остальных полей"""
+        self.updated_at = timezone.now()
+        ProductCollection.objects.filter(id=self.id).update(updated_at=self.updated_at)
+
     class Meta:
         verbose_name = 'Подборка'
         verbose_name_plural = 'Подборки'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
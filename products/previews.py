@@ -0,0 +1,73 @@
+"""Компактный вывод товаров подборок.
+
+Для ?products=preview товары подборок страницы читаются одним запросом с
+ROW_NUMBER() и COUNT() OVER (PARTITION BY подборка) по таблице связи: из базы
+приходят только первые limit товаров каждой подборки и общее число ее
+товаров, поэтому память не растет с размером подборки. Товары кладутся в кэш
+prefetch связи products, как это делает prefetch_related, и
+collection.products.all() возвращает только их. Для ?products=ids читаются
+только id товаров из таблицы связи.
+
+Товары идут в порядке (created_at, id), как на страницах
+/product-collections/<id>/products/.
+"""
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from products.models import Product, ProductCollection
+
+PRODUCTS_ORDERING = (F('product__created_at').asc(), F('product_id').asc())
+
+
+def set_prefetched_products(collection, products):
+    queryset = collection.products.all()
+    queryset._result_cache = products
+    queryset._prefetch_done = True
+    collection.__dict__.setdefault('_prefetched_objects_cache', {})['products'] = queryset
+
+
+def prefetch_previews(collections, limit):
+    """Первые limit товаров (collection.products.all()) и число товаров (collection.product_count) подборок"""
+    through = ProductCollection.products.through
+    rows = []
+    if collections:
+        ranked = through.objects.filter(productcollection_id__in=[_.id for _ in collections]).annotate(
+            row_number=Window(RowNumber(), partition_by=[F('productcollection_id')], order_by=PRODUCTS_ORDERING),
+            product_count=Window(Count('id'), partition_by=[F('productcollection_id')]),
+        ).values('productcollection_id', 'product_id', 'row_number', 'product_count')
+        connection = connections[ranked.db]
+        quote_name = connection.ops.quote_name
+        sql, params = ranked.query.sql_with_params()
+        with connection.cursor() as cursor:  # В Django 3.1 по оконной функции нельзя фильтровать через ORM
+            cursor.execute(
+                'SELECT {0}, {1}, {2} FROM ({3}) ranked WHERE {4} <= %s ORDER BY {0}, {4}'.format(
+                    quote_name('productcollection_id'), quote_name('product_id'), quote_name('product_count'),
+                    sql, quote_name('row_number')
+                ),
+                (*params, limit)
+            )
+            rows = cursor.fetchall()
+    products = Product.objects.in_bulk({product_id for _, product_id, _ in rows})
+    previews = defaultdict(list)
+    counts = {}
+    for collection_id, product_id, product_count in rows:
+        previews[collection_id].append(products[product_id])
+        counts[collection_id] = product_count
+    for collection in collections:
+        set_prefetched_products(collection, previews[collection.id])
+        collection.product_count = counts.get(collection.id, 0)
+
+
+def prefetch_ids(collections):
+    """id товаров подборок в collection.product_ids, без чтения самих товаров"""
+    product_ids = defaultdict(list)
+    if collections:
+        rows = ProductCollection.products.through.objects.filter(
+            productcollection_id__in=[_.id for _ in collections]
+        ).order_by(*PRODUCTS_ORDERING).values_list('productcollection_id', 'product_id')
+        for collection_id, product_id in rows:
+            product_ids[collection_id].append(product_id)
+    for collection in collections:
+        collection.product_ids = product_ids[collection.id]
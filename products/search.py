@@ -0,0 +1,103 @@
+"""Полнотекстовый поиск товаров по названию и описанию.
+
+На PostgreSQL поиск идет по колонке search_vector с GIN-индексом. Конфигурация
+russian стеммит кириллицу русским, а латиницу английским snowball-стеммером,
+поэтому одна конфигурация покрывает оба языка названий. Название имеет вес A,
+описание вес B, результаты сортируются по ts_rank.
+
+На остальных базах (SQLite в тестах) используется FallbackIndex: простой
+инвертированный индекс на Python с теми же весами и упрощенным стеммингом.
+"""
+import re
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import Case, F, IntegerField, When
+
+SEARCH_CONFIG = 'russian'
+
+NAME_WEIGHT = 1.0  # Веса A и B из ts_rank
+DESCRIPTION_WEIGHT = 0.4
+
+RUSSIAN_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'иях', 'ией', 'ием', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ой', 'ей', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ых', 'их', 'ов', 'ев', 'ию', 'ью', 'ия', 'ья',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+ENGLISH_ENDINGS = ('ingly', 'edly', 'ing', 'ies', 'ed', 'es', 'ly', 's')
+MIN_STEM_LENGTH = 3
+
+TOKEN_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def search_vector():
+    """Выражение для колонки search_vector"""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def stem(word):
+    endings = RUSSIAN_ENDINGS if CYRILLIC_RE.search(word) else ENGLISH_ENDINGS
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in TOKEN_RE.findall(text.lower().replace('ё', 'е'))]
+
+
+class FallbackIndex:
+    """Инвертированный индекс: основа слова -> {id товара: вес}"""
+
+    def __init__(self):
+        self.terms = defaultdict(lambda: defaultdict(float))
+
+    @classmethod
+    def build(cls, rows):
+        """rows - пары (id, название, описание)"""
+        index = cls()
+        for pk, name, description in rows:
+            index.add(pk, name, description)
+        return index
+
+    def add(self, pk, name, description):
+        for term in tokenize(name):
+            self.terms[term][pk] += NAME_WEIGHT
+        for term in tokenize(description or ''):
+            self.terms[term][pk] += DESCRIPTION_WEIGHT
+
+    def search(self, text):
+        """Товары, содержащие все слова запроса, с их рангом"""
+        terms = set(tokenize(text))
+        if not terms:
+            return {}
+        postings = [self.terms.get(term, {}) for term in terms]
+        found = set.intersection(*(set(_) for _ in postings))
+        return {pk: sum(posting[pk] for posting in postings) for pk in found}
+
+
+def search_products(queryset, text, order_by_rank=True):
+    """Фильтрует товары по поисковому запросу, при order_by_rank сортирует по релевантности"""
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=query)
+        if order_by_rank:
+            queryset = queryset.annotate(search_rank=SearchRank(F('search_vector'), query)).order_by('-search_rank', 'id')
+        return queryset
+
+    ranks = FallbackIndex.build(queryset.values_list('id', 'name', 'description')).search(text)
+    queryset = queryset.filter(id__in=list(ranks))
+    if order_by_rank and ranks:
+        ordered_ids = sorted(ranks, key=lambda pk: (-ranks[pk], pk))
+        queryset = queryset.order_by(Case(
+            *[When(id=pk, then=position) for position, pk in enumerate(ordered_ids)],
+            output_field=IntegerField()
+        ))
+    return queryset
@@ -1,9 +1,14 @@
+from django.db import IntegrityError, transaction
+from online_shop.timing import TimedSerializerMixin
 from products.models import Product, ProductReview, ProductCollection
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from users.serializers import UserSerializer
 
+RATING_FIELDS = ('review_count', 'rating_sum', 'rating_avg', 'updated_at')  # Поля, которые меняет update_rating
 
-class ProductSerializer(serializers.ModelSerializer):
+
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     price = serializers.DecimalField(
         max_digits=8,
         decimal_places=2,
@@ -13,10 +18,12 @@ class ProductSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
-        fields = ('id', 'name', 'description', 'price', 'created_at', 'updated_at')
+        fields = ('id', 'supplier_sku', 'name', 'description', 'price', 'review_count', 'rating_avg', 'created_at',
+                  'updated_at')
+        read_only_fields = ('review_count', 'rating_avg')
 
 
-class ProductReviewSerializer(serializers.ModelSerializer):
+class ProductReviewSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     product = ProductSerializer(
         read_only=True,
     )
@@ -36,26 +43,51 @@ class ProductReviewSerializer(serializers.ModelSerializer):
         product_id = self.context['request'].data['product_id']
         if not isinstance(product_id, int):
             raise serializers.ValidationError('product_id should be integer')
-        if not Product.objects.filter(id=product_id):
-            raise serializers.ValidationError('Wrong product_id')
-
-        user_id = self.context['request'].user.id  # Проверяем что отзыв на один продукт только один
-        if ProductReview.objects.filter(user=user_id).filter(product=product_id):
-            if self.context['request'].stream.method == 'POST':
-                raise serializers.ValidationError('Maximum one review per user per product')
-            elif self.context['request'].stream.method in ['PUT', 'PATCH']:
-                if product_id != self.instance.product_id:
-                    raise serializers.ValidationError("You already reviewed this product")
+        if self.instance is not None and self.instance.product_id == product_id:
+            data['product'] = self.instance.product  # Товар уже загружен вместе с отзывом
+        else:
+            try:
+                data['product'] = Product.objects.get(id=product_id)
+            except Product.DoesNotExist:
+                raise serializers.ValidationError('Wrong product_id')
         return data
 
     def create(self, validated_data):
-        """ Простановка значения поля user по-умолчанию и product по product.id"""
+        """ Простановка значения поля user по-умолчанию.
+        Один отзыв на товар от пользователя гарантирует unique_together, а не предварительная проверка"""
         validated_data['user'] = self.context['request'].user
-        validated_data['product'] = Product.objects.get(id=self.context['request'].data['product_id'])
-        return super().create(validated_data)
-
-
-class ProductCollectionSerializer(serializers.ModelSerializer):
+        try:
+            with transaction.atomic():  # Отзыв и агрегаты товара меняются вместе
+                review = super().create(validated_data)
+                Product.objects.filter(id=review.product_id).update_rating(1, review.rating)
+                review.product.refresh_from_db(fields=RATING_FIELDS)  # Агрегаты изменены UPDATE в базе
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ['Maximum one review per user per product']}
+            )
+        return review
+
+    def update(self, instance, validated_data):
+        """Строка отзыва уже заблокирована во вьюсете, поэтому старые значения берем из instance"""
+        old_product_id, old_rating = instance.product_id, instance.rating
+        try:
+            with transaction.atomic():
+                review = super().update(instance, validated_data)
+                if review.product_id != old_product_id:  # Отзыв перенесен на другой товар
+                    Product.objects.filter(id=old_product_id).update_rating(-1, -old_rating)
+                    Product.objects.filter(id=review.product_id).update_rating(1, review.rating)
+                elif review.rating != old_rating:
+                    Product.objects.filter(id=review.product_id).update_rating(0, review.rating - old_rating)
+                if (review.product_id, review.rating) != (old_product_id, old_rating):
+                    review.product.refresh_from_db(fields=RATING_FIELDS)  # Агрегаты изменены UPDATE в базе
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ['You already reviewed this product']}
+            )
+        return review
+
+
+class ProductCollectionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
 
     products = ProductSerializer(
         many=True,
@@ -89,3 +121,58 @@ class ProductCollectionSerializer(serializers.ModelSerializer):
         if len(products) != len(product_ids):
             raise serializers.ValidationError('wrong product_id')
         return data
+
+
+class ProductCollectionPreviewSerializer(ProductCollectionSerializer):
+    """Подборка с первыми товарами и общим числом товаров (?products=preview)"""
+    product_count = serializers.IntegerField(
+        read_only=True
+    )
+
+    class Meta(ProductCollectionSerializer.Meta):
+        fields = ('id', 'name', 'text', 'products', 'product_count', 'created_at', 'updated_at')
+
+
+class ProductCollectionIdsSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Подборка с id товаров вместо товаров (?products=ids)"""
+    product_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        read_only=True
+    )
+
+    class Meta:
+        model = ProductCollection
+        fields = ('id', 'name', 'text', 'product_ids', 'created_at', 'updated_at')
+
+
+class ProductCollectionQuerySerializer(serializers.Serializer):
+    """Вид товаров в ответе подборок: full — все товары, ids — только id, preview — первые products_limit"""
+    products = serializers.ChoiceField(
+        choices=('full', 'ids', 'preview'),
+        default='full'
+    )
+    products_limit = serializers.IntegerField(
+        min_value=1,
+        max_value=50,
+        default=5
+    )
+
+
+class ProductCollectionProductsSerializer(serializers.Serializer):
+    """Пачка id товаров для добавления в подборку или удаления из нее"""
+    max_size = 1000
+
+    product_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=max_size
+    )
+
+    def validate_product_ids(self, value):
+        """Все товары пачки проверяются одним запросом id__in"""
+        product_ids = list(dict.fromkeys(value))
+        found = set(Product.objects.filter(id__in=product_ids).values_list('id', flat=True))
+        missing = [product_id for product_id in product_ids if product_id not in found]
+        if missing:
+            raise serializers.ValidationError(f'wrong product_id: {", ".join(map(str, missing))}')
+        return product_ids
@@ -0,0 +1,23 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from products import cache
+from products.models import Product, ProductCollection, ProductReview
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductCollection)
+@receiver(post_delete, sender=ProductCollection)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+@receiver(m2m_changed, sender=ProductCollection.products.through)
+def invalidate_catalog_cache(**kwargs):
+    """Любое изменение каталога делает закэшированные ответы устаревшими"""
+    cache.invalidate()
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_vector(instance, update_fields=None, **kwargs):
+    """Пересчитываем поисковый вектор только сохраненного товара"""
+    if update_fields is None or {'name', 'description'} & set(update_fields):
+        Product.objects.filter(id=instance.id).update_search_vector()
@@ -1,13 +1,35 @@
+import io
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.functional import cached_property
 from django_filters.rest_framework import DjangoFilterBackend
-from products.filters import ProductFilter, ProductReviewFilter, ProductCollectionFilter
+from online_shop.compiled import CompiledReadMixin
+from online_shop.conditional import ConditionalMixin, make_etag, make_validators
+from online_shop.export import ExportMixin
+from online_shop.pagination import RequiredCursorPagination
+from online_shop.streaming import StreamingListMixin
+from orders import sales
+from orders.serializers import ProductSalesQuerySerializer, ProductSalesSerializer
+from products import cache
+from products.cache import CachedReadMixin
+from products.filters import is_sales_ordering, ProductFilter, ProductReviewFilter, ProductCollectionFilter
+from products.importer import IMPORT_FORMATS, import_products
 from products.models import Product, ProductReview, ProductCollection
-from products.serializers import ProductSerializer, ProductReviewSerializer, ProductCollectionSerializer
+from products.previews import prefetch_ids, prefetch_previews
+from products.serializers import ProductSerializer, ProductReviewSerializer, ProductCollectionSerializer, \
+    ProductCollectionIdsSerializer, ProductCollectionPreviewSerializer, ProductCollectionProductsSerializer, \
+    ProductCollectionQuerySerializer
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 from users.views import IsAdminOrOwner, IsAdmin
 
 
-class ProductsViewSet(ModelViewSet):
+class ProductsViewSet(CachedReadMixin, ConditionalMixin, StreamingListMixin, CompiledReadMixin, ModelViewSet):
 
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
@@ -16,36 +38,190 @@ class ProductsViewSet(ModelViewSet):
     http_method_names = ['get', 'post', 'put', 'delete']
 
     def get_permissions(self):
-        if self.action in ['update', 'partial_update', 'destroy', 'create']:
+        if self.action in ['update', 'partial_update', 'destroy', 'create', 'import_file', 'stats']:
             return [IsAdmin()]
         return []
 
+    @classmethod
+    def is_cacheable(cls, request):
+        # Продажи меняются с заказами, а заказы кэш каталога не сбрасывают
+        return super().is_cacheable(request) and not is_sales_ordering(request.query_params)
+
+    def get_list_validators(self, queryset):
+        if is_sales_ordering(self.request.query_params):
+            return None  # Порядок по продажам меняется без изменения updated_at товаров
+        return super().get_list_validators(queryset)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request, *args, **kwargs):
+        """Продажи товаров из накопительной статистики: ordering, date_from и date_to (дни заказов), limit"""
+        query = ProductSalesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(ProductSalesSerializer(sales.get_stats(**query.validated_data), many=True).data)
 
-class ProductReviewsViewSet(ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='import', url_name='import', parser_classes=[MultiPartParser])
+    def import_file(self, request, *args, **kwargs):
+        """Импорт файла поставщика. Большие файлы Django сохраняет во временный файл, а не в память"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['This field is required.']})
+        file_format = request.data.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            raise ValidationError({'format': [f'Expected one of: {", ".join(IMPORT_FORMATS)}']})
+        lines = io.TextIOWrapper(upload.file, encoding='utf-8', newline='')
+        result = import_products(lines, file_format)
+        return Response(result.as_dict())
+
+
+class ProductReviewsViewSet(ExportMixin, ConditionalMixin, StreamingListMixin, CompiledReadMixin, ModelViewSet):
 
     queryset = ProductReview.objects.all().select_related('product', 'user')
+    conditional_fields = ('updated_at', 'product__updated_at')  # Товар выводится в отзыве
     serializer_class = ProductReviewSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ProductReviewFilter
     http_method_names = ['get', 'post', 'put', 'delete']
+    export_fields = (
+        ('review_id', 'id'),
+        ('user_id', 'user_id'),
+        ('username', 'user__username'),
+        ('product_id', 'product_id'),
+        ('product_name', 'product__name'),
+        ('rating', 'rating'),
+        ('text', 'text'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
 
     def get_permissions(self):
         if self.action in ['update', 'partial_update', 'destroy']:
             return [IsAdminOrOwner()]
+        elif self.action == 'export':
+            return [IsAdmin()]
         elif self.action == 'create':
             return [IsAuthenticated()]
         return []
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['update', 'partial_update']:  # Блокируем отзыв тем же запросом, которым его читаем
+            queryset = queryset.select_for_update(of=('self', ))
+        return queryset
 
-class ProductCollectionViewSet(ModelViewSet):
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
 
-    queryset = ProductCollection.objects.all().prefetch_related('products')
+    def perform_destroy(self, instance):
+        with transaction.atomic():  # Отзыв и агрегаты товара меняются вместе
+            deleted, _ = ProductReview.objects.filter(id=instance.id).delete()
+            if deleted:
+                Product.objects.filter(id=instance.product_id).update_rating(-1, -instance.rating)
+
+
+class ProductCollectionViewSet(CachedReadMixin, ConditionalMixin, StreamingListMixin, CompiledReadMixin,
+                               ModelViewSet):
+
+    queryset = ProductCollection.objects.all().prefetch_related(
+        Prefetch('products', queryset=Product.objects.order_by('id'))  # Порядок товаров в подборке не случаен
+    )
     serializer_class = ProductCollectionSerializer
+    compact_serializer_classes = {
+        'ids': ProductCollectionIdsSerializer,
+        'preview': ProductCollectionPreviewSerializer,
+    }
+    conditional_fields = ('updated_at', 'products__updated_at')  # Товары выводятся в подборке
     filter_backends = (DjangoFilterBackend,)
     filterset_class = ProductCollectionFilter
     http_method_names = ['get', 'post', 'put', 'delete']
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'add_products', 'remove_products']:
             return [IsAdmin()]
-        return []
\ No newline at end of file
+        return []
+
+    @cached_property
+    def products_query(self):
+        """Вид товаров в ответе list и retrieve: ?products и ?products_limit, для остальных действий — full"""
+        params = self.request.query_params if self.action in ['list', 'retrieve'] else {}
+        query = ProductCollectionQuerySerializer(data=params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data
+
+    @property
+    def products_mode(self):
+        return self.products_query['products']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ['add_products', 'remove_products']:  # Товары подборки не читаем, строку блокируем
+            queryset = queryset.prefetch_related(None).select_for_update(of=('self', ))
+        elif self.action == 'products' or self.products_mode != 'full':  # Товары читаются отдельно
+            queryset = queryset.prefetch_related(None)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ['list', 'retrieve']:
+            return self.compact_serializer_classes.get(self.products_mode, self.serializer_class)
+        return super().get_serializer_class()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list' and self.products_mode != 'full' and args:  # Страница или пачка потока
+            args = (self.prefetch_products(list(args[0])), ) + args[1:]
+        return super().get_serializer(*args, **kwargs)
+
+    def get_object(self):
+        instance = super().get_object()
+        if self.action == 'retrieve':  # До вычисления ETag, который зависит от выводимых товаров
+            self.prefetch_products([instance])
+        return instance
+
+    def get_object_validators(self, instance):
+        """В компактном виде в ETag входит состав подборки: удаление товара не меняет updated_at подборки"""
+        if self.products_mode == 'ids':  # Товары не загружены, и их изменения в ответ не попадают
+            etag = make_etag(self.basename, self.request.accepted_renderer.format, instance.pk,
+                             instance.updated_at.isoformat(), *instance.product_ids)
+            return make_validators(etag, instance.updated_at)
+        etag, last_modified = super().get_object_validators(instance)
+        if self.products_mode == 'preview':
+            etag = make_etag(etag, instance.product_count)
+        return etag, last_modified
+
+    def prefetch_products(self, collections):
+        if self.products_mode == 'preview':
+            prefetch_previews(collections, self.products_query['products_limit'])
+        elif self.products_mode == 'ids':
+            prefetch_ids(collections)
+        return collections
+
+    @action(detail=True, methods=['get'], serializer_class=ProductSerializer,
+            pagination_class=RequiredCursorPagination)
+    def products(self, request, *args, **kwargs):
+        """Товары подборки страницами по (created_at, id): cursor и page_size"""
+        page = self.paginate_queryset(self.get_object().products.all())
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    def get_product_ids(self, request):
+        serializer = ProductCollectionProductsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['product_ids']
+
+    @action(detail=True, methods=['post'], url_path='products/add', url_name='products-add')
+    @transaction.atomic
+    def add_products(self, request, *args, **kwargs):
+        """Добавление пачки товаров {"product_ids": [...]} без передачи всего списка подборки"""
+        product_ids = self.get_product_ids(request)
+        added = self.get_object().add_products(product_ids)
+        if added:
+            cache.invalidate()  # Запись идет мимо related manager, сигнал m2m_changed не вызывается
+        return Response({'added': added})
+
+    @action(detail=True, methods=['post'], url_path='products/remove', url_name='products-remove')
+    @transaction.atomic
+    def remove_products(self, request, *args, **kwargs):
+        """Удаление пачки товаров {"product_ids": [...]} из подборки"""
+        product_ids = self.get_product_ids(request)
+        removed = self.get_object().remove_products(product_ids)
+        if removed:
+            cache.invalidate()
+        return Response({'removed': removed})
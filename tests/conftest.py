@@ -1,8 +1,23 @@
 import pytest
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
 from model_bakery import baker
 from rest_framework.test import APIClient
 
 
+def pytest_configure():
+    # Тесты не должны делить файловый кэш каталога с запущенным сервером и друг с другом
+    settings.CACHES[settings.API_CACHE_ALIAS].update(
+        BACKEND='django.core.cache.backends.locmem.LocMemCache', LOCATION='online_shop_api_tests'
+    )
+
+
+@pytest.fixture(autouse=True)
+def clear_api_cache():
+    caches[settings.API_CACHE_ALIAS].clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -38,3 +53,33 @@ def order_factory():
         return baker.make('Order', **kwargs)
 
     return factory
+
+
+@pytest.fixture
+def query_plan():
+    """План выполнения запроса queryset строкой.
+    На PostgreSQL seq scan выключается, иначе на маленьких таблицах индекс не выбирается"""
+    def explain(queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {sql}', params)
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return '\n'.join(str(row[-1]) for row in cursor.fetchall())
+
+    return explain
+
+
+@pytest.fixture
+def assert_query_budget():
+    """Проверка бюджета SQL-запросов ответа по замеру RequestTimingMiddleware:
+    не больше max_queries запросов и max_duplicates повторяющихся (N+1)"""
+    def check(response, max_queries, max_duplicates=0):
+        timing = response.wsgi_request.timing
+        duplicates = timing.duplicates()
+        assert timing.queries <= max_queries, f'{timing.queries} queries: {list(timing.statements)}'
+        assert len(duplicates) <= max_duplicates, f'Duplicated queries: {duplicates}'
+
+    return check
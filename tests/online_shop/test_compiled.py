@@ -0,0 +1,69 @@
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from model_bakery import baker
+from online_shop.compiled import get_compiled_serializer
+from orders.views import OrdersViewSet
+from products.serializers import ProductSerializer
+from products.views import ProductsViewSet, ProductReviewsViewSet, ProductCollectionViewSet
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.status import HTTP_200_OK
+
+
+@pytest.fixture
+def catalog():
+    """Товары, отзывы, подборки и заказы с пустыми и заполненными необязательными полями"""
+    users = [User.objects.create_user('user_1', first_name='Иван'), User.objects.create_user('user_2')]
+    products = baker.make('Product', _quantity=5, description='Описание "в кавычках"')
+    products[0].supplier_sku = 'SKU-1'
+    products[0].save()
+    for user in users:
+        for product in products[:3]:
+            baker.make('ProductReview', user=user, product=product, rating=4, text='ok')
+    collection = baker.make('ProductCollection')
+    collection.products.set([products[3], products[0], products[2]])
+    baker.make('ProductCollection')  # Пустая подборка
+    for user, status in zip(users, ('NEW', 'DONE')):
+        order = baker.make('Order', user=user, status=status, total_amount='1300.50')
+        baker.make('OrderPositions', order=order, product=products[1], quantity=2)
+        baker.make('OrderPositions', order=order, product=products[0], quantity=1)
+    baker.make('Order', user=users[0])  # Заказ без позиций и суммы
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('viewset', [ProductsViewSet, ProductReviewsViewSet, ProductCollectionViewSet, OrdersViewSet])
+def test_compiled_serializer_conformance(catalog, viewset):
+    """проверяем, что быстрый сериализатор дает тот же JSON, что и сериализатор DRF"""
+    queryset = viewset.queryset.order_by('id')
+    compiled = get_compiled_serializer(viewset.serializer_class)
+    assert compiled is not None
+    expected = JSONRenderer().render(viewset.serializer_class(queryset, many=True).data)
+    assert JSONRenderer().render(compiled.serialize(compiled.prepare(queryset))) == expected
+
+
+@pytest.mark.django_db
+def test_compiled_list_pagination(api_client, catalog):
+    """проверяем, что страницы списка через быстрый сериализатор совпадают с сериализатором DRF"""
+    url = reverse('product-reviews-list')
+    first = api_client.get(url, {'page_size': 4})
+    second = api_client.get(first.json()['next'])
+    assert first.status_code == second.status_code == HTTP_200_OK
+    queryset = ProductReviewsViewSet.queryset.order_by('created_at', 'id')
+    expected = JSONRenderer().render(ProductReviewsViewSet.serializer_class(queryset, many=True).data)
+    assert JSONRenderer().render(first.data['results'] + second.data['results']) == expected
+    assert second.json()['next'] is None
+
+
+def test_not_compilable_serializer():
+    """проверяем, что сериализатор с вычисляемыми полями остается на обычном пути DRF"""
+    class ProductWithMethodSerializer(ProductSerializer):
+        label = serializers.SerializerMethodField()
+
+        class Meta(ProductSerializer.Meta):
+            fields = ProductSerializer.Meta.fields + ('label', )
+
+        def get_label(self, product):
+            return product.name.upper()
+
+    assert get_compiled_serializer(ProductWithMethodSerializer) is None
@@ -0,0 +1,125 @@
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from products.models import Product
+from rest_framework.status import HTTP_200_OK, HTTP_204_NO_CONTENT, HTTP_304_NOT_MODIFIED, \
+    HTTP_412_PRECONDITION_FAILED
+
+
+@pytest.mark.django_db
+def test_conditional_retrieve(api_client, product_factory, assert_query_budget):
+    """проверяем ETag и Last-Modified товара: 304 без сериализации, новый ETag после изменения"""
+    product = product_factory()
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    api_client.force_authenticate(user=test_admin)
+    url = reverse('products-detail', args=(product.id, ))
+    resp = api_client.get(url)
+    resp_not_modified = api_client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+    resp_since = api_client.get(url, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+    Product.objects.filter(id=product.id).update_rating(1, 5)  # Меняет updated_at
+    resp_changed = api_client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+    api_client.force_authenticate(user=None)
+    assert resp.status_code == HTTP_200_OK
+    assert resp['ETag'].startswith('"')
+    assert resp_not_modified.status_code == resp_since.status_code == HTTP_304_NOT_MODIFIED
+    assert resp_not_modified.content == b''
+    assert resp_not_modified['ETag'] == resp['ETag']
+    assert_query_budget(resp_not_modified, 1)
+    assert resp_not_modified.wsgi_request.timing.phases['serialize'] == 0
+    assert resp_changed.status_code == HTTP_200_OK
+    assert resp_changed['ETag'] != resp['ETag']
+
+
+@pytest.mark.django_db
+def test_conditional_list(api_client, product_factory, product_collection_factory, assert_query_budget):
+    """проверяем ETag списка подборок: 304 из кэша каталога без запросов, изменение товара
+    в подборке, удаление и фильтры меняют ETag"""
+    products = product_factory(_quantity=3)
+    collections = product_collection_factory(_quantity=2, name='подборка')
+    collections[0].products.set(products[:2])
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    url = reverse('product-collections-list')
+    resp = api_client.get(url)
+    resp_cached = api_client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+    etags = {resp['ETag'], api_client.get(url, {'name__iexact': 'подборка'})['ETag']}
+    products[0].save()
+    etags.add(api_client.get(url)['ETag'])
+    api_client.force_authenticate(user=test_admin)
+    resp_admin = api_client.get(url)
+    resp_admin_not_modified = api_client.get(url, HTTP_IF_NONE_MATCH=resp_admin['ETag'])
+    assert api_client.delete(reverse('product-collections-detail', args=(collections[1].id, ))).status_code \
+        == HTTP_204_NO_CONTENT
+    etags.add(api_client.get(url)['ETag'])
+    api_client.force_authenticate(user=None)
+    assert resp.status_code == HTTP_200_OK
+    assert resp_cached.status_code == HTTP_304_NOT_MODIFIED
+    assert_query_budget(resp_cached, 0)
+    assert resp_admin_not_modified.status_code == HTTP_304_NOT_MODIFIED
+    assert len(etags) == 4
+    assert 'ETag' not in api_client.get(reverse('products-list'), {'ordering': '-sold_qty'})
+
+
+@pytest.mark.django_db
+def test_conditional_related_delete(api_client, product_factory, product_collection_factory):
+    """проверяем, что удаление товара подборки, обновленного не последним, меняет ETag списка и подборки"""
+    products = product_factory(_quantity=3)
+    collection = product_collection_factory()
+    collection.products.set(products)
+    list_url = reverse('product-collections-list')
+    detail_url = reverse('product-collections-detail', args=(collection.id, ))
+    requests = [(list_url, {}), (list_url, {'products': 'ids'}), (detail_url, {'products': 'ids'}),
+                (detail_url, {'products': 'preview', 'products_limit': 1})]
+    etags = [api_client.get(url, params)['ETag'] for url, params in requests]
+    products[1].delete()
+    responses = [
+        api_client.get(url, params, HTTP_IF_NONE_MATCH=etag) for (url, params), etag in zip(requests, etags)
+    ]
+    assert [resp.status_code for resp in responses] == [HTTP_200_OK] * 4
+    assert len(responses[0].json()[0]['products']) == 2
+    assert responses[2].json()['product_ids'] == [products[0].id, products[2].id]
+
+
+@pytest.mark.django_db
+def test_conditional_update(api_client, product_factory):
+    """проверяем, что PUT с устаревшим If-Match получает 412 и не меняет товар, а с текущим — выполняется"""
+    product = product_factory(name='старое название', price=10)
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    api_client.force_authenticate(user=test_admin)
+    url = reverse('products-detail', args=(product.id, ))
+    etag = api_client.get(url)['ETag']
+    resp_first = api_client.put(url, {'name': 'первое', 'price': 20}, format='json', HTTP_IF_MATCH=etag)
+    resp_stale = api_client.put(url, {'name': 'второе', 'price': 30}, format='json', HTTP_IF_MATCH=etag)
+    resp_next = api_client.put(url, {'name': 'третье', 'price': 40}, format='json', HTTP_IF_MATCH=resp_first['ETag'])
+    api_client.force_authenticate(user=None)
+    assert resp_first.status_code == HTTP_200_OK
+    assert resp_stale.status_code == HTTP_412_PRECONDITION_FAILED
+    assert resp_next.status_code == HTTP_200_OK
+    assert Product.objects.get(id=product.id).name == 'третье'
+
+
+@pytest.mark.django_db
+def test_conditional_update_round_trip(api_client, product_factory):
+    """проверяем, что ETag ответа PUT отзыва совпадает с ETag следующего GET и принимается в If-Match,
+    хотя PUT меняет updated_at товара в базе, и что отзыв для этого не перечитывается"""
+    product = product_factory()
+    test_user = User.objects.create_user('test_user')
+    api_client.force_authenticate(user=test_user)
+    review = api_client.post(reverse('product-reviews-list'), {'product_id': product.id, 'rating': 4}, format='json')
+    url = reverse('product-reviews-detail', args=(review.json()['id'], ))
+    Product.objects.filter(id=product.id).update(updated_at=timezone.now().replace(microsecond=123456))
+    etag = api_client.get(url)['ETag']
+    resp_first = api_client.put(url, {'product_id': product.id, 'rating': 2}, format='json', HTTP_IF_MATCH=etag)
+    etag_after_first = api_client.get(url)['ETag']
+    resp_second = api_client.put(url, {'product_id': product.id, 'rating': 3}, format='json',
+                                 HTTP_IF_MATCH=resp_first['ETag'])
+    etag_after_second = api_client.get(url)['ETag']
+    api_client.force_authenticate(user=None)
+    assert resp_first.status_code == resp_second.status_code == HTTP_200_OK
+    assert resp_first['ETag'] == etag_after_first != etag
+    assert resp_second['ETag'] == etag_after_second
+    review_selects = sum(
+        count for sql, count in resp_second.wsgi_request.timing.statements.items()
+        if sql.startswith('SELECT "products_productreview"')
+    )
+    assert review_selects == 1  # ETag ответа строится без повторного чтения отзыва
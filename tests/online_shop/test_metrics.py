@@ -0,0 +1,91 @@
+import multiprocessing
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from online_shop.metrics import MmapValues, Registry, registry
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED
+
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, **labels) or 0.0
+
+
+@pytest.mark.django_db
+def test_metrics_endpoint(api_client, product_factory):
+    """проверяем счетчики запросов по basename и действию, гистограммы и долю попаданий в кэш каталога"""
+    product = product_factory()
+    labels = {'basename': 'products', 'action': 'list'}
+    requests_before = sample('http_requests_total', method='GET', status='200', **labels)
+    durations_before = sample('http_request_duration_seconds_bucket', le='+Inf', **labels)
+    queries_before = sample('http_request_db_queries_sum', **labels)
+    hits_before = sample('catalog_cache_requests_total', result='hit')
+    misses_before = sample('catalog_cache_requests_total', result='miss')
+    api_client.get(reverse('products-list'))
+    api_client.get(reverse('products-list'))  # Из кэша, без запросов к базе
+    api_client.get(reverse('products-detail', args=(product.id, )))
+    resp = api_client.get(reverse('metrics'))
+    assert resp.status_code == HTTP_200_OK
+    assert resp['Content-Type'] == 'text/plain; version=0.0.4; charset=utf-8'
+    text = resp.content.decode()
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert 'http_requests_total{basename="products",action="retrieve",method="GET",status="200"}' in text
+    assert sample('http_requests_total', method='GET', status='200', **labels) == requests_before + 2
+    assert sample('http_request_duration_seconds_bucket', le='+Inf', **labels) == durations_before + 2
+    assert sample('http_request_db_queries_sum', **labels) == queries_before + 2  # Список и его ETag
+    hits = sample('catalog_cache_requests_total', result='hit')
+    misses = sample('catalog_cache_requests_total', result='miss')
+    assert (hits - hits_before, misses - misses_before) == (1, 2)
+    assert sample('catalog_cache_hit_ratio') == pytest.approx(hits / (hits + misses))
+
+
+@pytest.mark.django_db
+def test_orders_created_metric(api_client, product_factory):
+    """проверяем счетчик созданных заказов при пакетном создании"""
+    product = product_factory()
+    api_client.force_authenticate(user=User.objects.create_user('test_user'))
+    before = sample('orders_created_total')
+    payload = [{'products': [{'product_id': product.id, 'quantity': 1}]}] * 2
+    resp = api_client.post(reverse('orders-bulk-create'), payload, format='json')
+    assert resp.status_code == HTTP_201_CREATED
+    assert sample('orders_created_total') == before + 2
+
+
+def worker(counter, gauge, histogram):
+    counter.inc(2, view='a')
+    gauge.set(5)
+    histogram.observe(0.3)
+
+
+def test_multiprocess_metrics(settings, tmp_path):
+    """проверяем, что значения процессов суммируются через файлы, а gauge завершенных процессов не учитываются"""
+    settings.METRICS_MULTIPROC_DIR = str(tmp_path)
+    test_registry = Registry()
+    counter = test_registry.counter('test_requests', 'Requests', ['view'])
+    gauge = test_registry.gauge('test_connections', 'Connections')
+    histogram = test_registry.histogram('test_latency_seconds', 'Latency', buckets=[0.1, 0.5])
+    process = multiprocessing.get_context('fork').Process(target=worker, args=(counter, gauge, histogram))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    counter.inc(view='a')
+    gauge.set(3)
+    histogram.observe(0.05)
+    assert test_registry.get_sample_value('test_requests_total', view='a') == 3
+    assert test_registry.get_sample_value('test_connections') == 3
+    assert test_registry.get_sample_value('test_latency_seconds_bucket', le='0.1') == 1
+    assert test_registry.get_sample_value('test_latency_seconds_bucket', le='0.5') == 2
+    assert test_registry.get_sample_value('test_latency_seconds_count') == 2
+    assert 'test_latency_seconds_bucket{le="+Inf"} 2.0' in test_registry.exposition()
+
+
+def test_mmap_values_grow(tmp_path):
+    """проверяем, что файл значений расширяется и читается после переоткрытия"""
+    path = str(tmp_path / 'counter_1.db')
+    values = MmapValues(path)
+    for i in range(5000):
+        values.inc(f'key_{i}', i)
+    values.inc('key_1', 1)
+    assert dict(MmapValues.read(path)) == dict(values.items()) == dict(MmapValues(path).items())
+    assert dict(values.items())['key_1'] == 2
+    assert len(values.items()) == 5000
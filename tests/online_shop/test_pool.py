@@ -0,0 +1,123 @@
+import threading
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from online_shop.db import pool
+from online_shop.db.pool import ConnectionPool, PoolTimeout
+from rest_framework.status import HTTP_200_OK, HTTP_403_FORBIDDEN
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_reuses_connections():
+    """проверяем, что возвращенное соединение выдается снова, а новые создаются только до max_size"""
+    connection_pool = ConnectionPool(FakeConnection, max_size=2)
+    first = connection_pool.acquire()
+    connection_pool.release(first)
+    assert connection_pool.acquire() is first
+    second = connection_pool.acquire()
+    assert second is not first
+    stats = connection_pool.get_stats()
+    assert stats['created'] == 2
+    assert stats['checkouts'] == 3
+    assert stats['in_use'] == 2
+
+
+def test_pool_wait_and_timeout():
+    """проверяем ожидание свободного соединения и таймаут, когда пул занят"""
+    connection_pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+    busy = connection_pool.acquire()
+    with pytest.raises(PoolTimeout):
+        connection_pool.acquire()
+    threading.Timer(0.01, connection_pool.release, args=(busy, )).start()
+    connection_pool.timeout = 5
+    assert connection_pool.acquire() is busy
+    stats = connection_pool.get_stats()
+    assert stats['timeouts'] == 1
+    assert stats['waits'] == 2
+    assert stats['created'] == 1
+
+
+def test_pool_discards_old_and_broken_connections():
+    """проверяем, что устаревшие, сломанные и не прошедшие проверку соединения закрываются"""
+    connection_pool = ConnectionPool(
+        FakeConnection, max_size=3, health_check_interval=0,
+        check=lambda connection: connection.alive, reset=lambda connection: not connection.closed
+    )
+    broken, unhealthy = connection_pool.acquire(), connection_pool.acquire()
+    broken.closed = True
+    connection_pool.release(broken)
+    connection_pool.release(unhealthy)
+    unhealthy.alive = False
+    fresh = connection_pool.acquire()
+    assert fresh is not unhealthy and fresh is not broken
+    assert unhealthy.closed
+    connection_pool.max_lifetime = 0
+    connection_pool.release(fresh)
+    assert fresh.closed
+    stats = connection_pool.get_stats()
+    assert stats['discarded'] == 3
+    assert stats['health_check_failures'] == 1
+    assert stats['size'] == 0
+
+
+def test_pool_threads():
+    """проверяем, что параллельные потоки не получают одно соединение и пул не превышает max_size"""
+    connection_pool = ConnectionPool(FakeConnection, max_size=3)
+    in_use, errors = set(), []
+    lock = threading.Lock()
+
+    def work():
+        for _ in range(200):
+            connection = connection_pool.acquire()
+            with lock:
+                if connection in in_use:
+                    errors.append(connection)
+                in_use.add(connection)
+            with lock:
+                in_use.discard(connection)
+            connection_pool.release(connection)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert connection_pool.get_stats()['created'] <= 3
+    assert connection_pool.get_stats()['checkouts'] == 1600
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='пул подключен только в бэкенде PostgreSQL')
+@pytest.mark.django_db(transaction=True)
+def test_pool_backend_reuses_connection():
+    """проверяем, что Django после закрытия соединения получает то же соединение из пула"""
+    connection.ensure_connection()
+    raw_connection = connection.connection
+    connection.close()
+    connection.ensure_connection()
+    assert connection.connection is raw_connection
+    assert any(stats['checkouts'] >= 2 for stats in pool.get_stats().values())
+
+
+@pytest.mark.django_db
+def test_pool_stats_api(api_client):
+    """проверяем, что статистику пулов видит только админ"""
+    url = reverse('db-pool')
+    api_client.force_authenticate(user=User.objects.create_user('test_user'))
+    resp_user = api_client.get(url)
+    api_client.force_authenticate(user=User.objects.create_user('test_admin', is_staff=True))
+    resp_admin = api_client.get(url)
+    api_client.force_authenticate(user=None)
+    assert resp_user.status_code == HTTP_403_FORBIDDEN
+    assert resp_admin.status_code == HTTP_200_OK
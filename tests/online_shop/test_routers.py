@@ -0,0 +1,74 @@
+import pytest
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from online_shop.db import routers
+from online_shop.db.routers import PrimaryReplicaRouter
+from online_shop.middleware import ReplicaRoutingMiddleware
+from products.models import Product
+from rest_framework.status import HTTP_200_OK
+
+
+@pytest.fixture
+def replicas(settings, monkeypatch):
+    """Две реплики, исправность задается словарем"""
+    settings.DATABASE_REPLICAS = ['replica_1', 'replica_2']
+    health = {'replica_1': True, 'replica_2': True}
+    monkeypatch.setattr(routers, 'is_healthy', lambda alias, force=False: health[alias])
+    return health
+
+
+def test_router_reads_from_replicas(replicas):
+    """проверяем, что чтения идут на реплики только внутри use_replicas и вне транзакций"""
+    router = PrimaryReplicaRouter()
+    assert router.db_for_read(Product) == DEFAULT_DB_ALIAS
+    with routers.use_replicas():
+        assert router.db_for_read(Product) in replicas
+        assert router.db_for_write(Product) == DEFAULT_DB_ALIAS
+        assert router.db_for_read(Product) == DEFAULT_DB_ALIAS  # После записи читаем свои изменения
+    with routers.use_replicas():
+        replicas['replica_1'] = False
+        assert {router.db_for_read(Product) for _ in range(20)} == {'replica_2'}
+        replicas['replica_2'] = False
+        assert router.db_for_read(Product) == DEFAULT_DB_ALIAS
+
+
+@pytest.mark.django_db
+def test_router_reads_from_primary_in_transaction(replicas):
+    """проверяем, что внутри транзакции чтения идут в основную базу"""
+    with routers.use_replicas(), transaction.atomic():
+        assert PrimaryReplicaRouter().db_for_read(Product) == DEFAULT_DB_ALIAS
+
+
+def test_replica_routing_middleware(replicas):
+    """проверяем, что GET читает с реплики, а после записи клиент закрепляется за основной базой"""
+    middleware = ReplicaRoutingMiddleware(lambda request: HttpResponse(routers.get_read_alias()))
+    factory = RequestFactory()
+    resp_get = middleware(factory.get('/'))
+    resp_post = middleware(factory.post('/'))
+    pinned_request = factory.get('/')
+    pinned_request.COOKIES[ReplicaRoutingMiddleware.pin_cookie_name] = '1'
+    resp_pinned = middleware(pinned_request)
+    assert resp_get.content.decode() in replicas
+    assert resp_post.content.decode() == DEFAULT_DB_ALIAS
+    assert resp_post.cookies[ReplicaRoutingMiddleware.pin_cookie_name]['max-age'] == 5
+    assert resp_pinned.content.decode() == DEFAULT_DB_ALIAS
+    assert routers.get_read_alias() == DEFAULT_DB_ALIAS
+
+
+@pytest.mark.skipif('replica_1' not in connections.databases, reason='нужна база replica_1 (DATABASE_REPLICA_HOSTS)')
+@pytest.mark.django_db(transaction=True)
+def test_replica_routing_api(api_client, product_factory, settings):
+    """проверяем на настоящей реплике, что список товаров читается с нее, а после записи из основной базы"""
+    settings.DATABASE_REPLICAS = ['replica_1']
+    product_factory(_quantity=2)
+    url = reverse('products-list')
+    with CaptureQueriesContext(connections['replica_1']) as replica_queries:
+        resp = api_client.get(url)
+        api_client.cookies[ReplicaRoutingMiddleware.pin_cookie_name] = '1'
+        resp_pinned = api_client.get(url)
+    assert resp.status_code == resp_pinned.status_code == HTTP_200_OK
+    assert len(resp.json()) == len(resp_pinned.json()) == 2
+    assert len([_ for _ in replica_queries if 'products_product' in _['sql']]) == 2  # Список и его ETag
@@ -0,0 +1,74 @@
+import json
+import re
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from online_shop.timing import RequestTiming, fingerprint
+from rest_framework.status import HTTP_200_OK
+
+
+def test_fingerprint_and_duplicates():
+    """проверяем, что запросы, отличающиеся только значениями, считаются повторами"""
+    assert fingerprint("SELECT * FROM t WHERE id = 10 AND name = 'it''s'") == 'SELECT * FROM t WHERE id = ? AND name = ?'
+    assert fingerprint('SELECT * FROM t2 WHERE id IN (%s, %s) LIMIT 21') == 'SELECT * FROM t2 WHERE id IN (...) LIMIT ?'
+    timing = RequestTiming()
+    timing.add_query('SELECT * FROM t WHERE id = %s', 0.001)
+    timing.add_query('SELECT * FROM t WHERE id = %s', 0.001)
+    timing.add_query('SELECT * FROM t2 WHERE id IN (%s)', 0.001)
+    timing.add_query('SELECT * FROM t2 WHERE id IN (%s, %s)', 0.001)
+    timing.add_query('SELECT 1', 0.001)
+    assert timing.duplicates() == [('SELECT * FROM t WHERE id = %s', 2), ('SELECT * FROM t2 WHERE id IN (...)', 2)]
+    assert 'db;dur=5.000;desc="5 queries, 4 duplicated"' in timing.server_timing()
+
+
+@pytest.mark.django_db
+def test_server_timing_header(api_client, product_review_factory, caplog):
+    """проверяем заголовок Server-Timing и строку лога с числом запросов, временем в базе, сериализации и рендеринга"""
+    product_review_factory(_quantity=3)
+    with caplog.at_level('INFO', logger='online_shop.timing'), CaptureQueriesContext(connection) as queries:
+        resp = api_client.get(reverse('product-reviews-list'))
+    assert resp.status_code == HTTP_200_OK
+    assert re.findall(r'(\w+);dur=', resp['Server-Timing']) == ['total', 'db', 'serialize', 'render']
+    assert f'desc="{len(queries)} queries, 0 duplicated"' in resp['Server-Timing']
+    timing = resp.wsgi_request.timing
+    assert timing.queries == len(queries)
+    assert timing.phases['serialize'] > 0 and timing.phases['render'] > 0
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record['view'] == 'product-reviews-list'
+    assert record['status'] == HTTP_200_OK
+    assert record['db_queries'] == len(queries)
+    assert record['db_duplicates'] == []
+
+
+@pytest.mark.django_db
+def test_timing_sampling(api_client, settings):
+    """проверяем, что запросы вне выборки не замеряются"""
+    settings.REQUEST_TIMING_SAMPLE_RATE = 0
+    resp = api_client.get(reverse('products-list'))
+    assert resp.status_code == HTTP_200_OK
+    assert 'Server-Timing' not in resp
+    assert not hasattr(resp.wsgi_request, 'timing')
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url_name, model, max_queries', [  # Включая запрос ETag списка (MAX и COUNT)
+    ('products-list', 'Product', 2),
+    ('product-reviews-list', 'ProductReview', 2),
+    ('product-collections-list', 'ProductCollection', 3),
+    ('orders-list', 'Order', 3),
+])
+def test_list_query_budget(api_client, assert_query_budget, url_name, model, max_queries):
+    """проверяем, что число запросов списка не растет с числом объектов"""
+    admin = User.objects.create_user('test_admin', is_staff=True)
+    api_client.force_authenticate(user=admin)
+    objects = baker.make(model, _quantity=10, make_m2m=True)
+    if model == 'Order':
+        for order in objects:
+            baker.make('OrderPositions', order=order, _quantity=2)
+    resp = api_client.get(reverse(url_name))
+    assert resp.status_code == HTTP_200_OK
+    assert_query_budget(resp, max_queries)
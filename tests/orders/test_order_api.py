@@ -1,13 +1,20 @@
+import gzip
+import json
 from datetime import datetime
+from decimal import Decimal
 
 import pytest
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from model_bakery.random_gen import gen_decimal
+from orders.models import Order, OrderPositions
+from products.models import Product
 from pytz import timezone
 from rest_framework.status import HTTP_200_OK, HTTP_401_UNAUTHORIZED, HTTP_201_CREATED, \
-    HTTP_403_FORBIDDEN, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST
+    HTTP_403_FORBIDDEN, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST, HTTP_207_MULTI_STATUS
 
 
 @pytest.mark.django_db
@@ -210,6 +217,41 @@ def test_order_update_admin(api_client, product_factory):
     assert resp_update_json['user']['id'] == test_user.id
 
 
+@pytest.mark.django_db
+def test_order_update_positions_diff(api_client, product_factory):
+    """проверяем, что изменение заказа меняет его на месте и пишет в базу только разницу позиций"""
+    test_user = User.objects.create_user('test_user')
+    kept, changed, removed, added = product_factory(_quantity=4, price=10)
+    api_client.force_authenticate(user=test_user)
+    resp = api_client.post(reverse('orders-list'), {'products': [
+        {'product_id': kept.id, 'quantity': 1},
+        {'product_id': changed.id, 'quantity': 1},
+        {'product_id': removed.id, 'quantity': 1},
+    ]}, format='json')
+    kept_position_id = OrderPositions.objects.get(product=kept).id
+    with CaptureQueriesContext(connection) as queries:
+        resp_update = api_client.put(reverse('orders-detail', args=(resp.json()['id'],)), {'products': [
+            {'product_id': kept.id, 'quantity': 1},
+            {'product_id': changed.id, 'quantity': 5},
+            {'product_id': added.id, 'quantity': 2},
+        ]}, format='json')
+    api_client.force_authenticate(user=None)
+    assert resp_update.status_code == HTTP_200_OK
+    assert resp_update.json()['id'] == resp.json()['id']
+    assert float(resp_update.json()['total_amount']) == 80
+    assert Order.objects.count() == 1
+    assert OrderPositions.objects.get(product=kept).id == kept_position_id
+    assert dict(OrderPositions.objects.values_list('product_id', 'quantity')) == {
+        kept.id: 1, changed.id: 5, added.id: 2
+    }
+    writes = [_['sql'] for _ in queries if not _['sql'].startswith(('SELECT', 'SAVEPOINT', 'RELEASE'))]
+    aggregates = ('orders_productsales', 'orders_userordersummary')  # Статистика продаж и сводка пользователя
+    aggregate_writes = [_.split()[0] for _ in writes if any(table in _ for table in aggregates)]
+    position_writes = [_.split()[0] for _ in writes if not any(table in _ for table in aggregates)]
+    assert sorted(position_writes) == ['DELETE', 'INSERT', 'UPDATE', 'UPDATE']
+    assert aggregate_writes == ['INSERT', 'INSERT', 'INSERT']
+
+
 @pytest.mark.django_db
 def test_order_delete(api_client, order_factory):
     """проверяем невозможность удаления заказа неавторизованным пользователем"""
@@ -403,3 +445,163 @@ def test_order_filter_products(api_client, order_factory, product_factory):
     filtered_products_list = [_['products'] for _ in resp_json]
     for filtered_products in filtered_products_list:
         assert filter_product_id in [_['product_id'] for _ in filtered_products]
+
+
+@pytest.mark.django_db
+def test_order_list_num_queries(api_client, order_factory, product_factory):
+    """проверяем, что число запросов при выводе списка заказов не растет с числом заказов и позиций"""
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    url = reverse('orders-list')
+    api_client.force_authenticate(user=test_admin)
+    num_queries = []
+    for orders_qty, positions_qty in ((1, 1), (5, 4)):
+        products = product_factory(_quantity=positions_qty)
+        for order in order_factory(_quantity=orders_qty):
+            OrderPositions.objects.bulk_create([
+                OrderPositions(order=order, product=_, price=_.price) for _ in products
+            ])
+        with CaptureQueriesContext(connection) as queries:
+            resp = api_client.get(url)
+        num_queries.append(len(queries))
+    api_client.force_authenticate(user=None)
+    assert resp.status_code == HTTP_200_OK
+    assert len(resp.json()) == 6
+    assert num_queries[0] == num_queries[1]
+
+
+@pytest.mark.django_db
+def test_order_create_num_queries(api_client, product_factory):
+    """проверяем, что число запросов при создании заказа не растет с числом позиций"""
+    test_user = User.objects.create_user('test_user')
+    url = reverse('orders-list')
+    api_client.force_authenticate(user=test_user)
+    num_queries = []
+    for positions_qty in (1, 10):
+        products = product_factory(_quantity=positions_qty)
+        payload = {'products': [{'product_id': _.id, 'quantity': 2} for _ in products]}
+        with CaptureQueriesContext(connection) as queries:
+            resp = api_client.post(url, payload, format='json')
+        assert resp.status_code == HTTP_201_CREATED
+        assert len(resp.json()['products']) == positions_qty
+        num_queries.append(len(queries))
+    api_client.force_authenticate(user=None)
+    assert num_queries[0] == num_queries[1]
+
+
+@pytest.mark.django_db
+def test_order_create_wrong_product(api_client, product_factory):
+    """проверяем ошибку при создании заказа с несуществующим товаром"""
+    test_user = User.objects.create_user('test_user')
+    product = product_factory()
+    url = reverse('orders-list')
+    payload = {'products': [{'product_id': product.id}, {'product_id': product.id + 100}]}
+    api_client.force_authenticate(user=test_user)
+    resp = api_client.post(url, payload, format='json')
+    api_client.force_authenticate(user=None)
+    assert resp.status_code == HTTP_400_BAD_REQUEST
+    assert 'product_id' in resp.json()['products'][1]
+
+
+@pytest.mark.django_db
+def test_order_bulk_create(api_client, product_factory):
+    """проверяем пакетное создание заказов: валидные создаются, по невалидным возвращаются ошибки"""
+    test_user = User.objects.create_user('test_user')
+    product_1, product_2 = product_factory(_quantity=2)
+    url = reverse('orders-bulk-create')
+    payload = [
+        {'products': [{'product_id': product_1.id, 'quantity': 2}, {'product_id': product_2.id, 'quantity': 1}]},
+        {'products': [{'product_id': product_2.id + 100, 'quantity': 1}]},
+        {'products': [{'product_id': product_2.id, 'quantity': 3}]},
+    ]
+    resp_unauthorized = api_client.post(url, payload, format='json')
+    api_client.force_authenticate(user=test_user)
+    resp = api_client.post(url, payload, format='json')
+    resp_invalid = api_client.post(url, payload[1:2], format='json')
+    resp_not_list = api_client.post(url, payload[0], format='json')
+    api_client.force_authenticate(user=None)
+    resp_json = resp.json()
+    assert resp_unauthorized.status_code == HTTP_401_UNAUTHORIZED
+    assert resp.status_code == HTTP_207_MULTI_STATUS
+    assert [_['status'] for _ in resp_json] == [HTTP_201_CREATED, HTTP_400_BAD_REQUEST, HTTP_201_CREATED]
+    assert 'products' in resp_json[1]['errors']
+    assert float(resp_json[0]['data']['total_amount']) == float(product_1.price * 2 + product_2.price)
+    assert resp_json[2]['data']['products'] == [{'product_id': product_2.id, 'quantity': 3}]
+    assert resp_json[2]['data']['user']['id'] == test_user.id
+    assert Order.objects.filter(user=test_user).count() == 2
+    assert OrderPositions.objects.filter(order__user=test_user).count() == 3
+    assert resp_invalid.status_code == HTTP_400_BAD_REQUEST
+    assert resp_not_list.status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_order_bulk_create_num_queries(api_client, product_factory):
+    """проверяем, что товары всего пакета заказов загружаются одним запросом"""
+    test_user = User.objects.create_user('test_user')
+    products = product_factory(_quantity=5)
+    url = reverse('orders-bulk-create')
+    payload = [{'products': [{'product_id': _.id} for _ in products[i:]]} for i in range(5)]
+    api_client.force_authenticate(user=test_user)
+    with CaptureQueriesContext(connection) as queries:
+        resp = api_client.post(url, payload, format='json')
+    api_client.force_authenticate(user=None)
+    product_selects = [_['sql'] for _ in queries if _['sql'].startswith('SELECT "products_product"')]
+    assert resp.status_code == HTTP_201_CREATED
+    assert len(product_selects) == 1
+
+
+@pytest.mark.django_db
+def test_order_list_stream(api_client, order_factory, product_factory, monkeypatch):
+    """проверяем, что потоковый список заказов совпадает с обычным и позиции загружаются на каждую пачку"""
+    monkeypatch.setattr('orders.views.OrdersViewSet.stream_chunk_size', 2)
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    products = product_factory(_quantity=2)
+    for order in order_factory(_quantity=5):
+        OrderPositions.objects.bulk_create([OrderPositions(order=order, product=_, price=_.price) for _ in products])
+    url = reverse('orders-list')
+    api_client.force_authenticate(user=test_admin)
+    resp = api_client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        resp_stream = api_client.get(url, {'stream': 1})
+        resp_stream_json = json.loads(b''.join(resp_stream.streaming_content))
+    api_client.force_authenticate(user=None)
+    assert resp_stream.status_code == HTTP_200_OK
+    assert resp_stream['Content-Type'] == 'application/json'
+    assert sorted(resp_stream_json, key=lambda _: _['id']) == sorted(resp.json(), key=lambda _: _['id'])
+    assert len([_ for _ in queries if 'orders_orderpositions' in _['sql']]) == 3
+
+
+@pytest.mark.django_db
+def test_order_export(api_client, order_factory, product_factory):
+    """проверяем выгрузку заказов в NDJSON и CSV с gzip: позиции с ценой на момент заказа, только для админа"""
+    test_user = User.objects.create_user('test_user', is_staff=False)
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    products = product_factory(_quantity=2)
+    order = order_factory(user=test_user, status='DONE')
+    OrderPositions.objects.bulk_create([
+        OrderPositions(order=order, product=_, quantity=3, price=_.price) for _ in products
+    ])
+    order_price = products[0].price
+    Product.objects.filter(id=products[0].id).update(price=order_price + 1)  # Цена изменилась после заказа
+    empty_order = order_factory(user=test_user, status='NEW')
+    url = reverse('orders-export')
+    api_client.force_authenticate(user=test_user)
+    resp_user = api_client.get(url)
+    api_client.force_authenticate(user=test_admin)
+    resp_ndjson = api_client.get(url)
+    resp_csv = api_client.get(url, {'export_format': 'csv', 'status__iexact': 'done'}, HTTP_ACCEPT_ENCODING='gzip')
+    resp_wrong = api_client.get(url, {'export_format': 'xml'})
+    api_client.force_authenticate(user=None)
+    assert resp_user.status_code == HTTP_403_FORBIDDEN
+    assert resp_wrong.status_code == HTTP_400_BAD_REQUEST
+    assert resp_ndjson.status_code == HTTP_200_OK
+    rows = [json.loads(_) for _ in b''.join(resp_ndjson.streaming_content).decode().splitlines()]
+    assert [(_['order_id'], _['product_id']) for _ in rows] == [
+        (order.id, products[0].id), (order.id, products[1].id), (empty_order.id, None)
+    ]
+    assert rows[0]['username'] == 'test_user'
+    assert rows[0]['quantity'] == 3
+    assert Decimal(rows[0]['product_price']) == order_price
+    assert resp_csv['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(b''.join(resp_csv.streaming_content)).decode().splitlines()
+    assert lines[0].startswith('order_id,user_id,username,status')
+    assert len(lines) == 3
@@ -0,0 +1,57 @@
+from datetime import date
+
+import pytest
+from django.contrib.auth.models import User
+from orders.filters import OrderFilter
+from orders.models import Order
+from products.filters import ProductReviewFilter
+from products.models import ProductReview
+
+
+def index_name(model, fields):
+    return next(index.name for index in model._meta.indexes if index.fields == fields)
+
+
+@pytest.mark.parametrize(
+    ['params', 'fields'],
+    (
+            ({'status__iexact': 'done'}, ['status', 'created_at']),
+            ({'created_at__date': date(2021, 3, 24)}, ['created_at', 'id']),
+            ({'created_at__date__gte': date(2021, 3, 24)}, ['created_at', 'id']),
+            ({'created_at__date__lte': date(2021, 3, 24)}, ['created_at', 'id']),
+            ({'updated_at__date': date(2021, 3, 24)}, ['updated_at']),
+            ({'total_amount__gte': 100}, ['total_amount']),
+    )
+)
+@pytest.mark.django_db
+def test_order_filters_use_indexes(query_plan, params, fields):
+    """проверяем по плану запроса, что фильтры заказов используют индексы"""
+    queryset = OrderFilter(params, queryset=Order.objects.all()).qs
+    assert 'DATE' not in str(queryset.query).upper().replace('UPDATED_AT', '')
+    assert index_name(Order, fields) in query_plan(queryset)
+
+
+@pytest.mark.django_db
+def test_order_user_list_uses_index(query_plan):
+    """проверяем, что список заказов пользователя выбирается по индексу (user, created_at)"""
+    test_user = User.objects.create_user('test_user')
+    queryset = Order.objects.filter(user=test_user).order_by('created_at')
+    assert index_name(Order, ['user', 'created_at']) in query_plan(queryset)
+
+
+@pytest.mark.django_db
+def test_product_review_filters_use_indexes(query_plan, product_factory):
+    """проверяем, что отзывы товара за период выбираются по индексу (product, created_at)"""
+    product = product_factory()
+    params = {'product': product.id, 'created_at__date__lte': date(2021, 3, 24)}
+    queryset = ProductReviewFilter(params, queryset=ProductReview.objects.all()).qs.order_by('-created_at')
+    assert index_name(ProductReview, ['product', 'created_at']) in query_plan(queryset)
+
+
+@pytest.mark.django_db
+def test_order_filter_status_case_insensitive(order_factory):
+    """проверяем, что фильтр статуса остался регистронезависимым"""
+    order_factory(status='DONE')
+    order_factory(status='NEW')
+    assert OrderFilter({'status__iexact': 'done'}, queryset=Order.objects.all()).qs.count() == 1
+    assert OrderFilter({'status__iexact': 'unknown'}, queryset=Order.objects.all()).qs.count() == 0
@@ -0,0 +1,86 @@
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from orders.models import UserOrderSummary
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+def test_order_summary(api_client, product_factory, assert_query_budget):
+    """проверяем сводку заказов пользователя после создания, изменения и удаления заказов"""
+    test_user = User.objects.create_user('test_user')
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    product_1, product_2 = product_factory(_quantity=2, price=10)
+    url = reverse('orders-summary')
+    resp_unauthorized = api_client.get(url)
+    api_client.force_authenticate(user=test_user)
+    resp_empty = api_client.get(url)
+    first = api_client.post(reverse('orders-list'), {'products': [{'product_id': product_1.id, 'quantity': 2}]},
+                            format='json').json()
+    resp_bulk = api_client.post(reverse('orders-bulk-create'), [
+        {'products': [{'product_id': product_1.id, 'quantity': 1}]},
+        {'products': [{'product_id': product_2.id, 'quantity': 3}]},
+    ], format='json')
+    last = resp_bulk.json()[1]['data']
+    api_client.force_authenticate(user=test_admin)
+    api_client.put(reverse('orders-detail', args=(first['id'], )),
+                   {'products': [{'product_id': product_2.id, 'quantity': 5}]}, format='json')
+    api_client.force_authenticate(user=test_user)
+    resp = api_client.get(url)
+    assert api_client.delete(reverse('orders-detail', args=(last['id'], ))).status_code == HTTP_204_NO_CONTENT
+    resp_after_delete = api_client.get(url)
+    api_client.force_authenticate(user=None)
+    assert resp_unauthorized.status_code == HTTP_401_UNAUTHORIZED
+    assert resp_empty.json() == {'order_count': 0, 'total_spent': '0.00', 'last_order_at': None}
+    assert resp_bulk.status_code == HTTP_201_CREATED
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json() == {'order_count': 3, 'total_spent': '90.00', 'last_order_at': last['created_at']}
+    assert resp_after_delete.json()['order_count'] == 2
+    assert resp_after_delete.json()['total_spent'] == '60.00'
+    assert resp_after_delete.json()['last_order_at'] == resp_bulk.json()[0]['data']['created_at']
+    assert_query_budget(resp, 1)
+
+
+@pytest.mark.django_db
+def test_check_order_summaries(order_factory):
+    """проверяем, что сверка находит сводки, расходящиеся с заказами, и исправляет их с --fix"""
+    test_user, other_user, no_orders_user = (User.objects.create_user(f'user_{i}') for i in range(3))
+    orders = order_factory(user=test_user, total_amount=100, _quantity=2)  # Созданы в обход API
+    order_factory(user=other_user, total_amount=None)
+    UserOrderSummary.objects.create(user=no_orders_user, order_count=1, total_spent=5)
+    stdout = StringIO()
+    call_command('check_order_summaries', stdout=stdout)
+    assert UserOrderSummary.objects.count() == 1
+    assert 'Сводок с расхождениями: 3' in stdout.getvalue()
+    assert f'user {test_user.id}: expected {{"order_count": 2' in stdout.getvalue()
+
+    call_command('check_order_summaries', '--fix', '--batch-size', '2', stdout=StringIO())
+    stdout = StringIO()
+    call_command('check_order_summaries', stdout=stdout)
+    assert 'Сводок с расхождениями: 0' in stdout.getvalue()
+    summary = UserOrderSummary.objects.get(user=test_user)
+    assert (summary.order_count, summary.total_spent) == (2, 200)
+    assert summary.last_order_at == max(order.created_at for order in orders)
+    assert UserOrderSummary.objects.get(user=other_user).total_spent == 0
+    assert not UserOrderSummary.objects.filter(user=no_orders_user).exists()
+
+
+@pytest.mark.django_db
+def test_order_summary_last_order_deleted(api_client, product_factory):
+    """проверяем, что после удаления последнего заказа пользователя сводка пустая и сверка не находит расхождений"""
+    test_user = User.objects.create_user('test_user')
+    product = product_factory(price=10)
+    api_client.force_authenticate(user=test_user)
+    order = api_client.post(reverse('orders-list'), {'products': [{'product_id': product.id, 'quantity': 1}]},
+                            format='json').json()
+    assert api_client.delete(reverse('orders-detail', args=(order['id'], ))).status_code == HTTP_204_NO_CONTENT
+    resp = api_client.get(reverse('orders-summary'))
+    api_client.force_authenticate(user=None)
+    stdout = StringIO()
+    call_command('check_order_summaries', stdout=stdout)
+    assert resp.json() == {'order_count': 0, 'total_spent': '0.00', 'last_order_at': None}
+    assert not UserOrderSummary.objects.filter(user=test_user).exists()
+    assert 'Сводок с расхождениями: 0' in stdout.getvalue()
@@ -0,0 +1,120 @@
+from decimal import Decimal
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from orders.models import ProductSales, ProductSalesDaily
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST, \
+    HTTP_403_FORBIDDEN
+
+
+def sales_rows():
+    daily = set(ProductSalesDaily.objects.values_list('product_id', 'date', 'ordered_qty', 'sold_qty', 'revenue'))
+    totals = set(ProductSales.objects.values_list('product_id', 'ordered_qty', 'sold_qty', 'revenue'))
+    return daily, totals
+
+
+@pytest.mark.django_db
+def test_sales_incremental_update(api_client, product_factory):
+    """проверяем, что статистика продаж меняется при создании, закрытии, изменении и удалении заказа
+    и совпадает с полным пересчетом"""
+    test_user = User.objects.create_user('test_user')
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    product_1, product_2 = product_factory(_quantity=2, price=10)
+    today = timezone.localdate()
+    api_client.force_authenticate(user=test_user)
+    positions = [{'product_id': product_1.id, 'quantity': 2}, {'product_id': product_2.id, 'quantity': 1}]
+    order_id = api_client.post(reverse('orders-list'), {'products': positions}, format='json').json()['id']
+    api_client.post(reverse('orders-list'), {'products': positions[:1]}, format='json')
+    assert sales_rows() == (
+        {(product_1.id, today, 4, 0, 0), (product_2.id, today, 1, 0, 0)},
+        {(product_1.id, 4, 0, 0), (product_2.id, 1, 0, 0)},
+    )
+
+    api_client.force_authenticate(user=test_admin)
+    url = reverse('orders-detail', args=(order_id, ))
+    resp_done = api_client.put(url, {'products': positions, 'status': 'DONE'}, format='json')
+    assert resp_done.status_code == HTTP_200_OK
+    assert ProductSales.objects.get(product=product_1).sold_qty == 2
+    assert ProductSales.objects.get(product=product_2).revenue == Decimal('10.00')
+
+    product_2.price = 15
+    product_2.save()
+    resp_update = api_client.put(url, {'products': [{'product_id': product_2.id, 'quantity': 3}]}, format='json')
+    assert resp_update.status_code == HTTP_200_OK
+    assert sales_rows() == (
+        {(product_1.id, today, 2, 0, 0), (product_2.id, today, 3, 3, Decimal('45.00'))},
+        {(product_1.id, 2, 0, 0), (product_2.id, 3, 3, Decimal('45.00'))},
+    )
+    incremental = sales_rows()
+    call_command('rebuild_sales_stats', stdout=StringIO())
+    assert sales_rows() == incremental
+
+    assert api_client.delete(url).status_code == HTTP_204_NO_CONTENT
+    api_client.force_authenticate(user=None)
+    assert sales_rows() == (
+        {(product_1.id, today, 2, 0, 0), (product_2.id, today, 0, 0, 0)},
+        {(product_1.id, 2, 0, 0), (product_2.id, 0, 0, 0)},
+    )
+
+
+@pytest.mark.django_db
+def test_product_sales_stats(api_client, product_factory):
+    """проверяем статистику продаж товаров: только для админов, сортировка, период и сортировку товаров по продажам"""
+    test_user = User.objects.create_user('test_user')
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    best, second, unsold = product_factory(_quantity=3, price=100)
+    api_client.force_authenticate(user=test_admin)
+    payload = [
+        {'products': [{'product_id': best.id, 'quantity': 5}], 'status': 'DONE'},
+        {'products': [{'product_id': best.id, 'quantity': 1}, {'product_id': second.id, 'quantity': 2}],
+         'status': 'DONE'},
+        {'products': [{'product_id': second.id, 'quantity': 10}]},  # Не закрыт, не продан
+    ]
+    assert api_client.post(reverse('orders-bulk-create'), payload, format='json').status_code == HTTP_201_CREATED
+    url = reverse('products-stats')
+    resp = api_client.get(url)
+    resp_revenue = api_client.get(url, {'ordering': 'revenue', 'limit': 1})
+    resp_period = api_client.get(url, {'date_from': timezone.localdate().isoformat()})
+    resp_future = api_client.get(url, {'date_from': '2100-01-01'})
+    resp_invalid = api_client.get(url, {'ordering': 'price'})
+    api_client.force_authenticate(user=test_user)
+    resp_user = api_client.get(url)
+    api_client.force_authenticate(user=None)
+    resp_ordering = api_client.get(reverse('products-list'), {'ordering': '-sold_qty'})
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json() == [
+        {'product_id': best.id, 'name': best.name, 'ordered_qty': 6, 'sold_qty': 6, 'revenue': '600.00'},
+        {'product_id': second.id, 'name': second.name, 'ordered_qty': 12, 'sold_qty': 2, 'revenue': '200.00'},
+    ]
+    assert [_['product_id'] for _ in resp_revenue.json()] == [second.id]
+    assert resp_period.json() == resp.json()
+    assert resp_future.json() == []
+    assert resp_invalid.status_code == HTTP_400_BAD_REQUEST
+    assert resp_user.status_code == HTTP_403_FORBIDDEN
+    assert [_['id'] for _ in resp_ordering.json()] == [best.id, second.id, unsold.id]
+
+
+@pytest.mark.django_db
+def test_sales_ordering_not_cached(api_client, product_factory):
+    """проверяем, что сортировка каталога по продажам для анонимных пользователей не берется из кэша
+    и меняется с заказами"""
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    first, second = product_factory(_quantity=2)
+    url = reverse('products-list')
+    orders_url = reverse('orders-list')
+    api_client.force_authenticate(user=test_admin)
+    api_client.post(orders_url, {'products': [{'product_id': second.id, 'quantity': 1}], 'status': 'DONE'},
+                    format='json')
+    api_client.force_authenticate(user=None)
+    resp_before = api_client.get(url, {'ordering': '-sold_qty'})
+    api_client.force_authenticate(user=test_admin)
+    api_client.post(orders_url, {'products': [{'product_id': first.id, 'quantity': 5}], 'status': 'DONE'},
+                    format='json')
+    api_client.force_authenticate(user=None)
+    resp_after = api_client.get(url, {'ordering': '-sold_qty'})
+    assert [_['id'] for _ in resp_before.json()] == [second.id, first.id]
+    assert [_['id'] for _ in resp_after.json()] == [first.id, second.id]
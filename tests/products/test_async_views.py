@@ -0,0 +1,94 @@
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from products import cache
+from rest_framework.authtoken.models import Token
+from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST, HTTP_401_UNAUTHORIZED, \
+    HTTP_404_NOT_FOUND
+
+# Асинхронные view работают с базой в отдельном потоке, поэтому данные тестов должны быть закоммичены
+
+
+@pytest.mark.parametrize(
+    'params',
+    (
+            {},
+            {'price__gte': 150, 'ordering': '-price'},
+            {'name__icontains': 'товар'},
+            {'page_size': 2},
+            {'price': 'не число'},
+            {'cursor': 'неверный'},
+    )
+)
+@pytest.mark.django_db(transaction=True)
+def test_product_list_async(api_client, product_factory, params):
+    """проверяем, что асинхронный список товаров отдает те же байты, что и синхронный"""
+    for price in (100, 150, 200):
+        product_factory(name=f'товар {price}', price=price)
+    resp = api_client.get(reverse('products-list'), params)
+    resp_async = api_client.get(reverse('async-products-list'), params)
+    assert resp_async.status_code == resp.status_code
+    assert resp_async.content == resp.content.replace(b'/api/v1/products/', b'/api/v1/async/products/')
+    assert resp_async['Content-Type'] == 'application/json'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_product_retrieve_async(api_client, product_factory):
+    """проверяем асинхронный вывод товара, 404 и ответ на неверный токен"""
+    product = product_factory()
+    resp = api_client.get(reverse('products-detail', args=(product.id,)))
+    resp_async = api_client.get(reverse('async-products-detail', args=(product.id,)))
+    resp_missing = api_client.get(reverse('products-detail', args=(product.id + 1,)))
+    resp_missing_async = api_client.get(reverse('async-products-detail', args=(product.id + 1,)))
+    resp_wrong_id_async = api_client.get(reverse('async-products-detail', args=('abc',)))
+    api_client.credentials(HTTP_AUTHORIZATION='Token wrong')
+    resp_wrong_token = api_client.get(reverse('products-detail', args=(product.id,)))
+    resp_wrong_token_async = api_client.get(reverse('async-products-detail', args=(product.id,)))
+    assert resp_async.status_code == HTTP_200_OK
+    assert resp_async.content == resp.content
+    assert resp_missing_async.status_code == resp_wrong_id_async.status_code == HTTP_404_NOT_FOUND
+    assert resp_missing_async.content == resp_missing.content
+    assert resp_wrong_token_async.status_code == HTTP_401_UNAUTHORIZED
+    assert resp_wrong_token_async.content == resp_wrong_token.content
+    assert resp_wrong_token_async['WWW-Authenticate'] == resp_wrong_token['WWW-Authenticate']
+
+
+@pytest.mark.parametrize(
+    ['params', 'expected_status'],
+    (
+            ({}, HTTP_200_OK),
+            ({'products': 'ids'}, HTTP_200_OK),
+            ({'products': 'preview', 'products_limit': 2}, HTTP_200_OK),
+            ({'products': 'все'}, HTTP_400_BAD_REQUEST),
+    )
+)
+@pytest.mark.django_db(transaction=True)
+def test_product_collection_async(api_client, product_factory, product_collection_factory, params,
+                                  expected_status):
+    """проверяем асинхронный вывод подборок вместе с товарами, в том числе компактный"""
+    collection = product_collection_factory(products=product_factory(_quantity=3))
+    for url_name, async_url_name, args in (
+            ('product-collections-list', 'async-product-collections-list', ()),
+            ('product-collections-detail', 'async-product-collections-detail', (collection.id, )),
+    ):
+        resp = api_client.get(reverse(url_name, args=args), params)
+        resp_async = api_client.get(reverse(async_url_name, args=args), params)
+        assert resp.status_code == resp_async.status_code == expected_status
+        assert resp_async.content == resp.content
+
+
+@pytest.mark.django_db(transaction=True)
+def test_product_list_async_cache(api_client, product_factory):
+    """проверяем, что асинхронный список кэшируется для анонимных пользователей и сбрасывается при изменениях"""
+    product_factory(_quantity=2)
+    url = reverse('async-products-list')
+    api_client.get(url)
+    api_client.get(url)
+    product_factory()
+    resp = api_client.get(url)
+    token = Token.objects.create(user=User.objects.create_user('test_user'))
+    api_client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    resp_user = api_client.get(url)
+    assert len(resp.json()) == len(resp_user.json()) == 3
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 2
@@ -0,0 +1,29 @@
+import pytest
+from django.db import connection
+from products.filters import ProductFilter, ProductCollectionFilter
+from products.models import Product, ProductCollection
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != 'postgresql',
+    reason='trigram и функциональные индексы есть только на PostgreSQL'
+)
+
+
+@pytest.mark.parametrize(
+    ['filterset_class', 'model', 'params', 'index_name'],
+    (
+            (ProductFilter, Product, {'name__icontains': 'стол'}, 'products_product_name_upper_trgm_idx'),
+            (ProductFilter, Product, {'name__iexact': 'Стол'}, 'products_product_name_upper_idx'),
+            (ProductCollectionFilter, ProductCollection, {'name__icontains': 'мебель'},
+             'products_productcollection_name_upper_trgm_idx'),
+            (ProductCollectionFilter, ProductCollection, {'name__iexact': 'Мебель'},
+             'products_productcollection_name_upper_idx'),
+    )
+)
+@pytest.mark.django_db
+def test_name_filters_use_indexes(query_plan, filterset_class, model, params, index_name):
+    """проверяем, что фильтры по имени компилируются в выражение индекса и используют индекс"""
+    queryset = filterset_class(params, queryset=model.objects.all()).qs
+    sql = str(queryset.query)
+    assert f'UPPER("{model._meta.db_table}"."name"::text)' in sql
+    assert index_name in query_plan(queryset)
@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from django.urls import reverse
 from products.models import ProductCollection
 from rest_framework.status import HTTP_200_OK, HTTP_401_UNAUTHORIZED, HTTP_201_CREATED, \
-    HTTP_403_FORBIDDEN, HTTP_204_NO_CONTENT
+    HTTP_403_FORBIDDEN, HTTP_204_NO_CONTENT, HTTP_400_BAD_REQUEST
 
 
 @pytest.mark.django_db
@@ -184,3 +184,78 @@ def test_product_collection_list_name_filter(api_client, product_collection_fact
     assert resp1.status_code == HTTP_200_OK
     assert resp2.status_code == HTTP_200_OK
     assert {filter_name} == resp1_names == resp2_names
+
+
+@pytest.mark.django_db
+def test_product_collection_add_remove_products(api_client, product_collection_factory, product_factory,
+                                                assert_query_budget):
+    """проверяем добавление и удаление пачек товаров подборки: проверку id, пропуск уже добавленных,
+    обновление updated_at и кэша каталога"""
+    products = product_factory(_quantity=4)
+    product_collection = product_collection_factory()
+    product_collection.products.set(products[:1])
+    test_user = User.objects.create_user('test_user')
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    detail_url = reverse('product-collections-detail', args=(product_collection.id,))
+    add_url = reverse('product-collections-products-add', args=(product_collection.id,))
+    remove_url = reverse('product-collections-products-remove', args=(product_collection.id,))
+    product_ids = [_.id for _ in products]
+    resp_cached = api_client.get(detail_url)
+    api_client.force_authenticate(user=test_user)
+    resp_user = api_client.post(add_url, {'product_ids': product_ids}, format='json')
+    api_client.force_authenticate(user=test_admin)
+    resp_wrong = api_client.post(add_url, {'product_ids': product_ids + [max(product_ids) + 1]}, format='json')
+    resp_empty = api_client.post(add_url, {'product_ids': []}, format='json')
+    resp_add = api_client.post(add_url, {'product_ids': product_ids + product_ids[:2]}, format='json')
+    resp_add_again = api_client.post(add_url, {'product_ids': product_ids[1:2]}, format='json')
+    resp_remove = api_client.post(remove_url, {'product_ids': product_ids[:3]}, format='json')
+    api_client.force_authenticate(user=None)
+    resp_after = api_client.get(detail_url)
+    assert resp_user.status_code == HTTP_403_FORBIDDEN
+    assert resp_wrong.status_code == resp_empty.status_code == HTTP_400_BAD_REQUEST
+    assert resp_add.json() == {'added': 3}
+    assert resp_add_again.json() == {'added': 0}
+    assert resp_remove.json() == {'removed': 3}
+    assert_query_budget(resp_add, 7)  # Проверка id, блокировка, связи, INSERT, updated_at и SAVEPOINT теста
+    assert [_['id'] for _ in resp_cached.json()['products']] == product_ids[:1]
+    assert [_['id'] for _ in resp_after.json()['products']] == product_ids[3:]
+    assert resp_after.json()['updated_at'] > resp_cached.json()['updated_at']
+
+
+@pytest.mark.django_db
+def test_product_collection_compact(api_client, product_collection_factory, product_factory, assert_query_budget):
+    """проверяем компактный вывод подборок: только id товаров или первые товары и их число"""
+    products = product_factory(_quantity=7)
+    product_ids = [_.id for _ in products]
+    big, empty = product_collection_factory(_quantity=2)
+    big.products.set(products)
+    url = reverse('product-collections-list')
+    resp_ids = api_client.get(url, {'products': 'ids'})
+    resp_preview = api_client.get(url, {'products': 'preview', 'products_limit': 2})
+    resp_retrieve = api_client.get(reverse('product-collections-detail', args=(big.id,)), {'products': 'preview'})
+    resp_invalid = api_client.get(url, {'products': 'all'})
+    assert {_['id']: _['product_ids'] for _ in resp_ids.json()} == {big.id: product_ids, empty.id: []}
+    preview = {_['id']: _ for _ in resp_preview.json()}
+    assert [_['id'] for _ in preview[big.id]['products']] == product_ids[:2]
+    assert preview[big.id]['product_count'] == 7
+    assert (preview[empty.id]['products'], preview[empty.id]['product_count']) == ([], 0)
+    assert_query_budget(resp_preview, 4)  # Подборки, ETag списка, первые товары с их числом, товары
+    assert [_['id'] for _ in resp_retrieve.json()['products']] == product_ids[:5]
+    assert resp_invalid.status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_product_collection_products_pages(api_client, product_collection_factory, product_factory):
+    """проверяем постраничный вывод товаров подборки"""
+    products = product_factory(_quantity=5)
+    product_collection = product_collection_factory()
+    product_collection.products.set(products)
+    product_collection_factory().products.set(product_factory(_quantity=2))
+    url = reverse('product-collections-products', args=(product_collection.id,))
+    resp_first = api_client.get(url, {'page_size': 3})
+    resp_second = api_client.get(resp_first.json()['next'])
+    resp_default = api_client.get(url)
+    assert resp_first.status_code == HTTP_200_OK
+    assert [_['id'] for _ in resp_first.json()['results'] + resp_second.json()['results']] == [_.id for _ in products]
+    assert resp_second.json()['next'] is None
+    assert len(resp_default.json()['results']) == 5
@@ -1,10 +1,15 @@
+import csv
 from datetime import datetime
+from io import StringIO
 from pytz import timezone
 
 import pytest
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from products.models import ProductReview
+from products.models import Product, ProductReview
 from django.conf import settings
 from rest_framework.status import HTTP_200_OK, HTTP_401_UNAUTHORIZED, HTTP_201_CREATED, HTTP_403_FORBIDDEN, \
     HTTP_400_BAD_REQUEST, HTTP_204_NO_CONTENT
@@ -255,3 +260,110 @@ def test_product_review_filter_created_at_lte(api_client, product_review_factory
     resp_dates_list = [datetime.strptime(_['created_at'], "%Y-%m-%dT%H:%M:%S.%f%z").date() for _ in resp_json]
     assert resp.status_code == HTTP_200_OK
     assert all(date <= filter_product_date for date in resp_dates_list)
+
+
+@pytest.mark.django_db
+def test_product_review_rating_aggregates(api_client, product_factory):
+    """проверяем пересчет количества отзывов и средней оценки товара при создании, изменении и удалении отзыва"""
+    url = reverse('product-reviews-list')
+    product = product_factory()
+    test_user_1 = User.objects.create_user('test_user_1')
+    test_user_2 = User.objects.create_user('test_user_2')
+    api_client.force_authenticate(user=test_user_1)
+    resp_1 = api_client.post(url, {'product_id': product.id, 'rating': 5}, format='json')
+    api_client.force_authenticate(user=test_user_2)
+    resp_2 = api_client.post(url, {'product_id': product.id, 'rating': 2}, format='json')
+    product.refresh_from_db()
+    assert (product.review_count, product.rating_sum, str(product.rating_avg)) == (2, 7, '3.50')
+    assert (resp_2.json()['product']['review_count'], resp_2.json()['product']['rating_avg']) == (2, '3.50')
+
+    url_update = reverse('product-reviews-detail', args=(resp_2.json()['id'],))
+    resp_update = api_client.put(url_update, {'product_id': product.id, 'rating': 4}, format='json')
+    product.refresh_from_db()
+    assert (product.review_count, product.rating_sum, str(product.rating_avg)) == (2, 9, '4.50')
+    assert resp_update.json()['product']['rating_avg'] == '4.50'
+    assert resp_update.json()['product']['updated_at'] == api_client.get(url_update).json()['product']['updated_at']
+
+    api_client.force_authenticate(user=test_user_1)
+    api_client.delete(reverse('product-reviews-detail', args=(resp_1.json()['id'],)))
+    api_client.force_authenticate(user=None)
+    resp_product = api_client.get(reverse('products-detail', args=(product.id,)))
+    assert resp_product.json()['review_count'] == 1
+    assert resp_product.json()['rating_avg'] == '4.00'
+
+
+@pytest.mark.django_db
+def test_rebuild_product_ratings_command(product_factory, product_review_factory):
+    """проверяем пересчет разъехавшихся агрегатов отзывов командой"""
+    product, empty_product = product_factory(_quantity=2)
+    product_review_factory(product=product, rating=1)
+    product_review_factory(product=product, rating=4)
+    Product.objects.update(review_count=10, rating_sum=3, rating_avg=5)
+    call_command('rebuild_product_ratings', batch_size=1, stdout=StringIO())
+    product.refresh_from_db()
+    empty_product.refresh_from_db()
+    assert (product.review_count, product.rating_sum, str(product.rating_avg)) == (2, 5, '2.50')
+    assert (empty_product.review_count, empty_product.rating_sum, empty_product.rating_avg) == (0, 0, 0)
+
+
+@pytest.mark.django_db
+def test_product_review_update_product(api_client, product_factory):
+    """проверяем перенос отзыва на другой товар вместе с агрегатами оценок"""
+    product_1, product_2 = product_factory(_quantity=2)
+    test_user = User.objects.create_user('test_user')
+    api_client.force_authenticate(user=test_user)
+    resp_create = api_client.post(
+        reverse('product-reviews-list'), {'product_id': product_1.id, 'rating': 3}, format='json'
+    )
+    url_update = reverse('product-reviews-detail', args=(resp_create.json()['id'],))
+    resp_update = api_client.put(url_update, {'product_id': product_2.id, 'rating': 4}, format='json')
+    api_client.force_authenticate(user=None)
+    product_1.refresh_from_db()
+    product_2.refresh_from_db()
+    assert resp_update.status_code == HTTP_200_OK
+    assert resp_update.json()['product']['id'] == product_2.id
+    assert (product_1.review_count, product_1.rating_sum) == (0, 0)
+    assert (product_2.review_count, product_2.rating_sum) == (1, 4)
+    assert resp_update.json()['product']['review_count'] == 1
+
+
+@pytest.mark.django_db
+def test_product_review_create_num_queries(api_client, product_factory):
+    """проверяем, что при создании отзыва товар читается одним запросом (и еще одним — его агрегаты после
+    UPDATE), а дубль отсекается ограничением базы"""
+    product = product_factory()
+    url = reverse('product-reviews-list')
+    payload = {'product_id': product.id, 'rating': 5}
+    test_user = User.objects.create_user('test_user')
+    api_client.force_authenticate(user=test_user)
+    with CaptureQueriesContext(connection) as queries:
+        resp = api_client.post(url, payload, format='json')
+    with CaptureQueriesContext(connection) as queries_duplicate:
+        resp_duplicate = api_client.post(url, payload, format='json')
+    api_client.force_authenticate(user=None)
+    selects = [_['sql'] for _ in queries if _['sql'].startswith('SELECT')]
+    assert resp.status_code == HTTP_201_CREATED
+    assert len(selects) == 2
+    assert resp_duplicate.status_code == HTTP_400_BAD_REQUEST
+    assert resp_duplicate.json() == {'non_field_errors': ['Maximum one review per user per product']}
+    review_selects = [_['sql'] for _ in queries_duplicate if _['sql'].startswith('SELECT "products_productreview"')]
+    assert not review_selects
+
+
+@pytest.mark.django_db
+def test_product_review_export(api_client, product_factory, product_review_factory):
+    """проверяем выгрузку отзывов в CSV с фильтром по товару"""
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    product, other_product = product_factory(_quantity=2)
+    product_review_factory(product=product, rating=5, text='текст, с запятой')
+    product_review_factory(product=other_product, rating=1)
+    api_client.force_authenticate(user=test_admin)
+    resp = api_client.get(reverse('product-reviews-export'), {'export_format': 'csv', 'product': product.id})
+    api_client.force_authenticate(user=None)
+    assert resp.status_code == HTTP_200_OK
+    assert resp['Content-Type'] == 'text/csv; charset=utf-8'
+    rows = list(csv.DictReader(StringIO(b''.join(resp.streaming_content).decode())))
+    assert len(rows) == 1
+    assert rows[0]['product_id'] == str(product.id)
+    assert rows[0]['rating'] == '5'
+    assert rows[0]['text'] == 'текст, с запятой'
@@ -1,10 +1,18 @@
+import json
+from io import StringIO
+
 import pytest
 from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from model_bakery.random_gen import gen_text
+from products import cache
 from products.models import Product
 from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_401_UNAUTHORIZED, HTTP_403_FORBIDDEN, \
-    HTTP_204_NO_CONTENT
+    HTTP_204_NO_CONTENT, HTTP_404_NOT_FOUND, HTTP_400_BAD_REQUEST
 
 
 @pytest.mark.django_db
@@ -238,3 +246,178 @@ def test_product_list_filter_price_gte(api_client, product_factory):
     resp_prices = {_['price'] for _ in resp_json}
     assert resp.status_code == HTTP_200_OK
     assert all(float(price) >= float(filter_price) for price in resp_prices)
+
+
+@pytest.mark.django_db
+def test_product_list_cursor_pagination(api_client, product_factory):
+    """проверяем постраничный вывод продуктов по курсору вперед и назад"""
+    products = product_factory(_quantity=7)
+    Product.objects.filter(id__in=[_.id for _ in products[:4]]).update(created_at=products[0].created_at)
+    products = Product.objects.all()
+    url = reverse('products-list')
+    resp = api_client.get(url, {'page_size': 3})
+    resp_json = resp.json()
+    assert resp.status_code == HTTP_200_OK
+    assert resp_json['previous'] is None
+    pages = [resp_json]
+    while pages[-1]['next']:
+        pages.append(api_client.get(pages[-1]['next']).json())
+    resp_ids = [_['id'] for page in pages for _ in page['results']]
+    assert [len(page['results']) for page in pages] == [3, 3, 1]
+    assert resp_ids == [_.id for _ in sorted(products, key=lambda _: (_.created_at, _.id))]
+    resp_previous = api_client.get(pages[-1]['previous']).json()
+    assert [_['id'] for _ in resp_previous['results']] == [_['id'] for _ in pages[1]['results']]
+
+
+@pytest.mark.django_db
+def test_product_list_cursor_pagination_invalid(api_client, product_factory):
+    """проверяем, что без параметров пагинации список не разбивается, а неверный курсор дает 404"""
+    product_factory(_quantity=3)
+    url = reverse('products-list')
+    resp = api_client.get(url)
+    resp_invalid = api_client.get(url, {'cursor': 'foo'})
+    assert resp.status_code == HTTP_200_OK
+    assert len(resp.json()) == 3
+    assert resp_invalid.status_code == HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_product_list_cursor_pagination_ordering(api_client, product_factory):
+    """проверяем, что страницы по курсору сохраняют порядок ?ordering, а поиск и сортировка
+    по продажам с курсором дают 400"""
+    for price in (1, 3, 2, 3, 2, 1, 3):
+        product_factory(price=price, name='стол')
+    products = sorted(Product.objects.all(), key=lambda _: (-_.price, _.id))
+    url = reverse('products-list')
+    pages = [api_client.get(url, {'ordering': '-price', 'page_size': 3}).json()]
+    while pages[-1]['next']:
+        pages.append(api_client.get(pages[-1]['next']).json())
+    resp_previous = api_client.get(pages[-1]['previous']).json()
+    resp_search = api_client.get(url, {'search': 'стол', 'page_size': 3})
+    resp_sales = api_client.get(url, {'ordering': '-sold_qty', 'page_size': 3})
+    assert [_['id'] for page in pages for _ in page['results']] == [_.id for _ in products]
+    assert [_['id'] for _ in resp_previous['results']] == [_['id'] for _ in pages[1]['results']]
+    assert resp_search.status_code == resp_sales.status_code == HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_product_list_filter_ordering_rating(api_client, product_factory):
+    """проверяем фильтрацию и сортировку списка продуктов по средней оценке"""
+    product_factory(rating_avg='4.50', review_count=2)
+    product_factory(rating_avg='2.00', review_count=1)
+    product_factory(rating_avg='5.00', review_count=3)
+    url = reverse('products-list')
+    resp = api_client.get(url, {'rating_avg__gte': '2.50', 'ordering': '-rating_avg'})
+    resp_json = resp.json()
+    assert resp.status_code == HTTP_200_OK
+    assert [_['rating_avg'] for _ in resp_json] == ['5.00', '4.50']
+
+
+@pytest.mark.django_db
+def test_product_list_cache(api_client, product_factory):
+    """проверяем кэширование списка продуктов для анонимных пользователей и сброс кэша при изменении"""
+    product = product_factory(name='old_name')
+    url = reverse('products-list')
+    resp_miss = api_client.get(url, {'price__gte': 0, 'name__icontains': 'name'})
+    with CaptureQueriesContext(connection) as queries:
+        resp_hit = api_client.get(url, {'name__icontains': 'name', 'price__gte': 0})
+    assert len(queries) == 0
+    assert resp_hit.json() == resp_miss.json()
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+    product.name = 'new_name'
+    product.save()
+    resp_updated = api_client.get(url, {'price__gte': 0, 'name__icontains': 'name'})
+    assert [_['name'] for _ in resp_updated.json()] == ['new_name']
+
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    api_client.force_authenticate(user=test_admin)
+    api_client.get(url)
+    api_client.get(url)
+    api_client.force_authenticate(user=None)
+    assert cache.get_stats() == {'hits': 1, 'misses': 2, 'hit_ratio': 0.3333}
+
+
+@pytest.mark.django_db
+def test_product_list_search(api_client, product_factory):
+    """проверяем полнотекстовый поиск продуктов со стеммингом и сортировкой по релевантности"""
+    table = product_factory(name='Кухонный стол', description='')
+    product_factory(name='Стол обеденный', description='')
+    wardrobe = product_factory(name='Шкаф', description='Подходит для кухонных столов')
+    chairs = product_factory(name='Wooden chairs', description='')
+    url = reverse('products-list')
+    resp = api_client.get(url, {'search': 'кухонные столы'})
+    resp_english = api_client.get(url, {'search': 'chair'})
+    resp_ordering = api_client.get(url, {'search': 'кухонные столы', 'ordering': '-created_at'})
+    assert resp.status_code == HTTP_200_OK
+    assert [_['id'] for _ in resp.json()] == [table.id, wardrobe.id]
+    assert [_['id'] for _ in resp_english.json()] == [chairs.id]
+    assert [_['id'] for _ in resp_ordering.json()] == [wardrobe.id, table.id]
+
+
+@pytest.mark.django_db
+def test_product_list_stream(api_client, product_factory):
+    """проверяем потоковый список товаров с фильтром; такой ответ не кэшируется"""
+    product_factory(_quantity=3, price=100)
+    product_factory(_quantity=2, price=200)
+    url = reverse('products-list')
+    resp = api_client.get(url, {'stream': 1, 'price': 100})
+    resp_json = json.loads(b''.join(resp.streaming_content))
+    assert resp.status_code == HTTP_200_OK
+    assert len(resp_json) == 3
+    assert cache.get_stats()['hits'] + cache.get_stats()['misses'] == 1
+    resp_empty = api_client.get(url, {'stream': 1, 'price': 300})
+    assert json.loads(b''.join(resp_empty.streaming_content)) == []
+
+
+@pytest.mark.django_db
+def test_product_import_command(tmp_path, product_factory):
+    """проверяем импорт CSV: новые товары создаются, товары с тем же артикулом обновляются, ошибки по строкам"""
+    product = product_factory(supplier_sku='SKU-1', name='старое название', price=10)
+    path = tmp_path / 'products.csv'
+    path.write_text(
+        'supplier_sku,name,description,price\n'
+        'SKU-1,новое название,,15.50\n'
+        'SKU-2,товар 2,описание,100\n'
+        'SKU-3,товар 3,,10.999\n'
+        ',товар 4,,5\n'
+        'SKU-5,товар 5,,-1\n',
+        encoding='utf-8'
+    )
+    stdout, stderr = StringIO(), StringIO()
+    call_command('import_products', str(path), '--batch-size', '2', stdout=stdout, stderr=stderr)
+    product.refresh_from_db()
+    assert product.name == 'новое название'
+    assert str(product.price) == '15.50'
+    assert Product.objects.get(supplier_sku='SKU-2').description == 'описание'
+    assert Product.objects.count() == 2
+    assert 'Создано: 1, обновлено: 1, ошибок: 3' in stdout.getvalue()
+    assert [_.split(':')[0] for _ in stderr.getvalue().splitlines()] == ['line 4', 'line 5', 'line 6']
+
+
+@pytest.mark.django_db
+def test_product_import_upload(api_client):
+    """проверяем загрузку NDJSON файла товаров, только для админа"""
+    test_user = User.objects.create_user('test_user', is_staff=False)
+    test_admin = User.objects.create_user('test_admin', is_staff=True)
+    url = reverse('products-import')
+    content = '\n'.join([
+        json.dumps({'supplier_sku': 'SKU-1', 'name': 'товар 1', 'price': '10.00'}),
+        json.dumps({'supplier_sku': 'SKU-2', 'name': 'товар 2', 'price': '20.00'}),
+        json.dumps({'supplier_sku': 'SKU-1', 'name': 'товар 1 новый', 'price': '11.00'}),
+        'не json',
+    ]).encode('utf-8')
+    api_client.force_authenticate(user=test_user)
+    resp_user = api_client.post(url, {'file': SimpleUploadedFile('products.ndjson', content)}, format='multipart')
+    api_client.force_authenticate(user=test_admin)
+    resp = api_client.post(url, {'file': SimpleUploadedFile('products.ndjson', content)}, format='multipart')
+    resp_wrong = api_client.post(url, {'file': SimpleUploadedFile('products.xml', content)}, format='multipart')
+    api_client.force_authenticate(user=None)
+    assert resp_user.status_code == HTTP_403_FORBIDDEN
+    assert resp_wrong.status_code == HTTP_400_BAD_REQUEST
+    assert resp.status_code == HTTP_200_OK
+    assert resp.json()['created'] == 2
+    assert resp.json()['error_count'] == 1
+    assert resp.json()['errors'][0]['line'] == 4
+    assert Product.objects.get(supplier_sku='SKU-1').name == 'товар 1 новый'